@@ -1,8 +1,7 @@
 from flask import Flask
 from flask_cors import CORS
-from routes.readme_generator import readme_bp
-from routes.talk_ai import repo_talk
-from routes.tree_structure import tree_bp
+from utils import metrics
+from utils.startup import load
 from dotenv import load_dotenv
 
 # Load .env file
@@ -11,10 +10,15 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app, supports_credentials=True, origins=["http://localhost:5173","https://githubs-ai.web.app"])
 
-# Register blueprints
-app.register_blueprint(readme_bp, url_prefix='/api')
-app.register_blueprint(repo_talk, url_prefix='/api')
-app.register_blueprint(tree_bp, url_prefix='/api')
+# Register blueprints; their import times are reported on /metrics. The routes import
+# LangChain, FAISS and the embeddings on first use, or in utils.startup.warm_up
+app.register_blueprint(load('routes.readme_generator').readme_bp, url_prefix='/api')
+app.register_blueprint(load('routes.talk_ai').repo_talk, url_prefix='/api')
+app.register_blueprint(load('routes.tree_structure').tree_bp, url_prefix='/api')
+app.register_blueprint(load('routes.jobs').jobs_bp, url_prefix='/api')
+
+# Request timings, the optional per-request profiler and GET /metrics
+metrics.init_app(app)
 
 @app.route('/', methods=['GET'])
 def index():
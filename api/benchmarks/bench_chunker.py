@@ -0,0 +1,90 @@
+"""
+Chunk count, embedded characters and split time of the language-aware chunker against
+the RecursiveCharacterTextSplitter pass it replaced.
+
+    python -m benchmarks.bench_chunker [--path DIR ...] [--copies 20] [--processes N]
+
+Files are the indexable files (see utils.indexer.is_relevant) under --path, by default
+this repository, read --copies times over to stand in for a large repository. The
+process pool is started before it is timed; its start-up cost is reported on its own.
+"""
+import argparse
+import json
+import os
+import time
+
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_files(paths, copies):
+    from utils.indexer import INGEST_MAX_FILE_BYTES, is_relevant
+
+    files = []
+    for root in paths:
+        for folder, dirs, names in os.walk(root):
+            dirs[:] = [name for name in dirs if not name.startswith('.') and name != '__pycache__']
+            for name in names:
+                path = os.path.join(folder, name)
+                if not is_relevant(name) or os.path.getsize(path) > INGEST_MAX_FILE_BYTES:
+                    continue
+                with open(path, 'rb') as f:
+                    content = f.read().decode('utf-8', errors='ignore')
+                if content:
+                    files.append((os.path.relpath(path, root), content))
+    return [(f"copy{n}/{path}", content) for n in range(copies) for path, content in files]
+
+
+def documents(files):
+    from langchain.schema import Document
+
+    return [Document(page_content=content, metadata={'path': path, 'file_name': path.rsplit('/', 1)[-1], 'sha': ''})
+            for path, content in files]
+
+
+def summarize(chunks, seconds):
+    return {
+        'chunks': len(chunks),
+        'embedded_chars': sum(len(chunk.page_content) for chunk in chunks),
+        'with_symbol': round(sum(1 for chunk in chunks if chunk.metadata.get('symbol')) / max(len(chunks), 1), 3),
+        'seconds': round(seconds, 3),
+    }
+
+
+def run(files, processes):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from utils.chunker import chunk_batch, get_pool, shutdown_pool
+    from utils.indexer import iter_chunks
+
+    docs = documents(files)
+    results = {'files': len(files), 'chars': sum(len(content) for _, content in files)}
+
+    start = time.perf_counter()
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_documents(docs)
+    results['splitter'] = summarize(chunks, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    chunks = [chunk for _, _, file_chunks, _ in iter_chunks(docs) for chunk in file_chunks]
+    results['chunker'] = summarize(chunks, time.perf_counter() - start)
+
+    if processes > 1:
+        start = time.perf_counter()
+        pool = get_pool()
+        list(pool.map(chunk_batch, [[('warm.py', 'def f():\n    pass\n')]] * processes))
+        results['pool_start_s'] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        chunks = [chunk for _, _, file_chunks, _ in iter_chunks(docs, processes) for chunk in file_chunks]
+        results['chunker_pool'] = dict(summarize(chunks, time.perf_counter() - start), processes=processes)
+        shutdown_pool()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--path', nargs='+', default=[os.path.dirname(API_DIR)])
+    parser.add_argument('--copies', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    # Sizes the shared pool, which is created on first use
+    os.environ['CHUNK_PROCESSES'] = str(args.processes)
+    print(json.dumps(run(read_files(args.path, args.copies), args.processes), indent=2))
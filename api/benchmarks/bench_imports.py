@@ -0,0 +1,104 @@
+"""
+Import extraction and file type throughput against the previous per-call regex implementation.
+
+    python -m benchmarks.bench_imports [--files 2000] [--repeat 5]
+"""
+import argparse
+import json
+import re
+import time
+
+from benchmarks.synthetic import synthetic_repo, synthetic_sources
+from utils.imports import extract_imports
+from utils.utils import FILE_TYPES, file_type_of
+
+
+def legacy_extract_imports(path, file_content):
+    """The extractor as it was before utils.imports: an endswith chain with patterns compiled per call."""
+    imports = []
+    if path.endswith('.py'):
+        imports = re.findall(r'^\s*import\s+(\S+)|^\s*from\s+(\S+)\s+import\s+(\S+)', file_content, re.MULTILINE)
+        imports = [f"import {imp[0]}" if imp[0] else f"from {imp[1]} import {imp[2]}" for imp in imports]
+    elif path.endswith('.cpp') or path.endswith('.h'):
+        imports = re.findall(r'^\s*#include\s+["<](\S+)[">]', file_content, re.MULTILINE)
+    elif path.endswith('.js') or path.endswith('.ts'):
+        imports = re.findall(r'^\s*import\s+.*?\s+from\s+["\'](\S+)["\']|^\s*import\s+(\S+)', file_content, re.MULTILINE)
+        imports = [imp[0] or imp[1] for imp in imports]
+    elif path.endswith('.java'):
+        imports = re.findall(r'^\s*import\s+([\w\.]+);', file_content, re.MULTILINE)
+    elif path.endswith('.kt'):
+        imports = re.findall(r'^\s*import\s+([\w\.]+)', file_content, re.MULTILINE)
+    elif path.endswith('.rs'):
+        imports = re.findall(r'^\s*extern\s+crate\s+(\w+)|^\s*use\s+([\w\:]+)', file_content, re.MULTILINE)
+        imports = [imp[0] or imp[1] for imp in imports]
+    elif path.endswith('.go'):
+        imports = re.findall(r'^\s*import\s+["](\S+)["]', file_content, re.MULTILINE)
+    elif path.endswith('.cs'):
+        imports = re.findall(r'^\s*using\s+([\w\.]+);', file_content, re.MULTILINE)
+    elif path.endswith('.php'):
+        imports = re.findall(r'^\s*require\s+["\'](\S+)["\']|^\s*include\s+["\'](\S+)["\']', file_content, re.MULTILINE)
+        imports = [imp[0] or imp[1] for imp in imports]
+    return imports
+
+
+def legacy_file_type_of(name):
+    for file_type, pattern in FILE_TYPES.items():
+        if re.search(pattern, name, re.IGNORECASE):
+            return file_type
+    return None
+
+
+def best_of(repeat, fn, items):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(*item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(n_files, repeat):
+    sources = synthetic_sources(n_files)
+    size_mb = sum(len(content) for _, content in sources) / 1e6
+    legacy_s = best_of(repeat, legacy_extract_imports, sources)
+    current_s = best_of(repeat, extract_imports, sources)
+
+    found = {}
+    for path, content in sources:
+        ext = path[path.rfind('.'):]
+        legacy, current = found.setdefault(ext, [0, 0])
+        found[ext] = [legacy + len(legacy_extract_imports(path, content)), current + len(extract_imports(path, content))]
+
+    names = [(entry['path'].rsplit('/', 1)[-1],) for entry in synthetic_repo(n_files * 10)[0]]
+    legacy_types_s = best_of(repeat, legacy_file_type_of, names)
+    current_types_s = best_of(repeat, file_type_of, names)
+    assert all(legacy_file_type_of(name) == file_type_of(name) for name, in names)
+
+    return {
+        'files': n_files,
+        'mb': round(size_mb, 2),
+        'extract': {
+            'legacy_mb_per_s': round(size_mb / legacy_s, 1),
+            'current_mb_per_s': round(size_mb / current_s, 1),
+            'speedup': round(legacy_s / current_s, 2),
+        },
+        # Imports found per extension, (legacy, current): the current extractor also
+        # covers require(), Go import blocks, C #include and multi-line JS imports
+        'imports_found': {ext: tuple(counts) for ext, counts in sorted(found.items())},
+        'file_types': {
+            'names': len(names),
+            'legacy_ms': round(legacy_types_s * 1000, 1),
+            'current_ms': round(current_types_s * 1000, 1),
+            'speedup': round(legacy_types_s / current_types_s, 2),
+        },
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.files, args.repeat), indent=2))
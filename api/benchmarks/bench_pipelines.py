@@ -0,0 +1,309 @@
+"""
+End-to-end timings of the /api/tree, /api/generate and /api/set-repo pipelines against
+a GitHub stand-in, with the fake LLM and hash embeddings.
+
+    python -m benchmarks.bench_pipelines [--sizes small medium large] [--pipelines tree generate set-repo]
+                                         [--source github|tarball] [--output run.json] [--baseline previous.json]
+    python -m benchmarks.bench_pipelines --cassette repo.json.gz [...]
+    python -m benchmarks.bench_pipelines --record https://github.com/owner/repo --cassette repo.json.gz
+
+Repositories are synthetic (see benchmarks.synthetic) unless a cassette recorded from
+a real one is given. Every pipeline runs in its own process with empty caches, so wall
+time, upstream request counts and peak RSS are those of a cold request. Stages are
+reported in seconds; for tree and generate they are named after the pipeline's
+progress events. Results are printed (and written to --output) as JSON; with
+--baseline each result is compared against the same size and pipeline in an earlier
+run, exiting with status 1 when one got slower, chattier or bigger past --tolerance.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+
+SIZES = {'small': 200, 'medium': 2000, 'large': 10000}
+PIPELINES = ('tree', 'generate', 'set-repo')
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Compared against the baseline run: seconds, upstream requests and megabytes
+COMPARED = ('wall_s', 'requests', 'peak_rss_mb')
+
+
+class StageClock:
+    """Wall time per stage: a stage runs from `enter(name)`, or a progress event of that name, until the next one."""
+
+    def __init__(self):
+        self.stages = {}
+        self.current = None
+        self.started = self._mark = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enter(self, name):
+        with self._lock:
+            now = time.perf_counter()
+            if self.current:
+                self.stages[self.current] = self.stages.get(self.current, 0) + now - self._mark
+            self.current, self._mark = name, now
+
+    def progress(self, stage, *args, **counters):
+        if stage != self.current:
+            self.enter(stage)
+
+    def finish(self):
+        self.enter(None)
+        return time.perf_counter() - self.started
+
+
+def timed(iterable, totals, name):
+    """Yields from `iterable`, adding the time spent producing each item to totals[name]."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            totals[name] += time.perf_counter() - start
+            return
+        totals[name] += time.perf_counter() - start
+        yield item
+
+
+# === Pipelines, run in the child process ===
+def tree_pipeline(repo_url, clock):
+    from utils.utils import process_repo_tree
+
+    process_repo_tree(repo_url, progress=clock.progress)
+
+
+def generate_pipeline(repo_url, clock):
+    from routes.readme_generator import build_readme
+
+    clock.enter('head_sha')
+    build_readme(repo_url, progress=clock.progress)
+
+
+def set_repo_pipeline(repo_url, clock):
+    """
+    A cold index build, staged like build_index: documents are fetched and decoded,
+    chunked, added to the lexical index and embedded into FAISS as one stream, so each
+    stage's time is measured inside the stream and the FAISS stage keeps only its own share.
+    """
+    from utils.chunker import chunk_processes
+    from utils.embeddings import get_embeddings
+    from utils.index_store import index_registry
+    from utils.indexer import add_chunks, iter_chunks, iter_documents, list_relevant_files
+    from utils.lexical import LexicalIndex
+    from utils.metrics import STAGE_SECONDS
+    from utils.sources import get_source
+    from utils.utils import parse_repo_url
+
+    owner, repo = parse_repo_url(repo_url)
+    clock.enter('head_sha')
+    source = get_source(owner, repo)
+    sha = source.head_sha()
+    clock.enter('listing')
+    files = list_relevant_files(source, sha)
+
+    inclusive = Counter()
+    manifest = {}
+    lexical = LexicalIndex()
+    documents = timed(iter_documents(source, files), inclusive, 'documents')
+    chunks = timed(iter_chunks(documents, chunk_processes(len(files))), inclusive, 'chunks')
+    clock.enter('faiss')
+    vectorstore = add_chunks(None, chunks, get_embeddings(os.getenv("OPENAI_API_KEY")), manifest, lexical=lexical)
+    clock.enter('save')
+    index_registry.put(owner, repo, sha, vectorstore, manifest, lexical)
+    clock.finish()
+
+    stages = clock.stages
+    _, lexical_seconds = STAGE_SECONDS.totals().get(('lexical_index',), (0, 0.0))
+    clock.stages = {
+        'head_sha': stages['head_sha'],
+        'listing': stages['listing'],
+        'documents': inclusive['documents'],
+        'chunking': inclusive['chunks'] - inclusive['documents'],
+        'lexical': lexical_seconds,
+        'faiss': stages['faiss'] - inclusive['chunks'] - lexical_seconds,
+        'save': stages['save'],
+    }
+
+
+PIPELINE_RUNNERS = {
+    'tree': tree_pipeline,
+    'generate': generate_pipeline,
+    'set-repo': set_repo_pipeline,
+}
+
+
+def stand_in(spec):
+    """The GitHub stand-in and repository URL for a run: a cassette or a synthetic repository."""
+    from benchmarks.cassette import Cassette, SyntheticGitHub
+    from benchmarks.synthetic import synthetic_files
+
+    if spec.get('cassette'):
+        cassette = Cassette.load(spec['cassette'])
+        return cassette, cassette.meta['repo_url']
+    repo = f"synthetic-{spec['files']}"
+    entries, blobs = synthetic_files(spec['files'])
+    return SyntheticGitHub('bench', repo, entries, blobs), f"https://github.com/bench/{repo}"
+
+
+def run_child(spec):
+    from benchmarks.cassette import install
+    from utils.indexer import current_rss
+
+    adapter, repo_url = stand_in(spec)
+    install(adapter)
+    rss_start = current_rss()
+    clock = StageClock()
+    # Keep the pipelines' prints off stdout, which carries the result
+    with redirect_stdout(sys.stderr):
+        PIPELINE_RUNNERS[spec['pipeline']](repo_url, clock)
+    wall = clock.finish()
+    requests = adapter.request_counts()
+    return {
+        'size': spec['size'],
+        'pipeline': spec['pipeline'],
+        'source': os.getenv("REPO_SOURCE", "github"),
+        'wall_s': round(wall, 3),
+        'requests': requests.pop('total'),
+        'requests_by_endpoint': requests,
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'rss_start_mb': round(rss_start / 2 ** 20, 1),
+        'stages': {name: round(seconds, 3) for name, seconds in clock.stages.items()},
+    }
+
+
+def record_child(spec):
+    """Runs the pipelines' GitHub traffic against the real API and saves it as a cassette."""
+    from benchmarks.cassette import Cassette, RecordingAdapter, install
+    from utils.indexer import iter_documents, list_relevant_files
+    from utils.sources import get_source
+    from utils.utils import parse_repo_url, process_repo_tree
+
+    cassette = Cassette(meta={'repo_url': spec['record'], 'source': os.getenv("REPO_SOURCE", "github"),
+                              'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds')})
+    install(RecordingAdapter(cassette))
+    owner, repo = parse_repo_url(spec['record'])
+    source = get_source(owner, repo)
+    with redirect_stdout(sys.stderr):
+        process_repo_tree(spec['record'])
+        for _ in iter_documents(source, list_relevant_files(source, source.head_sha())):
+            pass
+        list(source.iter_commits(source.head_sha(), limit=10))
+    cassette.save(spec['cassette'])
+    return {'cassette': spec['cassette'], 'responses': len(cassette.interactions)}
+
+
+# === Orchestration ===
+def run_isolated(spec, source):
+    """Runs `spec` in a fresh interpreter with empty caches and the fake backends; returns its JSON result."""
+    with tempfile.TemporaryDirectory(prefix='bench-') as cache:
+        env = dict(
+            os.environ,
+            LLM_BACKEND='fake',
+            EMBEDDINGS_BACKEND='hash',
+            FAKE_TOKEN_DELAY='0',
+            REPO_SOURCE=source,
+            BLOB_CACHE_DIR=os.path.join(cache, 'blobs'),
+            INDEX_STORE_DIR=os.path.join(cache, 'indexes'),
+            EMBEDDING_CACHE_DIR=os.path.join(cache, 'embeddings'),
+        )
+        if spec.get('record'):
+            # Recording talks to the real services
+            for name in ('LLM_BACKEND', 'EMBEDDINGS_BACKEND'):
+                env.pop(name)
+        result = subprocess.run([sys.executable, '-m', 'benchmarks.bench_pipelines', '--child', json.dumps(spec)],
+                                cwd=API_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark run {spec} failed:\n{result.stderr[-4000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Returns (report lines, regressed): each result against the baseline result of the same size and pipeline."""
+    previous = {(r['size'], r['pipeline'], r.get('source')): r for r in baseline['results']}
+    lines = []
+    regressed = False
+    for result in results:
+        before = previous.get((result['size'], result['pipeline'], result.get('source')))
+        if before is None:
+            lines.append(f"{result['size']:>8} {result['pipeline']:<9} (not in baseline)")
+            continue
+        changes = []
+        for metric in COMPARED:
+            old, new = before[metric], result[metric]
+            ratio = new / old if old else (1.0 if new == old else float('inf'))
+            flag = ''
+            if ratio > 1 + tolerance:
+                flag = ' REGRESSED'
+                regressed = True
+            changes.append(f"{metric} {old} -> {new} ({ratio - 1:+.0%}){flag}")
+        lines.append(f"{result['size']:>8} {result['pipeline']:<9} " + ', '.join(changes))
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', choices=SIZES, default=list(SIZES))
+    parser.add_argument('--pipelines', nargs='+', choices=PIPELINES, default=list(PIPELINES))
+    parser.add_argument('--source', choices=('github', 'tarball'), default='github')
+    parser.add_argument('--cassette', help="Replay (or with --record, write) a recorded repository")
+    parser.add_argument('--record', metavar='REPO_URL', help="Record a cassette from the real GitHub API")
+    parser.add_argument('--output', help="Also write the results to this file")
+    parser.add_argument('--baseline', help="Results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed growth before a metric counts as regressed")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        spec = json.loads(args.child)
+        print(json.dumps(record_child(spec) if spec.get('record') else run_child(spec)))
+        return 0
+    if args.record:
+        if not args.cassette:
+            parser.error("--record needs --cassette")
+        print(json.dumps(run_isolated({'record': args.record, 'cassette': os.path.abspath(args.cassette)}, args.source)))
+        return 0
+
+    if args.cassette:
+        label = os.path.basename(args.cassette).split('.')[0]
+        specs = [{'size': label, 'cassette': os.path.abspath(args.cassette)}]
+    else:
+        specs = [{'size': size, 'files': SIZES[size]} for size in args.sizes]
+    results = []
+    for spec in specs:
+        for pipeline in args.pipelines:
+            result = run_isolated(dict(spec, pipeline=pipeline), args.source)
+            print(f"{result['size']:>8} {pipeline:<9} {result['wall_s']:>8.3f}s {result['requests']:>6} requests "
+                  f"{result['peak_rss_mb']:>7.1f} MB peak", file=sys.stderr)
+            results.append(result)
+
+    run = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+    print(json.dumps(run, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines, regressed = compare(results, json.load(f), args.tolerance)
+        print('\n'.join(lines), file=sys.stderr)
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Prompt size and compaction time for the README generator on synthetic repositories.
+
+    python -m benchmarks.bench_prompt [--budget 6000]
+"""
+import argparse
+import json
+import time
+
+from benchmarks.synthetic import synthetic_repo
+from utils.prompt import compact_repo_tree, count_tokens
+from utils.tree import build_tree, render_tree
+
+
+def run(sizes, budget):
+    results = []
+    for n_files in sizes:
+        entries, imports = synthetic_repo(n_files)
+        root = build_tree(entries)
+
+        start = time.perf_counter()
+        full = render_tree(root, 'repo', imports)
+        full_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        compact = compact_repo_tree(root, 'repo', imports, budget)
+        compact_ms = (time.perf_counter() - start) * 1000
+
+        results.append({
+            'files': n_files,
+            'full_tokens': count_tokens(full),
+            'compact_tokens': count_tokens(compact),
+            'budget': budget,
+            'render_ms': round(full_ms, 1),
+            'compact_ms': round(compact_ms, 1),
+            # Compaction must be deterministic for prompt and response caching
+            'deterministic': compact == compact_repo_tree(root, 'repo', imports, budget),
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget', type=int, default=6000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    args = parser.parse_args()
+    for result in run(args.sizes, args.budget):
+        print(json.dumps(result))
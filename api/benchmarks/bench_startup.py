@@ -0,0 +1,140 @@
+"""
+Cold-start cost of the API: how long `import app` takes, which modules it spends that
+time on, and what the first requests pay for the dependencies the routes load lazily.
+
+    python -m benchmarks.bench_startup [--repeat 5] [--top 15] [--files 200]
+
+Each measurement runs in a fresh interpreter with the fake LLM and hash embeddings.
+
+- import: `python -X importtime -c "import app"`. It reports the best total of --repeat
+  runs, every app module (app, routes.*, utils.*) with its cumulative time, and the
+  --top slowest third-party packages. Times are in milliseconds.
+- first_requests: a first /api/tree and then a first /api/set-repo against a synthetic
+  repository of --files files. This is done once cold and once after
+  utils.startup.warm_up(imports=True), so the cost moved off startup shows up where
+  it is paid.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PACKAGES = ('app', 'routes', 'utils')
+
+
+def child_env(cache):
+    return dict(
+        os.environ,
+        LLM_BACKEND='fake',
+        EMBEDDINGS_BACKEND='hash',
+        FAKE_TOKEN_DELAY='0',
+        BLOB_CACHE_DIR=os.path.join(cache, 'blobs'),
+        INDEX_STORE_DIR=os.path.join(cache, 'indexes'),
+        EMBEDDING_CACHE_DIR=os.path.join(cache, 'embeddings'),
+        COMMIT_HISTORY_DIR=os.path.join(cache, 'commits'),
+    )
+
+
+def parse_importtime(text):
+    """[(name, depth, self µs, cumulative µs)] from -X importtime output, in the order imports finished."""
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), depth, int(own), int(cumulative)))
+    return rows
+
+
+def import_profile(repeat, top):
+    best = None
+    with tempfile.TemporaryDirectory(prefix='startup-') as cache:
+        for _ in range(repeat):
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=API_DIR,
+                                    env=child_env(cache), capture_output=True, text=True, check=True)
+            rows = parse_importtime(result.stderr)
+            total = next(cumulative for name, _, _, cumulative in rows if name == 'app')
+            if best is None or total < best[0]:
+                best = (total, rows)
+
+    total, rows = best
+    app_modules = {name: round(cumulative / 1000, 1) for name, _, _, cumulative in rows
+                   if name.split('.')[0] in APP_PACKAGES}
+    # Top-level third-party packages, each including the submodules it imported
+    packages = {name: cumulative for name, _, _, cumulative in rows
+                if '.' not in name and name not in APP_PACKAGES and name not in sys.stdlib_module_names}
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {
+        'import_app_ms': round(total / 1000, 1),
+        'app_modules_ms': app_modules,
+        'packages_ms': {name: round(cumulative / 1000, 1) for name, cumulative in slowest},
+    }
+
+
+def first_requests_child(spec):
+    """Times `import app` and the first requests in this (fresh) process."""
+    from benchmarks.cassette import SyntheticGitHub, install
+    from benchmarks.synthetic import synthetic_files
+
+    entries, blobs = synthetic_files(spec['files'])
+    install(SyntheticGitHub('bench', 'startup', entries, blobs))
+    repo_url = 'https://github.com/bench/startup'
+
+    timings = {}
+    start = time.perf_counter()
+    from app import app
+    timings['import_app_ms'] = (time.perf_counter() - start) * 1000
+    if spec['warm']:
+        from utils.startup import warm_up
+        start = time.perf_counter()
+        warm_up(imports=True)
+        timings['warm_up_ms'] = (time.perf_counter() - start) * 1000
+
+    client = app.test_client()
+    for name, path in (('tree', '/api/tree'), ('set-repo', '/api/set-repo')):
+        start = time.perf_counter()
+        response = client.post(path, json={'url': repo_url})
+        timings[f'first_{name}_ms'] = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} answered {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return {key: round(value, 1) for key, value in timings.items()}
+
+
+def first_requests(files):
+    results = {}
+    for warm in (False, True):
+        with tempfile.TemporaryDirectory(prefix='startup-') as cache:
+            spec = json.dumps({'files': files, 'warm': warm})
+            result = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', spec], cwd=API_DIR,
+                                    env=child_env(cache), capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr[-2000:])
+            results['warm' if warm else 'cold'] = json.loads(result.stdout.strip().splitlines()[-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="Third-party packages listed")
+    parser.add_argument('--files', type=int, default=200, help="Files in the synthetic repository")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(first_requests_child(json.loads(args.child))))
+        return
+    print(json.dumps({
+        'import': import_profile(args.repeat, args.top),
+        'first_requests': first_requests(args.files),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
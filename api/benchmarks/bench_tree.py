@@ -0,0 +1,135 @@
+"""
+Memory and render time of the repository tree model against the dict-and-concatenation
+implementation it replaced, on synthetic repositories.
+
+    python -m benchmarks.bench_tree [--sizes 10000 50000 100000] [--repeat 3]
+
+For each size the tree is built from the same listing by both implementations. Memory
+is what the built tree holds (tracemalloc, the listing itself excluded) and the peak
+while rendering; times are the best of --repeat runs. The text renderings are checked
+to be identical.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from collections import deque
+
+from benchmarks.synthetic import synthetic_repo
+from utils.tree import build_tree, iter_ndjson, render_tree, tree_to_dict
+from utils.utils import FILE_TYPES, IGNORED_FOLDERS, file_type_of
+
+
+# === The implementation before utils.tree, kept as the baseline ===
+def legacy_build_tree(entries, path=''):
+    root = {'path': path, 'children': []}
+    nodes = {path: root}
+    prefix = f"{path}/" if path else ''
+    for entry in entries:
+        entry_path = entry['path']
+        if not entry_path.startswith(prefix):
+            continue
+        parent_path, _, name = entry_path.rpartition('/')
+        parent = nodes.get(parent_path)
+        if parent is None:
+            continue
+        if entry['type'] == 'tree':
+            if name in IGNORED_FOLDERS:
+                continue
+            node = {'path': entry_path, 'children': []}
+            nodes[entry_path] = node
+            parent['children'].append(('dir', node))
+        else:
+            parent['children'].append(('file', dict(entry, name=name)))
+    return root
+
+
+def legacy_render_tree(node, repo, imports, depth=0):
+    indent = '  ' * depth
+    tree_structure = f"{indent}{node['path'] if node['path'] else repo}:\n"
+    import_section = ''
+    folder_tree = ''
+    file_counts = {key: 0 for key in FILE_TYPES}
+
+    for kind, item in node['children']:
+        if kind == 'dir':
+            folder_tree += legacy_render_tree(item, repo, imports, depth + 1)
+            continue
+        file_type = file_type_of(item['name'])
+        file_counts[file_type or "Others"] += 1
+        if file_type != "Images":
+            folder_tree += f"{indent}  {item['name']}\n"
+            file_imports = imports.get(item['path'])
+            if file_imports:
+                import_section += f"{indent}  Imports for {item['name']}:\n{file_imports}\n"
+
+    for file_type, count in file_counts.items():
+        if count > 0:
+            tree_structure += f"{indent}  ({count} {file_type.lower()} files detected)\n"
+    return tree_structure + folder_tree + import_section
+
+
+# === Measurements ===
+def measure(fn, repeat):
+    """(result, best seconds, peak traced bytes above the starting point) of calling fn."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    kept = fn()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    del kept
+    return result, best, peak
+
+
+def retained(fn):
+    """Bytes still allocated by fn's result once it returns."""
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return result, size
+
+
+def run(n_files, repeat):
+    entries, imports = synthetic_repo(n_files)
+    legacy_root, legacy_bytes = retained(lambda: legacy_build_tree(entries))
+    root, tree_bytes = retained(lambda: build_tree(entries))
+    _, legacy_build_s, _ = measure(lambda: legacy_build_tree(entries), repeat)
+    _, build_s, _ = measure(lambda: build_tree(entries), repeat)
+
+    legacy_text, legacy_render_s, legacy_render_peak = measure(
+        lambda: legacy_render_tree(legacy_root, 'repo', imports), repeat)
+    text, render_s, render_peak = measure(lambda: render_tree(root, 'repo', imports), repeat)
+    _, json_s, json_peak = measure(lambda: json.dumps(tree_to_dict(root, imports)), repeat)
+    # Streamed: only the record being written is held at once
+    _, ndjson_s, ndjson_peak = measure(lambda: deque(iter_ndjson(root, imports), maxlen=1), repeat)
+
+    return {
+        'files': n_files,
+        'entries': len(entries),
+        'identical': text == legacy_text,
+        'text_mb': round(len(text) / 2 ** 20, 2),
+        'tree_mb': {'legacy': round(legacy_bytes / 2 ** 20, 2), 'slots': round(tree_bytes / 2 ** 20, 2)},
+        'build_ms': {'legacy': round(legacy_build_s * 1000, 1), 'slots': round(build_s * 1000, 1)},
+        'render_ms': {'legacy': round(legacy_render_s * 1000, 1), 'text': round(render_s * 1000, 1),
+                      'json': round(json_s * 1000, 1), 'ndjson': round(ndjson_s * 1000, 1)},
+        'render_peak_mb': {'legacy': round(legacy_render_peak / 2 ** 20, 2), 'text': round(render_peak / 2 ** 20, 2),
+                           'json': round(json_peak / 2 ** 20, 2), 'ndjson': round(ndjson_peak / 2 ** 20, 2)},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    for n_files in args.sizes:
+        print(json.dumps(run(n_files, args.repeat)))
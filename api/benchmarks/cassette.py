@@ -0,0 +1,208 @@
+"""
+GitHub stand-ins for the benchmarks: recorded responses (cassettes) or a synthetic
+repository, served through a requests transport adapter mounted on the shared
+"github" and "codeload" sessions. The real client, rate limiter, retries and caches
+run unchanged; only the network is replaced.
+"""
+import base64
+import gzip
+import io
+import json
+import re
+import tarfile
+import threading
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from utils.clients import http_session
+
+
+CASSETTE_VERSION = 1
+# Headers worth keeping from recorded responses
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset')
+# Answered by the stand-ins so the rate limiter never waits
+RATE_LIMIT_HEADERS = {'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '5000', 'X-RateLimit-Reset': '9999999999'}
+UPSTREAM_SESSIONS = ('github', 'codeload')
+
+
+def endpoint_of(url):
+    """Groups request URLs for the request counts: commits, trees, blobs, contents, codeload or other."""
+    parsed = urlparse(url)
+    if parsed.netloc == 'codeload.github.com':
+        return 'codeload'
+    match = re.match(r'/repos/[^/]+/[^/]+/(?:git/)?(commits|trees|blobs|contents)\b', parsed.path)
+    return match[1] if match else 'other'
+
+
+def make_response(request, status, body, headers=None):
+    response = Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.raw = io.BytesIO(body)
+    response.url = request.url
+    response.request = request
+    response.encoding = 'utf-8'
+    return response
+
+
+class StandInAdapter(BaseAdapter):
+    """Answers requests with `respond(request)` and counts them per endpoint."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests[endpoint_of(request.url)] += 1
+        return self.respond(request)
+
+    def respond(self, request):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def request_counts(self):
+        with self._lock:
+            return dict(self.requests, total=sum(self.requests.values()))
+
+
+class Cassette(StandInAdapter):
+    """
+    Recorded responses keyed by "<method> <url>". Requests missing from the cassette get
+    a 404, counted under "missing", so a stale recording shows up in the results.
+    """
+
+    def __init__(self, interactions=None, meta=None):
+        super().__init__()
+        self.interactions = interactions or {}
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt') as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"{path} is a version {data.get('version')} cassette; expected {CASSETTE_VERSION}")
+        return cls(data['interactions'], data.get('meta'))
+
+    def save(self, path):
+        with gzip.open(path, 'wt') as f:
+            json.dump({'version': CASSETTE_VERSION, 'meta': self.meta, 'interactions': self.interactions}, f)
+
+    def record(self, request, response, body):
+        headers = {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers}
+        with self._lock:
+            self.interactions[f"{request.method} {request.url}"] = {
+                'status': response.status_code,
+                'headers': headers,
+                'body': base64.b64encode(body).decode(),
+            }
+
+    def respond(self, request):
+        interaction = self.interactions.get(f"{request.method} {request.url}")
+        if interaction is None:
+            with self._lock:
+                self.requests['missing'] += 1
+            return make_response(request, 404, b'{"message": "Not in cassette"}')
+        headers = dict(interaction['headers'], **RATE_LIMIT_HEADERS)
+        return make_response(request, interaction['status'], base64.b64decode(interaction['body']), headers)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Sends requests to the real upstream and records every response into `cassette`."""
+
+    def __init__(self, cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        body = response.content
+        self.cassette.record(request, response, body)
+        # Hand back a response that can still be read as a stream
+        return make_response(request, response.status_code, body, response.headers)
+
+
+class SyntheticGitHub(StandInAdapter):
+    """
+    The GitHub REST API and codeload for one synthetic repository: the repository's
+    default branch, HEAD and commit lookups, the recursive Git Trees listing, blobs,
+    a paged commit list and tar.gz archives.
+    """
+
+    def __init__(self, owner, repo, entries, blobs, sha='0' * 40, commit_count=250):
+        super().__init__()
+        self.owner = owner
+        self.repo = repo
+        self.entries = entries
+        self.blobs = blobs
+        self.sha = sha
+        self.commit_count = commit_count
+        self._archive = None
+
+    def respond(self, request):
+        parsed = urlparse(request.url)
+        if parsed.netloc == 'codeload.github.com':
+            return make_response(request, 200, self.archive(), {'Content-Type': 'application/x-gzip'})
+
+        prefix = f"/repos/{self.owner}/{self.repo}"
+        path = parsed.path[len(prefix):] if parsed.path.startswith(prefix) else None
+        if path is None:
+            return self.json(request, 404, {'message': 'Not Found'})
+        if path == '':
+            return self.json(request, 200, {'full_name': f"{self.owner}/{self.repo}", 'default_branch': 'main'})
+        if path.startswith('/commits/'):
+            return self.json(request, 200, {'sha': self.sha, 'commit': {'tree': {'sha': self.sha}},
+                                            'files': [{'filename': self.entries[0]['path']}] if self.entries else []})
+        if path == '/commits':
+            query = parse_qs(parsed.query)
+            per_page = int(query.get('per_page', ['30'])[0])
+            first = (int(query.get('page', ['1'])[0]) - 1) * per_page
+            return self.json(request, 200, [{
+                'sha': f"{n:040x}",
+                'commit': {'author': {'name': 'Bench', 'email': 'bench@example.com', 'date': '2024-01-01T00:00:00Z'},
+                           'message': f"Commit {n}"},
+            } for n in range(first, min(first + per_page, self.commit_count))])
+        if path.startswith('/git/trees/'):
+            return self.json(request, 200, {'sha': self.sha, 'tree': self.entries, 'truncated': False})
+        if path.startswith('/git/blobs/'):
+            data = self.blobs.get(path.rsplit('/', 1)[-1])
+            if data is None:
+                return self.json(request, 404, {'message': 'Not Found'})
+            return self.json(request, 200, {'encoding': 'base64', 'content': base64.b64encode(data).decode(),
+                                            'size': len(data)})
+        return self.json(request, 404, {'message': 'Not Found'})
+
+    def json(self, request, status, body):
+        headers = dict(RATE_LIMIT_HEADERS, **{'Content-Type': 'application/json'})
+        return make_response(request, status, json.dumps(body).encode(), headers)
+
+    def archive(self):
+        """The repository as codeload serves it: a tar.gz with everything under "<repo>-<sha>/"."""
+        with self._lock:
+            if self._archive is None:
+                buffer = io.BytesIO()
+                with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+                    for entry in self.entries:
+                        if entry['type'] != 'blob':
+                            continue
+                        data = self.blobs[entry['sha']]
+                        info = tarfile.TarInfo(f"{self.repo}-{self.sha[:7]}/{entry['path']}")
+                        info.size = len(data)
+                        archive.addfile(info, io.BytesIO(data))
+                self._archive = buffer.getvalue()
+            return self._archive
+
+
+def install(adapter):
+    """Routes the upstream sessions' HTTPS traffic through `adapter`."""
+    for name in UPSTREAM_SESSIONS:
+        http_session(name).mount("https://", adapter)
+    return adapter
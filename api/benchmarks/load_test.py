@@ -0,0 +1,225 @@
+"""
+Throughput and latency of the production server under concurrent clients, with the fake
+LLM, hash embeddings and a synthetic GitHub.
+
+    python -m benchmarks.load_test [--scenarios tree generate query] [--concurrency 1 8 32 64]
+                                   [--duration 10] [--files 200] [--server auto|gunicorn|werkzeug]
+
+The server runs in its own process through serve.py, with ROUTE_LIMITS and the other
+settings taken from the environment. Each scenario is run at each concurrency for
+--duration seconds by that many client threads sending requests back to back:
+
+- tree: POST /api/tree
+- generate: POST /api/generate, with a different message each time so no README is cached
+- query: POST /api/query without the answer cache, one session per client
+
+Results are printed as JSON lines: requests per second answered 200, 429 rejections,
+other errors and latency percentiles of the successful requests. Finally the server is
+sent SIGTERM and the time it took to drain and exit is reported.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('tree', 'generate', 'query')
+
+
+def serve_child(spec):
+    """Runs the server with a synthetic GitHub stand-in installed (in the child process)."""
+    from benchmarks.cassette import SyntheticGitHub, install
+    from benchmarks.synthetic import synthetic_files
+
+    entries, blobs = synthetic_files(spec['files'])
+    install(SyntheticGitHub('load', 'repo', entries, blobs))
+
+    from app import app
+    from serve import serve
+
+    # Keep per-request access logs out of the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    logging.getLogger('gunicorn.access').setLevel(logging.WARNING)
+    serve(app, '127.0.0.1', spec['port'], workers=1, threads=spec['threads'], server=spec['server'])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(spec, cache):
+    env = dict(
+        os.environ,
+        LLM_BACKEND='fake',
+        EMBEDDINGS_BACKEND='hash',
+        FAKE_TOKEN_DELAY=str(spec['token_delay']),
+        BLOB_CACHE_DIR=os.path.join(cache, 'blobs'),
+        INDEX_STORE_DIR=os.path.join(cache, 'indexes'),
+        EMBEDDING_CACHE_DIR=os.path.join(cache, 'embeddings'),
+    )
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.load_test', '--serve', json.dumps(spec)],
+                               cwd=API_DIR, env=env)
+    return process
+
+
+def wait_ready(base_url, process, timeout=60):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if requests.get(base_url + '/', timeout=1).ok:
+                return
+        except (requests.ConnectionError, requests.Timeout):
+            # Not listening yet, or a gunicorn worker still warming up behind the bound socket
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+class Client:
+    """One client thread's session and request for a scenario."""
+
+    def __init__(self, base_url, scenario, number):
+        import requests
+
+        self.http = requests.Session()
+        self.base_url = base_url
+        self.scenario = scenario
+        self.number = number
+        self.sent = 0
+        self.session_id = None
+        self.repo_url = 'https://github.com/load/repo'
+
+    def setup(self):
+        if self.scenario == 'query':
+            response = self.http.post(self.base_url + '/api/set-repo', json={'url': self.repo_url}, timeout=600)
+            response.raise_for_status()
+            self.session_id = response.json()['session_id']
+
+    def request(self):
+        self.sent += 1
+        if self.scenario == 'tree':
+            return self.http.post(self.base_url + '/api/tree', json={'url': self.repo_url}, timeout=600)
+        if self.scenario == 'generate':
+            message = f"load test client {self.number} request {self.sent}"
+            return self.http.post(self.base_url + '/api/generate', json={'url': self.repo_url, 'message': message},
+                                  timeout=600)
+        return self.http.post(self.base_url + '/api/query', timeout=600, json={
+            'query': f"What does `process_repo_tree` do? ({self.number}-{self.sent})",
+            'session_id': self.session_id,
+            'cache': False,
+        })
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_level(base_url, scenario, concurrency, duration):
+    clients = [Client(base_url, scenario, n) for n in range(concurrency)]
+    for client in clients:
+        client.setup()
+
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def loop(client):
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                status = client.request().status_code
+            except Exception:
+                status = 'error'
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+            if status == 429:
+                # Back off the way a client honouring Retry-After would, without waiting out the run
+                time.sleep(0.05)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    ok = statuses.get(200, 0)
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': sum(statuses.values()),
+        'ok': ok,
+        'rejected': statuses.get(429, 0),
+        'errors': sum(count for status, count in statuses.items() if status not in (200, 429)),
+        'throughput_rps': round(ok / wall, 2),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--files', type=int, default=200, help="Files in the synthetic repository")
+    parser.add_argument('--threads', type=int, default=32, help="Server threads")
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'werkzeug'), default='auto')
+    parser.add_argument('--token-delay', type=float, default=0.005, help="Fake LLM seconds per token")
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_child(json.loads(args.serve))
+        return 0
+
+    spec = {'port': free_port(), 'files': args.files, 'threads': args.threads, 'server': args.server,
+            'token_delay': args.token_delay}
+    base_url = f"http://127.0.0.1:{spec['port']}"
+    with tempfile.TemporaryDirectory(prefix='load-') as cache:
+        process = start_server(spec, cache)
+        try:
+            wait_ready(base_url, process)
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    result = run_level(base_url, scenario, concurrency, args.duration)
+                    print(f"{scenario:>9} x{concurrency:<4} {result['throughput_rps']:>8.2f} req/s "
+                          f"{result['rejected']:>6} rejected {result['errors']:>4} errors "
+                          f"p95 {result['p95_ms']} ms", file=sys.stderr)
+                    print(json.dumps(result), flush=True)
+        finally:
+            started = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=120)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            print(json.dumps({'shutdown_s': round(time.perf_counter() - started, 2), 'exit_status': process.returncode}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Deterministic synthetic repositories for the benchmarks, shaped like Git Trees API listings.
+"""
+import hashlib
+import random
+
+
+LANGUAGES = [
+    ('.py', ["import os", "import sys", "from flask import Flask", "import requests",
+             "from utils.utils import helper", "import numpy", "from django.db import models"]),
+    ('.ts', ["react", "@mui/material/Button", "./styles.css", "axios", "lodash", "@tanstack/react-query"]),
+    ('.js', ["express", "fs", "path", "./config", "lodash"]),
+    ('.go', ["fmt", "net/http", "github.com/gin-gonic/gin/render"]),
+    ('.java', ["java.util.List", "org.springframework.boot.SpringApplication"]),
+    ('.rs', ["std::io", "serde::Deserialize", "tokio"]),
+    ('.md', []),
+    ('.json', []),
+    ('.png', []),
+]
+
+FOLDERS = ['src', 'lib', 'components', 'utils', 'api', 'models', 'views', 'tests', 'docs', 'assets',
+           'services', 'handlers', 'config', 'locales', 'migrations', 'scripts', 'core', 'internal']
+
+
+def _sha(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def synthetic_repo(n_files, seed=0, max_depth=6):
+    """
+    Returns (entries, imports): a git-tree-ordered entry list with `n_files` blobs, and
+    {path: newline-joined import lines} for the files that have imports.
+    """
+    rng = random.Random(seed)
+    dirs = ['']
+    paths = {}
+    imports = {}
+    while len(paths) < n_files:
+        if rng.random() < 0.15 and len(dirs) < n_files // 4 + 1:
+            parent = rng.choice(dirs)
+            if parent.count('/') < max_depth:
+                name = f"{rng.choice(FOLDERS)}{rng.randint(0, 30)}"
+                dirs.append(f"{parent}/{name}" if parent else name)
+            continue
+        folder = rng.choice(dirs)
+        ext, candidates = rng.choice(LANGUAGES)
+        name = f"file_{len(paths)}{ext}"
+        path = f"{folder}/{name}" if folder else name
+        paths[path] = ext
+        if candidates:
+            imports[path] = '\n'.join(rng.sample(candidates, rng.randint(1, len(candidates))))
+
+    entries = [{'path': d, 'type': 'tree', 'sha': _sha(d), 'size': None} for d in dirs if d]
+    entries += [{'path': p, 'type': 'blob', 'sha': _sha(p), 'size': 100 + len(p)} for p in paths]
+    # Git orders entries by path with folders compared as "name/"
+    entries.sort(key=lambda e: e['path'] + ('/' if e['type'] == 'tree' else ''))
+    return entries, imports
+
+
+# Import headers written the way each language's source files usually start
+SOURCE_HEADERS = {
+    '.py': ["import os", "import sys", "from flask import Flask, jsonify", "import numpy as np",
+            "from .models import User", "from django.db import models"],
+    '.js': ["import React from 'react';", "import { useState } from 'react';", "const fs = require('fs');",
+            "import './styles.css';", "const express = require(\"express\");", "import axios from 'axios';"],
+    '.ts': ["import type { Request } from 'express';", "import {\n  Button,\n  Card,\n} from '@mui/material';",
+            "export { helper } from './helpers';", "const path = require('path');", "import * as z from 'zod';"],
+    '.go': ['import "fmt"', 'import (\n\t"context"\n\t"net/http"\n\n\tgin "github.com/gin-gonic/gin"\n)'],
+    '.java': ["import java.util.List;", "import java.util.*;", "import static org.junit.Assert.assertEquals;",
+              "import org.springframework.boot.SpringApplication;"],
+    '.rs': ["use std::io;", "use serde::Deserialize;", "extern crate tokio;", "pub use crate::config;"],
+    '.cpp': ["#include <vector>", "#include \"app/config.h\"", "#include<map>", "# include <string>"],
+    '.c': ["#include <stdio.h>", "#include <stdlib.h>", "#include \"util.h\""],
+    '.cs': ["using System;", "using System.Linq;", "using static System.Math;"],
+    '.php': ["require 'vendor/autoload.php';", "include_once(\"config.php\");", "require_once __DIR__ . '/x.php';"],
+    '.md': [],
+}
+
+# A line of ordinary code, repeated to give files a realistic body
+SOURCE_BODY = {
+    '.py': "    result = compute(value, key=item) if value else None  # {n}",
+    '.js': "  const value{n} = items.map((item) => item.id).filter(Boolean);",
+    '.ts': "  const value{n}: number[] = items.map((item) => item.id);",
+    '.go': "\tvalue{n}, err := compute(ctx, item)",
+    '.java': "        int value{n} = items.stream().mapToInt(Item::getId).sum();",
+    '.rs': "    let value{n} = items.iter().map(|item| item.id).collect::<Vec<_>>();",
+    '.cpp': "    auto value{n} = std::accumulate(items.begin(), items.end(), 0);",
+    '.c': "    int value{n} = compute(items[{n}]);",
+    '.cs': "        var value{n} = items.Select(item => item.Id).ToList();",
+    '.php': "    $value{n} = array_map(fn($item) => $item->id, $items);",
+    '.md': "Some documentation text for section {n}, with `inline code` and a [link](http://x).",
+}
+
+
+def synthetic_sources(n_files, seed=0, lines=(20, 400)):
+    """Returns [(path, content)]: source files of the SOURCE_HEADERS languages with import headers and code bodies."""
+    rng = random.Random(seed)
+    files = []
+    extensions = sorted(SOURCE_HEADERS)
+    for i in range(n_files):
+        ext = rng.choice(extensions)
+        headers = SOURCE_HEADERS[ext]
+        head = rng.sample(headers, rng.randint(1, len(headers))) if headers else []
+        body = [SOURCE_BODY[ext].format(n=n) for n in range(rng.randint(*lines))]
+        files.append((f"src/file_{i}{ext}", '\n'.join(head + [''] + body) + '\n'))
+    return files
+
+
+def synthetic_files(n_files, seed=0, lines=(5, 80)):
+    """
+    Returns (entries, blobs): a `synthetic_repo` listing whose blobs have content, with
+    SHAs and sizes computed from it the way git does, and {blob sha: bytes}.
+    """
+    from utils.sources import git_blob_sha
+
+    rng = random.Random(seed)
+    entries, _ = synthetic_repo(n_files, seed)
+    blobs = {}
+    for entry in entries:
+        if entry['type'] != 'blob':
+            continue
+        ext = entry['path'][entry['path'].rfind('.'):]
+        if ext in SOURCE_HEADERS:
+            headers = SOURCE_HEADERS[ext]
+            head = rng.sample(headers, rng.randint(1, len(headers))) if headers else []
+            body = [SOURCE_BODY[ext].format(n=n) for n in range(rng.randint(*lines))]
+            data = ('\n'.join(head + [''] + body) + '\n').encode()
+        elif ext == '.png':
+            data = b'\x89PNG\r\n\x1a\n\0' + rng.randbytes(rng.randint(64, 4096))
+        else:
+            data = ('{\n' + ',\n'.join(f'  "key{n}": {n}' for n in range(rng.randint(*lines))) + '\n}\n').encode()
+        entry['sha'] = git_blob_sha(data)
+        entry['size'] = len(data)
+        blobs[entry['sha']] = data
+    return entries, blobs
@@ -0,0 +1,53 @@
+from flask import Blueprint, jsonify
+from utils.jobs import job_manager
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Report the stage and progress of a background job
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Job not found"
+        }), 404
+
+    return jsonify({
+        "success": True,
+        "data": job.to_dict()
+    })
+
+
+@jobs_bp.route("/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    """
+    Fetch the result of a finished background job
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Job not found"
+        }), 404
+
+    if job.status == 'failed':
+        return jsonify({
+            "success": False,
+            "error": job.error
+        }), 500
+
+    if not job.finished:
+        return jsonify({
+            "success": False,
+            "error": "Job is still running",
+            "data": job.to_dict()
+        }), 202
+
+    return jsonify({
+        "success": True,
+        "data": job.result
+    })
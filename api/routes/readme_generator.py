@@ -1,10 +1,18 @@
 from flask import Blueprint, request, jsonify
-from utils.llm import get_groq_response
-from utils.utils import process_repo_tree
+from utils.llm import README_MODEL, get_groq_response, iter_sections, model_name, stream_groq_response
+from utils.sse import sse_event, sse_response
+from utils.jobs import JobRejected, job_manager
+from utils.limits import limited, rejected
+from utils.prompt import compact_repo_tree
+from utils.response_cache import normalize_text, response_cache
+from utils.sources import get_source
+from utils.utils import analyze_repo, parse_repo_url
 import base64
 import os
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# Part of the README cache key: bump it whenever the prompt in build_readme_prompt changes
+README_TEMPLATE_VERSION = 1
 
 readme_bp = Blueprint('readme', __name__)
 
@@ -16,28 +24,109 @@ def readme_generator():
     })
 
 @readme_bp.route("/generate", methods=["POST"])
+@limited('generate')
 def generate_readme():
     data = request.json
     repo_url = data.get('url')
     message = data.get('message', '')  # Optional message
 
-    
-    # For now, just print and return the data
-    print(f"Repository URL: {repo_url}")
-    print(f"Optional Message: {message}")
+    if data.get('async'):
+        owner, repo = parse_repo_url(repo_url)
+        sha = get_source(owner, repo, GITHUB_TOKEN).head_sha()
+        try:
+            job = job_manager.submit('generate', ('generate', owner, repo, sha, normalize_text(message)),
+                                     build_readme, repo_url, message, sha=sha,
+                                     # The README is the job's result, kept as long as the job
+                                     reuse=lambda job: True)
+        except JobRejected as e:
+            return rejected(str(e), e.status)
+        return jsonify({
+            "success": True,
+            "job_id": job.id,
+            "status_url": f"/api/jobs/{job.id}"
+        }), 202
 
-    from os import environ
+    return jsonify({
+        "success": True,
+        "data": build_readme(repo_url, message)
+    })
 
 
-    print("token : ",GITHUB_TOKEN)
+@readme_bp.route("/generate/stream", methods=["POST"])
+@limited('generate')
+def generate_readme_stream():
+    """
+    Server-Sent Events version of /generate: `stage` events while the repository is
+    crawled, `token` events as the README is generated, `section` events at each
+    heading, then `done` with the full README (or `error`).
+    """
+    data = request.json
+    repo_url = data.get('url')
+    message = data.get('message', '')  # Optional message
 
+    def events():
+        try:
+            owner, repo = parse_repo_url(repo_url)
+            key = readme_cache_key(owner, repo, get_source(owner, repo, GITHUB_TOKEN).head_sha(), message)
+            cached = response_cache.get(key)
+            if cached is not None:
+                # Replayed as a single token so clients see the same event sequence
+                yield sse_event({'stage': 'cached'}, 'stage')
+                tokens = [cached]
+            else:
+                yield sse_event({'stage': 'crawling'}, 'stage')
+                final_prompt = build_readme_prompt(repo_url, message)
+                yield sse_event({'stage': 'generating'}, 'stage')
+                tokens = stream_groq_response(final_prompt)
+            readme_md = ''
+            for kind, value in iter_sections(tokens):
+                if kind == 'token':
+                    readme_md += value
+                    yield sse_event({'token': value}, 'token')
+                else:
+                    yield sse_event({'title': value}, 'section')
+            if cached is None:
+                response_cache.put(key, readme_md)
+            yield sse_event({'readme_md': readme_md, 'cached': cached is not None}, 'done')
+        except Exception as e:
+            yield sse_event({'error': str(e)}, 'error')
+
+    return sse_response(events())
+
+
+def readme_cache_key(owner, repo, sha, message):
+    return ('generate', owner, repo, sha, model_name(README_MODEL), README_TEMPLATE_VERSION, normalize_text(message))
+
+
+def build_readme(repo_url, message='', progress=None, sha=None):
+    """
+    Crawls the repository and generates its README; returns the /generate response data.
+    READMEs are cached per commit (`sha`, resolved from HEAD when not given) and message.
+    """
+    owner, repo = parse_repo_url(repo_url)
+    key = readme_cache_key(owner, repo, sha or get_source(owner, repo, GITHUB_TOKEN).head_sha(), message)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return {'readme_md': cached, 'cached': True}
 
-    print("Processing the repository...")
+    final_prompt = build_readme_prompt(repo_url, message, progress)
+
+    # Generate the README.md using your LLM
+    if progress:
+        progress('generating')
+    readme_md = get_groq_response(final_prompt)
+    response_cache.put(key, readme_md)
+
+    return {
+        'readme_md': readme_md,
+        'cached': False
+    }
 
-    repo_tree = process_repo_tree(repo_url, '', GITHUB_TOKEN)
 
-    print("Repository Tree: ", repo_tree)
-    print("Generating the README...")
+def build_readme_prompt(repo_url, message='', progress=None):
+    root, repo, imports = analyze_repo(repo_url, '', GITHUB_TOKEN, progress=progress)
+    # Keep the structure within the model's context: large trees are summarised
+    repo_tree = compact_repo_tree(root, repo, imports)
 
     final_prompt = f"""
     You are generating a beautiful README.md for a project repository. The repository details are as follows:
@@ -97,14 +186,5 @@ def generate_readme():
     - Align the tech stack horizontally using the Markdown image format, ensuring they are visually balanced.
     """
 
-
-    # Generate the README.md using your LLM
-    readme_md = get_groq_response(final_prompt)
-
-    return jsonify({
-        "success": True,
-        "data": {
-            'readme_md': readme_md
-        }
-    })
+    return final_prompt
 
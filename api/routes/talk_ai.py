@@ -1,194 +1,218 @@
 # talk_ai.py - Updated Flask API with Agent + Memory + Tools (Fixed URL Regex)
 
 from flask import Flask, Blueprint, request, jsonify
-import requests
-import base64
-import re
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chat_models import ChatOpenAI
-from langchain.vectorstores import FAISS
-from langchain.memory import ConversationBufferMemory
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.agents import initialize_agent, AgentType, tool
 import os
+from utils.clients import get_breaker
+from utils.commit_history import commit_history
+from utils.github import GitHubError
+from utils.index_store import index_registry
+from utils.jobs import JobRejected, job_manager
+from utils.limits import limited, rejected
+from utils.llm import CHAT_MODEL, model_name
+from utils.response_cache import normalize_text, response_cache
+from utils.sessions import RepoContext, session_manager
+from utils.singleflight import repo_flight
+from utils.sources import get_source
+from utils.sse import sse_event, sse_response
+from utils.utils import parse_repo_url
 
 repo_talk = Blueprint('repo_talk', __name__)
 
-# Global state
-current_repo_data = {
-    'owner': None,
-    'repo': None,
-    'url': None,
-    'vectorstore': None,
-    'agent': None
-}
-
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-headers = {"Authorization": f"token {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
+# Part of the answer cache key: bump it whenever the agent's tools or prompt change
+AGENT_VERSION = 1
 
-valid_extensions = {".py", ".js", ".ts", ".java", ".cpp", ".c", ".cs", ".go", ".rs", ".php",
-                    ".html", ".css", ".json", ".xml", ".yaml", ".yml", ".md", ".txt", ".gitignore", ".dockerignore"}
-important_files = {"Dockerfile", "Makefile", "README", "LICENSE"}
+# LangChain, the embeddings and the indexer are imported inside the functions below, on
+# the first chat, so workers that never serve one start without them (see utils.startup)
 
 # === Tools ===
-@tool
-def add_numbers(a: int, b: int) -> int:
-    """Add two numbers."""
-    return a + b
-
-owner = ""
-repo = ""
-
-@tool
-def get_git_commits() -> str:
-    """Get the latest commits from a GitHub repository."""
-    global owner, repo
-    print("Fetching commits for repository:", owner, repo)
-    
-    if not owner or not repo:
-        return "Owner or repository not set. Please load the repository first using /set-repo."
-
-    url = f"https://api.github.com/repos/{owner}/{repo}/commits"
-    params = {
-        "sha": "main",
-        "per_page": 10
-    }
+def repo_tools(owner, repo, sha, qa_chain):
+    """The agent tools, bound to one loaded repository at commit `sha`."""
+    from langchain.agents import tool
+    from utils.chat import stage_callbacks
 
-    # Ensure headers are set for authenticated requests
-    response = requests.get(url, params=params, headers=headers)
-    print("Response status code:", response.status_code)
-
-    if response.status_code != 200:
-        print("Response:", response.text)
-        return f"Error fetching commits: {response.status_code} - {response.json().get('message', 'Unknown error')}"
-
-    data = response.json()
-    commit_lines = []
-    for item in data:
-        line = f"{item['commit']['author']['date']} - {item['commit']['author']['name']}: {item['commit']['message']} ({item['sha'][:7]})"
-        commit_lines.append(line)
-
-    return "\n".join(commit_lines) if commit_lines else "No commits found."
-
-@tool
-def search_repo(query: str) -> str:
-    """Answer questions about the loaded GitHub repository."""
-    qa = current_repo_data.get('qa_chain')
-    if not qa:
-        return "No repository loaded. Please load one with /set-repo."
-    result = qa.invoke({"query": query})
-    return result["result"]
-
-# === Utilities ===
-def is_relevant(file_name):
-    return (
-        any(file_name.endswith(ext) for ext in valid_extensions) or
-        any(file_name == name or file_name.startswith(name) for name in important_files)
-    )
+    @tool
+    def add_numbers(a: int, b: int) -> int:
+        """Add two numbers."""
+        return a + b
 
-def fetch_content(file_url):
-    res = requests.get(file_url, headers=headers)
-    if res.status_code == 200 and "content" in res.json():
-        return base64.b64decode(res.json()["content"]).decode("utf-8", errors="ignore")
-    return None
-
-def get_repo_documents(owner, repo, branch="main", path=""):
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={branch}"
-    res = requests.get(url, headers=headers)
-    docs = []
-    if res.status_code != 200:
-        return []
-    for item in res.json():
-        if item["type"] == "file" and is_relevant(item["name"]):
-            content = fetch_content(item["url"])
-            if content:
-                doc = Document(
-                    page_content=content,
-                    metadata={"path": item["path"], "file_name": item["name"]}
-                )
-                docs.append(doc)
-        elif item["type"] == "dir":
-            docs.extend(get_repo_documents(owner, repo, branch, item["path"]))
-    return docs
-
-def initialize_repo_context(repo_url):
-    global owner, repo
-    from langchain.chains import RetrievalQA
-    match = re.match(r"https?://github\.com/([^/]+)/([^/]+)(?:\.git)?/?$", repo_url)
-    if not match:
-        raise ValueError("Invalid GitHub repository URL")
-    owner, repo = match.groups()
-    if (current_repo_data['owner'] == owner and current_repo_data['repo'] == repo and current_repo_data['agent']):
-        return current_repo_data['agent']
-
-    print(f"Loading repository: {owner}/{repo}")
-    memory.clear()
-    repo_docs = get_repo_documents(owner, repo)
-    if not repo_docs:
-        raise ValueError("No documents found in repository or repository is private/doesn't exist")
-
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    chunks = splitter.split_documents(repo_docs)
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    vectorstore = FAISS.from_documents(chunks, embeddings)
-    retriever = vectorstore.as_retriever()
+    @tool
+    def get_git_commits(branch: str = "", since: str = "", until: str = "", author: str = "", path: str = "",
+                        limit: int = 20) -> str:
+        """
+        List commits of the loaded GitHub repository, newest first. All filters are optional:
+        branch (default: the default branch), since/until dates (YYYY-MM-DD, inclusive),
+        author (part of a name or email) and path (a file or folder the commit changed).
+        """
+        try:
+            branch, commits = commit_history.commits(
+                owner, repo, get_source(owner, repo, GITHUB_TOKEN), sha, branch or None,
+                since=since or None, until=until or None, author=author or None, path=path or None,
+                limit=max(1, min(limit, 100)),
+            )
+        except (GitHubError, ValueError) as e:
+            return f"Error fetching commits: {e}"
+
+        commit_lines = []
+        for item in commits:
+            summary = item['message'].split('\n', 1)[0]
+            line = f"{item['date']} - {item['author']}: {summary} ({item['sha'][:7]})"
+            commit_lines.append(line)
 
+        if commit_lines:
+            return "\n".join(commit_lines)
+        coverage = commit_history.coverage(owner, repo, branch)
+        note = f"No matching commits on {branch} (searched {coverage['commits']} commits back to {coverage['oldest']}"
+        if path:
+            note += f"; changed files are known for {coverage['with_files']} of them"
+        return note + ")."
+
+    @tool
+    def search_repo(query: str) -> str:
+        """Answer questions about the loaded GitHub repository."""
+        # Passed down to the retriever, so retrievals are timed too
+        result = qa_chain.invoke({"query": query}, config={"callbacks": [stage_callbacks]})
+        return result["result"]
+
+    return [add_numbers, get_git_commits, search_repo]
+
+def build_repo_context(repo_url, owner, repo, sha, progress=None):
+    """Builds the commit's index unless it is stored, and the chains on top of it."""
     from langchain.chains import RetrievalQA
+    from utils.chat import get_chat_model
+    from utils.embeddings import get_embeddings
+    from utils.indexer import build_index
+    from utils.retrieval import HybridRetriever
+
+    embeddings = get_embeddings(OPENAI_API_KEY)
+    # Concurrent loads of the same commit share one fetch and embedding pass
+    repo_flight.do(
+        ('index', owner, repo, sha),
+        index_registry.get_or_build, owner, repo, sha, embeddings,
+        lambda: build_index(owner, repo, sha, embeddings, GITHUB_TOKEN, progress)
+    )
+    # Identifier lookups are answered by the lexical index, everything else fuses it with FAISS.
+    # Both are fetched from the registry per search, so its LRU can evict them between searches
+    retriever = HybridRetriever(indexes=lambda: index_registry.indexes(owner, repo, sha, embeddings))
+
     qa_chain = RetrievalQA.from_chain_type(
-        llm=ChatOpenAI(openai_api_key=OPENAI_API_KEY),
+        llm=get_chat_model(OPENAI_API_KEY),
         retriever=retriever,
         return_source_documents=True,
     )
+    return RepoContext(owner, repo, repo_url, sha, qa_chain, repo_tools(owner, repo, sha, qa_chain))
+
+def initialize_repo_context(session, repo_url, progress=None):
+    """Points the session at the repository's HEAD commit, starting a fresh conversation if it changed."""
+    from langchain.agents import AgentType, initialize_agent
+    from utils.chat import get_chat_model
+
+    owner, repo = parse_repo_url(repo_url)
+    sha = get_source(owner, repo, GITHUB_TOKEN).head_sha()
+    if session.context and session.context.key == (owner, repo, sha) and session.agent:
+        return session.agent
+
+    context = session_manager.context(
+        (owner, repo, sha),
+        lambda: build_repo_context(repo_url, owner, repo, sha, progress)
+    )
+    if progress:
+        progress('loading agent')
 
-    tools = [add_numbers,get_git_commits, search_repo]
-    llm = ChatOpenAI(openai_api_key=OPENAI_API_KEY)
-    agent = initialize_agent(
-        tools=tools,
+    session.memory.clear()
+    # Streaming lets /query/stream forward tokens; /query still gets the full answer
+    llm = get_chat_model(OPENAI_API_KEY, streaming=True)
+    session.agent = initialize_agent(
+        tools=context.tools,
         llm=llm,
         agent=AgentType.OPENAI_FUNCTIONS,
-        memory=memory,
-        verbose=True,
+        memory=session.memory,
+        verbose=False,
     )
+    session.context = context
+    return session.agent
+
+def request_session(data=None):
+    """
+    The caller's session, identified by the X-Session-Id header or a `session_id`
+    field; requests without one start a new session, whose id is returned.
+    """
+    session_id = request.headers.get('X-Session-Id') or (data or {}).get('session_id') or request.args.get('session_id')
+    return session_manager.get(session_id[:128] if session_id else None)
+
+def cached_answer(session, query):
+    """
+    Looks the query up in the response cache for the session's commit; returns
+    (key, vector, answer) with answer None on a miss. With semantic matching
+    enabled the query is embedded so near-duplicate wordings can match, and the
+    vector is returned for storing alongside a fresh answer.
 
-    current_repo_data.update({
-        'owner': owner,
-        'repo': repo,
-        'url': repo_url,
-        'vectorstore': vectorstore,
-        'qa_chain': qa_chain,
-        'agent': agent
-    })
-    print(f"Repository {owner}/{repo} loaded successfully")
-    return agent
-
-# === Memory ===
-memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    input_key="input",
-    return_messages=True
-)
+    The key includes a digest of the session's chat history, so an answer is only
+    reused after the same conversation: opening questions are shared between
+    sessions, while follow-ups such as "why?" never get another conversation's answer
+    or repeat this one's.
+    """
+    context = session.context
+    key = ('query', context.owner, context.repo, context.sha,
+           model_name(CHAT_MODEL), AGENT_VERSION, session.history_digest(), normalize_text(query))
+    vector = None
+    if response_cache.threshold:
+        from utils.embeddings import get_embeddings
+
+        vector = get_embeddings(OPENAI_API_KEY).embed_query(key[-1])
+    answer = response_cache.get(key, vector)
+    if answer is not None:
+        # Keep the conversation history as if the agent had answered
+        session.memory.save_context({"input": query}, {"output": answer})
+    return key, vector, answer
 
 # === Flask Routes ===
 @repo_talk.route('/set-repo', methods=['POST'])
+@limited('set-repo')
 def set_repository():
     try:
         data = request.get_json()
         repo_url = data.get('url')
         if not repo_url:
             return jsonify({"error": "Repository URL is required"}), 400
-        initialize_repo_context(repo_url)
-        return jsonify({
-            "success": True,
-            "message": f"Repository {current_repo_data['owner']}/{current_repo_data['repo']} loaded successfully",
-            "owner": current_repo_data['owner'],
-            "repo": current_repo_data['repo'],
-            "url": current_repo_data['url']
-        }), 200
+        session = request_session(data)
+        if data.get('async'):
+            owner, repo = parse_repo_url(repo_url)
+            sha = get_source(owner, repo, GITHUB_TOKEN).head_sha()
+            try:
+                # A finished load only counts while this session still has that context; an evicted
+                # session comes back under the same id without one
+                job = job_manager.submit('set-repo', ('set-repo', session.id, owner, repo, sha),
+                                         load_repository, session, repo_url,
+                                         reuse=lambda job: session.agent is not None and session.context is not None
+                                         and session.context.key == (owner, repo, sha))
+            except JobRejected as e:
+                return rejected(str(e), e.status)
+            return jsonify({
+                "success": True,
+                "session_id": session.id,
+                "job_id": job.id,
+                "status_url": f"/api/jobs/{job.id}"
+            }), 202
+        return jsonify(load_repository(session, repo_url)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def load_repository(session, repo_url, progress=None):
+    """Loads the repository as the session's context; returns the /set-repo response body."""
+    with session.lock:
+        initialize_repo_context(session, repo_url, progress)
+    context = session.context
+    return {
+        "success": True,
+        "message": f"Repository {context.owner}/{context.repo} loaded successfully",
+        "session_id": session.id,
+        "owner": context.owner,
+        "repo": context.repo,
+        "url": context.url
+    }
+
 @repo_talk.route('/test', methods=['POST'])
 def test():
     return jsonify({
@@ -197,6 +221,7 @@ def test():
     }), 200
 
 @repo_talk.route('/query', methods=['POST'])
+@limited('query')
 def query_repo():
     # try:
     data = request.get_json()
@@ -204,26 +229,80 @@ def query_repo():
     repo_url = data.get('repo_url')
     if not query:
         return jsonify({"error": "Query is required"}), 400
-    if repo_url:
-        initialize_repo_context(repo_url)
-    if current_repo_data['agent'] is None:
-        return jsonify({"error": "No repository loaded."}), 400
-    result = current_repo_data['agent'].run(query)
-    return jsonify({"answer": result}), 200
+    session = request_session(data)
+    with session.lock:
+        if repo_url:
+            initialize_repo_context(session, repo_url)
+        if session.agent is None:
+            return jsonify({"error": "No repository loaded.", "session_id": session.id}), 400
+        if data.get('cache', True):
+            key, vector, result = cached_answer(session, query)
+            if result is not None:
+                return jsonify({"answer": result, "cached": True, "session_id": session.id}), 200
+        result = get_breaker("openai").call(session.agent.run, query)
+        if data.get('cache', True):
+            response_cache.put(key, result, vector)
+    return jsonify({"answer": result, "session_id": session.id}), 200
     # except Exception as e:
     #     return jsonify({"error": str(e)}), 500
 
+@repo_talk.route('/query/stream', methods=['POST'])
+@limited('query')
+def query_repo_stream():
+    """
+    Server-Sent Events version of /query: `token` events as the agent's answer is
+    generated, then `done` with the full answer (or `error`).
+    """
+    from utils.chat import stream_agent_answer
+
+    data = request.get_json()
+    query = data.get('query')
+    repo_url = data.get('repo_url')
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+    session = request_session(data)
+    with session.lock:
+        if repo_url:
+            initialize_repo_context(session, repo_url)
+        if session.agent is None:
+            return jsonify({"error": "No repository loaded.", "session_id": session.id}), 400
+
+    use_cache = data.get('cache', True)
+
+    def events():
+        # Held while the agent runs so the session's turns stay in order
+        with session.lock:
+            key, vector, cached = cached_answer(session, query) if use_cache else (None, None, None)
+            if cached is not None:
+                yield sse_event({'token': cached}, 'token')
+                yield sse_event({'answer': cached, 'cached': True, 'session_id': session.id}, 'done')
+                return
+            for kind, value in stream_agent_answer(session.agent, query):
+                if kind == 'token':
+                    yield sse_event({'token': value}, 'token')
+                elif kind == 'done':
+                    if use_cache:
+                        response_cache.put(key, value, vector)
+                    yield sse_event({'answer': value, 'session_id': session.id}, 'done')
+                else:
+                    yield sse_event({'error': value}, 'error')
+
+    return sse_response(events())
+
 @repo_talk.route('/current-repo', methods=['GET'])
 def get_current_repo():
-    if current_repo_data['owner'] and current_repo_data['repo']:
+    session = request_session()
+    if session.context:
         return jsonify({
             "success": True,
-            "owner": current_repo_data['owner'],
-            "repo": current_repo_data['repo'],
-            "url": current_repo_data['url']
+            "session_id": session.id,
+            "owner": session.context.owner,
+            "repo": session.context.repo,
+            "url": session.context.url
         }), 200
     else:
         return jsonify({
             "success": False,
+            "session_id": session.id,
             "message": "No repository currently loaded"
         }), 200
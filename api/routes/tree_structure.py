@@ -1,5 +1,7 @@
-from flask import Blueprint, request, jsonify
-from utils.utils import process_repo_tree
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from utils.limits import limited
+from utils.tree import iter_ndjson, tree_to_dict
+from utils.utils import analyze_repo, process_repo_tree
 import re
 import os
 
@@ -7,14 +9,23 @@ tree_bp = Blueprint('tree', __name__)
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
+TREE_FORMATS = ('text', 'json', 'ndjson')
+
 @tree_bp.route("/tree", methods=["POST"])
+@limited('tree')
 def get_repo_tree():
     """
-    Get repository tree structure
+    Get repository tree structure.
+
+    `format` picks the representation: "text" (default) returns the indented listing
+    as `tree_structure`, "json" returns nested nodes as `tree`, and "ndjson" (or an
+    `Accept: application/x-ndjson` header) streams one JSON record per folder and file.
     """
     # try:
     data = request.json
     repo_url = data.get('url')
+    tree_format = data.get('format') or (
+        'ndjson' if request.accept_mimetypes.best == 'application/x-ndjson' else 'text')
     
     if not repo_url:
         return jsonify({
@@ -32,7 +43,29 @@ def get_repo_tree():
     # Extract owner and repo name
     match = re.match(r"https?://github\.com/([^/]+)/([^/]+)", repo_url)
     owner, repo = match.groups()
-    
+
+    if tree_format not in TREE_FORMATS:
+        return jsonify({
+            "success": False,
+            "error": f"Unknown format: {tree_format}. Use one of {', '.join(TREE_FORMATS)}"
+        }), 400
+
+    if tree_format != 'text':
+        root, _, imports = analyze_repo(repo_url, '', GITHUB_TOKEN)
+        if tree_format == 'ndjson':
+            header = {"type": "repo", "owner": owner, "repo": repo, "url": repo_url}
+            return Response(stream_with_context(iter_ndjson(root, imports, header)),
+                            mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+        return jsonify({
+            "success": True,
+            "data": {
+                "owner": owner,
+                "repo": repo,
+                "tree": tree_to_dict(root, imports),
+                "url": repo_url
+            }
+        })
+
     # Get repository tree structure
     tree_structure = process_repo_tree(repo_url, '', GITHUB_TOKEN)
     
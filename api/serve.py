@@ -0,0 +1,161 @@
+"""
+Production entry point.
+
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers 1] [--threads 32] [--server auto|gunicorn|werkzeug]
+
+Serves the app with gunicorn's threaded (gthread) workers when gunicorn is installed,
+and with Werkzeug's threaded server otherwise. Slow GitHub crawls and LLM calls each
+hold one thread, so other requests keep being served; ROUTE_LIMITS caps how many of
+each kind run at once (see utils.limits).
+
+Sessions, jobs and caches live in the worker process. More than one worker therefore
+needs requests routed by X-Session-Id to the worker holding that session.
+
+WARM_UP_IMPORTS and WARM_UP_INDEXES have each worker load the chat routes' dependencies
+and the most recent repository indexes before taking requests (see utils.startup).
+
+On SIGTERM the server stops accepting connections and gives in-flight requests and
+background jobs up to SHUTDOWN_DRAIN_SECONDS to finish before exiting.
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from socketserver import ThreadingMixIn
+
+
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("PORT", "5000"))
+# Worker processes; keep 1 unless requests are routed to workers by session
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+# Requests each worker serves at once
+WEB_THREADS = int(os.getenv("WEB_THREADS", "32"))
+# "gunicorn", "werkzeug" or "auto" (gunicorn if installed)
+WEB_SERVER = os.getenv("WEB_SERVER", "auto")
+# How long shutdown waits for in-flight requests and background jobs
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "60"))
+
+logger = logging.getLogger('serve')
+
+
+def drain(timeout=SHUTDOWN_DRAIN_SECONDS):
+    """
+    Stops taking background jobs, waits up to `timeout` seconds for running jobs and
+    limited requests to finish, then stops the chunking processes. Returns whether
+    everything finished in time.
+    """
+    from utils.chunker import shutdown_pool
+    from utils.jobs import job_manager
+    from utils.limits import wait_idle
+
+    deadline = time.monotonic() + timeout
+    finished = job_manager.drain(timeout) and wait_idle(max(0, deadline - time.monotonic()))
+    if not finished:
+        queued, running = job_manager.pending()
+        logger.warning("Shutting down with %d queued and %d running jobs unfinished", queued, running)
+    job_manager.shutdown(wait=False)
+    shutdown_pool(wait=False)
+    return finished
+
+
+def run_gunicorn(app, host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+    from gunicorn.workers.gthread import ThreadWorker
+    from utils.startup import warm_up
+
+    class Worker(ThreadWorker):
+        def wait_for_and_dispatch_events(self, timeout):
+            # While shutting down, gthread waits out the whole grace period in one select() before
+            # closing idle keep-alive connections, so one idle client would hold the exit that long
+            super().wait_for_and_dispatch_events(min(timeout, 1.0))
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', Worker)
+            # Long LLM calls and crawls are normal; the gthread heartbeat keeps the worker alive meanwhile
+            self.cfg.set('timeout', 120)
+            # In-flight requests get SHUTDOWN_DRAIN_SECONDS, then background jobs get as long again
+            self.cfg.set('graceful_timeout', int(2 * SHUTDOWN_DRAIN_SECONDS))
+            # Runs in each worker before it accepts connections
+            self.cfg.set('post_worker_init', lambda worker: warm_up())
+            # Runs once the worker has stopped accepting and its in-flight requests are done
+            self.cfg.set('worker_exit', lambda server, worker: drain())
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def run_werkzeug(app, host, port, threads):
+    from werkzeug.serving import make_server
+    from utils.startup import warm_up
+
+    # Before binding, so nothing connects until the server is warm
+    warm_up()
+    server = make_server(host, port, app, threaded=True)
+    # Like gunicorn's threads: at most `threads` requests at once, the rest wait in the listen backlog
+    slots = threading.BoundedSemaphore(threads)
+    handle = server.process_request_thread
+
+    def process_request_thread(request, client_address):
+        try:
+            handle(request, client_address)
+        finally:
+            slots.release()
+
+    def process_request(request, client_address):
+        slots.acquire()
+        ThreadingMixIn.process_request(server, request, client_address)
+
+    server.process_request_thread = process_request_thread
+    server.process_request = process_request
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it cannot run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info("Serving on http://%s:%d", host, port)
+    server.serve_forever()
+    server.server_close()
+    drain()
+
+
+def serve(app, host=WEB_HOST, port=WEB_PORT, workers=WEB_WORKERS, threads=WEB_THREADS, server=WEB_SERVER):
+    if server == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server = 'gunicorn'
+        except ImportError:
+            server = 'werkzeug'
+    if server == 'gunicorn':
+        run_gunicorn(app, host, port, workers, threads)
+    else:
+        if workers > 1:
+            logger.warning("The werkzeug server runs a single process; ignoring workers=%d", workers)
+        run_werkzeug(app, host, port, threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=WEB_HOST)
+    parser.add_argument('--port', type=int, default=WEB_PORT)
+    parser.add_argument('--workers', type=int, default=WEB_WORKERS)
+    parser.add_argument('--threads', type=int, default=WEB_THREADS)
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'werkzeug'), default=WEB_SERVER)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    from utils.startup import load
+    serve(load('app').app, args.host, args.port, args.workers, args.threads, args.server)
+
+
+if __name__ == '__main__':
+    main()
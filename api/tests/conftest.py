@@ -0,0 +1,50 @@
+"""
+Shared setup: the fake LLM, hash embeddings and caches in a temporary directory, set
+before any app module reads its configuration, and a synthetic GitHub stand-in.
+
+    cd api && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = tempfile.mkdtemp(prefix='octa-tests-')
+
+os.environ.update(
+    LLM_BACKEND='fake',
+    EMBEDDINGS_BACKEND='hash',
+    FAKE_TOKEN_DELAY='0',
+    BLOB_CACHE_DIR=os.path.join(CACHE_DIR, 'blobs'),
+    INDEX_STORE_DIR=os.path.join(CACHE_DIR, 'indexes'),
+    EMBEDDING_CACHE_DIR=os.path.join(CACHE_DIR, 'embeddings'),
+    COMMIT_HISTORY_DIR=os.path.join(CACHE_DIR, 'commits'),
+    UPSTREAM_BACKOFF_MAX='0.01',
+)
+sys.path.insert(0, API_DIR)
+
+
+@pytest.fixture
+def github(request):
+    """
+    Installs a SyntheticGitHub for a repository of `files` files (20 unless the test is
+    marked with @pytest.mark.parametrize('github', [n], indirect=True)) under an owner
+    named after the test, so caches keyed by repository are not shared between tests.
+    """
+    from benchmarks.cassette import SyntheticGitHub, install
+    from benchmarks.synthetic import synthetic_files
+
+    files = getattr(request, 'param', 20)
+    entries, blobs = synthetic_files(files)
+    adapter = SyntheticGitHub(request.node.name.replace('[', '-').strip(']'), 'repo', entries, blobs)
+    return install(adapter)
+
+
+@pytest.fixture(scope='session')
+def client():
+    from app import app
+
+    return app.test_client()
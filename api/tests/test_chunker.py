@@ -0,0 +1,54 @@
+import pytest
+
+from benchmarks.synthetic import synthetic_sources
+from utils.chunker import chunk_batch, chunk_text
+
+
+NESTED_PYTHON = "import os\n\n\n" + "\n".join(
+    f"class Service{n}:\n    '''Service {n}.'''\n\n" + "\n".join(
+        f"    @property\n    def method_{m}(self):\n" + "".join(f"        value = {m} * {k}\n" for k in range(12))
+        for m in range(8))
+    for n in range(3)) + "\n\nif __name__ == '__main__':\n    main()\n"
+
+SAMPLES = [
+    ('service.py', NESTED_PYTHON),
+    ('README.md', "# Title\n\nIntro.\n\n## Setup\n\n" + "Step.\n" * 300 + "\n## Usage\n\nRun it.\n"),
+    ('config.yaml', "".join(f"key{n}:\n  nested: {n}\n  list:\n    - a\n    - b\n" for n in range(80))),
+    ('notes.txt', "\n\n".join(f"Paragraph {n} " + "word " * (n * 7) for n in range(60))),
+    ('bundle.min.js', "var a=1;" * 2000 + "\n" + "function f(){return a}\n"),
+    ('empty.py', ''),
+    ('blank.md', "\n\n   \n\t\n"),
+] + synthetic_sources(40, seed=7)
+
+
+@pytest.mark.parametrize('max_chars', [200, 1500])
+@pytest.mark.parametrize('path, content', SAMPLES, ids=[path for path, _ in SAMPLES])
+def test_chunks_cover_the_file(path, content, max_chars):
+    """Chunks are in order, at most max_chars long, and together hold every line that is not blank."""
+    lines = content.splitlines(keepends=True)
+    chunks = chunk_text(path, content, max_chars)
+    assert all(len(text) <= max_chars for text, _, _, _ in chunks)
+
+    # A single line longer than a chunk is cut into several chunks with the same line range
+    ranges = {}
+    for text, first, last, _ in chunks:
+        ranges.setdefault((first, last), []).append(text)
+    covered = 0
+    for (first, last), texts in ranges.items():
+        assert first > covered and last >= first
+        assert ''.join(lines[covered:first - 1]).strip() == ''
+        assert ''.join(texts) == ''.join(lines[first - 1:last])
+        covered = last
+    assert ''.join(lines[covered:]).strip() == ''
+
+
+def test_chunks_name_their_definitions():
+    symbols = [symbol for _, _, _, symbol in chunk_text('service.py', NESTED_PYTHON, 400)]
+    assert 'Service0' in symbols
+    assert 'Service1.method_3' in symbols
+
+
+def test_chunk_batch_matches_chunk_text():
+    files = SAMPLES[:4]
+    results = chunk_batch(files)
+    assert [chunks for chunks, _ in results] == [chunk_text(path, content) for path, content in files]
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from utils.clients import CircuitBreaker, CircuitOpenError, call_upstream, get_breaker
+from utils.github import GitHubError
+
+
+def test_breaker_opens_then_half_opens():
+    breaker = CircuitBreaker('test-breaker', failures=2, reset_seconds=0.05)
+
+    def fail():
+        raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'not called')
+    assert breaker.stats['rejected'] == 1
+
+    time.sleep(0.06)
+    # One trial call at a time once the reset time has passed; it failing reopens the circuit
+    breaker.before()
+    assert breaker.state == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == 'closed'
+    assert breaker.stats['opened'] == 2
+
+
+def test_call_upstream_retries_only_transient_errors():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise GitHubError("unavailable", 503)
+        return 'ok'
+
+    assert call_upstream('test-flaky', flaky, retries=3) == 'ok'
+    assert get_breaker('test-flaky').stats['failures'] == 2
+
+    def not_found():
+        calls.append(1)
+        raise GitHubError("not found", 404)
+
+    calls.clear()
+    with pytest.raises(GitHubError):
+        call_upstream('test-not-found', not_found, retries=3)
+    assert len(calls) == 1
+    assert get_breaker('test-not-found').stats['failures'] == 0
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+
+from utils.embeddings import CachedEmbeddings, EmbeddingStore, HashEmbeddings
+
+
+def append_rows(directory, worker):
+    store = EmbeddingStore(directory)
+    for n in range(100):
+        store.add_many([(f"w{worker}-{n}", [float(worker), float(n)]), (f"shared-{n}", [-1.0, float(n)])])
+
+
+def test_store_instances_share_a_directory(tmp_path):
+    a, b = EmbeddingStore(tmp_path), EmbeddingStore(tmp_path)
+    a.add_many([('h1', [1.0, 1.0])])
+    b.add_many([('h2', [2.0, 2.0])])
+    assert b.get_many({'h1', 'h2'}) == {'h1': [1.0, 1.0], 'h2': [2.0, 2.0]}
+    assert a.get_many({'h2'}) == {'h2': [2.0, 2.0]}
+
+
+def test_worker_processes_append_concurrently(tmp_path):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=append_rows, args=(tmp_path, worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(30)
+        assert process.exitcode == 0
+
+    store = EmbeddingStore(tmp_path)
+    assert len(store) == 4 * 100 + 100
+    expected = {f"w{worker}-{n}": [float(worker), float(n)] for worker in range(4) for n in range(100)}
+    expected.update({f"shared-{n}": [-1.0, float(n)] for n in range(100)})
+    assert store.get_many(set(expected)) == expected
+
+
+def test_partial_tail_is_dropped(tmp_path):
+    EmbeddingStore(tmp_path).add_many([('h1', [1.0, 1.0])])
+    with open(os.path.join(tmp_path, 'vectors.f32'), 'ab') as f:
+        f.write(b'\0\1')
+    with open(os.path.join(tmp_path, 'index.txt'), 'a') as f:
+        f.write('cut-off')
+
+    store = EmbeddingStore(tmp_path)
+    store.add_many([('h2', [2.0, 2.0])])
+    assert EmbeddingStore(tmp_path).get_many({'h1', 'h2', 'cut-off'}) == {'h1': [1.0, 1.0], 'h2': [2.0, 2.0]}
+
+
+def test_cached_embeddings_only_embed_new_texts(tmp_path):
+    embeddings = CachedEmbeddings(HashEmbeddings(dim=8), EmbeddingStore(tmp_path), batch_size=2)
+    first = embeddings.embed_documents(['alpha', 'beta', 'alpha'])
+    assert embeddings.stats['misses'] == 2
+    assert embeddings.embed_documents(['beta', 'gamma']) == [first[1], HashEmbeddings(dim=8).embed_query('gamma')]
+    assert embeddings.stats['misses'] == 3
@@ -0,0 +1,72 @@
+import json
+
+from benchmarks.cassette import RATE_LIMIT_HEADERS, StandInAdapter, install, make_response
+from utils.github import GitHubClient, get_client
+from utils.utils import fetch_repo_entries
+
+
+class VersionedResource(StandInAdapter):
+    """One JSON document with an ETag per version, answering 304 when If-None-Match is current."""
+
+    def __init__(self, padding=0):
+        super().__init__()
+        self.version = 1
+        self.padding = padding
+        self.conditional = []
+
+    def respond(self, request):
+        etag = f'"v{self.version}"'
+        self.conditional.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == etag:
+            return make_response(request, 304, b'', dict(RATE_LIMIT_HEADERS, ETag=etag))
+        body = json.dumps({'version': self.version, 'padding': 'x' * self.padding}).encode()
+        return make_response(request, 200, body, dict(RATE_LIMIT_HEADERS, ETag=etag))
+
+
+def test_etag_revalidation():
+    resource = install(VersionedResource())
+    client = GitHubClient()
+
+    assert client.get_json('/repos/etag/repo')['version'] == 1
+    assert client.get_json('/repos/etag/repo')['version'] == 1
+    assert client.stats['not_modified'] == 1
+    assert resource.conditional == [None, '"v1"']
+
+    resource.version = 2
+    assert client.get_json('/repos/etag/repo')['version'] == 2
+    assert client.stats['not_modified'] == 1
+
+    client.get_json('/repos/etag/repo', conditional=False)
+    assert resource.conditional[-1] is None
+
+
+def test_etag_store_is_bounded_by_bytes():
+    install(VersionedResource(padding=1000))
+    client = GitHubClient(etag_cache_bytes=2500)
+
+    for n in range(5):
+        client.get_json(f'/repos/etag/repo{n}')
+    assert [key[0].rsplit('/', 1)[-1] for key in client._etags] == ['repo3', 'repo4']
+    assert client._etag_bytes <= 2500
+
+    # Responses larger than the whole budget are not remembered at all
+    client.etag_cache_bytes = 500
+    client.get_json('/repos/etag/large')
+    assert not any(key[0].endswith('/large') for key in client._etags)
+
+
+class EmptyTree(StandInAdapter):
+    """An empty git tree, with an ETag, for any tree listing."""
+
+    def respond(self, request):
+        body = json.dumps({'sha': 'c' * 40, 'tree': [], 'truncated': False}).encode()
+        return make_response(request, 200, body, dict(RATE_LIMIT_HEADERS, ETag='"tree"'))
+
+
+def test_sha_addressed_requests_are_not_remembered():
+    install(EmptyTree())
+    fetch_repo_entries('etag-sha', 'repo', ref='c' * 40)
+    fetch_repo_entries('etag-sha', 'repo', ref='main')
+
+    remembered = [key[0].rsplit('/', 1)[-1] for key in get_client()._etags if '/etag-sha/' in key[0]]
+    assert remembered == ['main']
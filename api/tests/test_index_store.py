@@ -0,0 +1,28 @@
+import gc
+import weakref
+
+from utils.index_store import index_registry
+from utils.sessions import session_manager
+
+
+def test_sessions_do_not_pin_evicted_indexes(client, github, monkeypatch):
+    from langchain.vectorstores import FAISS
+    from utils.embeddings import get_embeddings
+
+    url = f"https://github.com/{github.owner}/{github.repo}"
+    assert client.post('/api/set-repo', json={'url': url}, headers={'X-Session-Id': 'pinned'}).status_code == 200
+    key = (github.owner, github.repo, github.sha)
+    with index_registry._lock:
+        loaded = weakref.ref(index_registry._loaded[key])
+
+    # Storing another index past a tiny budget evicts this one, and nothing else holds it
+    monkeypatch.setattr(index_registry, 'memory_bytes', 1)
+    index_registry.put(github.owner, 'other', 'f' * 40, FAISS.from_texts(['another index'], get_embeddings()))
+    gc.collect()
+    assert loaded() is None
+
+    # The session's next search loads it back from disk
+    loads = index_registry.stats['disk_loads']
+    retriever = session_manager.get('pinned').context.qa_chain.retriever
+    assert retriever.invoke("Which modules are there?")
+    assert index_registry.stats['disk_loads'] == loads + 1
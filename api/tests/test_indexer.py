@@ -0,0 +1,73 @@
+import copy
+
+from benchmarks.cassette import SyntheticGitHub, install
+from benchmarks.synthetic import synthetic_files
+from utils.embeddings import get_embeddings
+from utils.index_store import index_registry
+from utils.indexer import INGEST_STATS, build_index
+from utils.sources import git_blob_sha
+
+
+BASE_SHA = 'a' * 40
+HEAD_SHA = 'b' * 40
+
+
+def next_commit(entries, blobs):
+    """The repository one commit later: two files modified, one removed and one added."""
+    entries, blobs = copy.deepcopy(entries), dict(blobs)
+    files = [entry for entry in entries if entry['type'] == 'blob' and entry['path'].endswith(('.py', '.md'))]
+    for entry in files[:2]:
+        data = blobs[entry['sha']] + b"# changed in the next commit\n"
+        entry['sha'], entry['size'] = git_blob_sha(data), len(data)
+        blobs[entry['sha']] = data
+    entries.remove(files[2])
+    data = b"def added():\n    return 'a file added in the next commit'\n"
+    blobs[git_blob_sha(data)] = data
+    entries.append({'path': 'added.py', 'type': 'blob', 'sha': git_blob_sha(data), 'size': len(data)})
+    return entries, blobs
+
+
+def contents(vectorstore):
+    """The index's documents as sorted (text, metadata) pairs, independent of chunk ids and order."""
+    docs = vectorstore.docstore._dict.values()
+    return sorted((doc.page_content, sorted(doc.metadata.items())) for doc in docs)
+
+
+def test_incremental_index_matches_full_rebuild(monkeypatch):
+    embeddings = get_embeddings()
+    entries, blobs = synthetic_files(60, seed=3)
+    install(SyntheticGitHub('incremental', 'repo', entries, blobs, sha=BASE_SHA))
+    base, manifest, lexical = build_index('incremental', 'repo', BASE_SHA, embeddings)
+    index_registry.put('incremental', 'repo', BASE_SHA, base, manifest, lexical)
+
+    entries, blobs = next_commit(entries, blobs)
+    install(SyntheticGitHub('incremental', 'repo', entries, blobs, sha=HEAD_SHA))
+    misses = embeddings.stats['misses']
+    incremental, incremental_manifest, _ = build_index('incremental', 'repo', HEAD_SHA, embeddings)
+    new_embeddings = embeddings.stats['misses'] - misses
+
+    monkeypatch.setattr(index_registry, 'latest_sha', lambda owner, repo: None)
+    full, full_manifest, _ = build_index('incremental', 'repo', HEAD_SHA, embeddings)
+
+    assert incremental.index.ntotal == full.index.ntotal == len(full.docstore._dict)
+    assert contents(incremental) == contents(full)
+    assert ({path: entry['sha'] for path, entry in incremental_manifest.items()}
+            == {path: entry['sha'] for path, entry in full_manifest.items()})
+    assert 'added.py' in incremental_manifest
+    # Only the chunks of the modified and added files were embedded again
+    changed_chunks = sum(len(incremental_manifest[path]['ids']) for path in incremental_manifest
+                         if path not in manifest or manifest[path]['sha'] != incremental_manifest[path]['sha'])
+    assert 0 < new_embeddings <= changed_chunks
+
+
+def test_unfetchable_blob_is_skipped():
+    entries, blobs = synthetic_files(20, seed=5)
+    missing = next(entry for entry in entries if entry['type'] == 'blob' and entry['path'].endswith('.py'))
+    blobs = {sha: data for sha, data in blobs.items() if sha != missing['sha']}
+    install(SyntheticGitHub('unfetchable', 'repo', entries, blobs))
+    errors = INGEST_STATS['fetch_errors']
+
+    vectorstore, manifest, _ = build_index('unfetchable', 'repo', '0' * 40, get_embeddings())
+    assert missing['path'] not in manifest
+    assert len(manifest) > 1 and vectorstore.index.ntotal > 0
+    assert INGEST_STATS['fetch_errors'] == errors + 1
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from utils.jobs import JobManager, JobRejected
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def blocked(release):
+    def task(progress):
+        release.wait(5)
+        return 'result'
+    return task
+
+
+def test_unfinished_jobs_coalesce():
+    manager = JobManager(workers=1)
+    release = threading.Event()
+    job = manager.submit('test', 'key', blocked(release))
+    assert manager.submit('test', 'key', blocked(release)) is job
+    assert manager.submit('test', 'other', blocked(release)) is not job
+    release.set()
+    assert manager.drain(5)
+    assert job.status == 'done' and job.result == 'result'
+    assert manager.stats['coalesced'] == 1
+
+
+def test_finished_jobs_are_reused_only_when_accepted():
+    manager = JobManager(workers=1)
+    done = manager.submit('test', 'key', lambda progress: 1)
+    failed = manager.submit('test', 'failing', lambda progress: 1 / 0)
+    wait_until(lambda: done.finished and failed.finished)
+    assert failed.status == 'failed'
+
+    assert manager.submit('test', 'key', lambda progress: 2, reuse=lambda job: True) is done
+    assert manager.submit('test', 'failing', lambda progress: 2, reuse=lambda job: True) is not failed
+    again = manager.submit('test', 'key', lambda progress: 2, reuse=lambda job: False)
+    assert again is not done
+    assert manager.submit('test', 'key', lambda progress: 3) is not done
+    assert manager.drain(5)
+
+
+def test_full_queue_rejects_with_429():
+    manager = JobManager(workers=1, queue_limit=1)
+    release = threading.Event()
+    manager.submit('test', 'running', blocked(release))
+    # Wait for the first job to leave the queue for the worker
+    wait_until(lambda: manager.pending() == (0, 1))
+    manager.submit('test', 'queued', blocked(release))
+    with pytest.raises(JobRejected) as rejected:
+        manager.submit('test', 'third', blocked(release))
+    assert rejected.value.status == 429
+    release.set()
+    assert manager.drain(5)
+
+
+def test_drain_waits_for_jobs_and_refuses_new_ones():
+    manager = JobManager(workers=2)
+    release = threading.Event()
+    jobs = [manager.submit('test', n, blocked(release)) for n in range(3)]
+    assert not manager.drain(0.05)
+    with pytest.raises(JobRejected) as rejected:
+        manager.submit('test', 'late', blocked(release))
+    assert rejected.value.status == 503
+    # Jobs already submitted still coalesce while draining
+    assert manager.submit('test', 0, blocked(release)) is jobs[0]
+
+    release.set()
+    assert manager.drain(5)
+    assert all(job.status == 'done' for job in jobs)
+    assert manager.pending() == (0, 0)
+
+
+def wait_for_job(client, job_id):
+    deadline = time.monotonic() + 30
+    while True:
+        job = client.get(f"/api/jobs/{job_id}").get_json()['data']
+        if job['status'] in ('done', 'failed'):
+            return job
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_set_repo_after_session_eviction(client, github):
+    from utils.sessions import session_manager
+
+    url = f"https://github.com/{github.owner}/{github.repo}"
+    headers = {'X-Session-Id': 'evicted-session'}
+    first = client.post('/api/set-repo', json={'url': url, 'async': True}, headers=headers).get_json()
+    assert wait_for_job(client, first['job_id'])['status'] == 'done'
+    # Still loaded: the finished job is handed back
+    again = client.post('/api/set-repo', json={'url': url, 'async': True}, headers=headers).get_json()
+    assert again['job_id'] == first['job_id']
+
+    with session_manager._lock:
+        del session_manager._sessions['evicted-session']
+    resubmitted = client.post('/api/set-repo', json={'url': url, 'async': True}, headers=headers).get_json()
+    assert resubmitted['job_id'] != first['job_id']
+    assert wait_for_job(client, resubmitted['job_id'])['status'] == 'done'
+    response = client.post('/api/query', json={'query': 'What does this repository do?'}, headers=headers)
+    assert response.status_code == 200, response.get_json()
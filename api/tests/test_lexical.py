@@ -0,0 +1,40 @@
+from utils.lexical import LexicalIndex, query_identifiers
+
+
+def make_index():
+    index = LexicalIndex()
+    index.add('api/app.py#0', 'from flask import Flask\n\ndef create_app():\n    return Flask(__name__)\n', 'api/app.py')
+    index.add('README.md#0', 'Run app.py to start the server.\n', 'README.md')
+    return index
+
+
+def test_query_identifiers_keep_file_names_whole():
+    assert query_identifiers("What does utils.py do?") == ['utils.py']
+    assert query_identifiers("Where is `api/app.py` served, e.g. in create_app()?") == ['api/app.py', 'create_app']
+    assert query_identifiers("What does os.path.join return?") == ['join']
+
+
+def test_file_names_are_matched_against_chunk_paths():
+    index = make_index()
+    # Text mentioning app.py, and the extension as a term, do not make utils.py known
+    assert not index.knows('utils.py')
+    assert index.knows('app.py') and index.knows('api/app.py')
+    assert not index.knows('web/app.py')
+    assert index.search("What does app.py do?")[0][0] == 'api/app.py#0'
+
+    index.remove(['api/app.py#0'])
+    assert not index.knows('app.py')
+
+
+def test_file_names_survive_save_and_load(tmp_path):
+    path = str(tmp_path / 'lexical.json')
+    make_index().save(path)
+    assert LexicalIndex.load(path).knows('readme.md')
+
+
+def test_unknown_file_name_is_not_decisive():
+    from utils.retrieval import HybridRetriever
+
+    retriever = HybridRetriever(vectorstore=None, lexical=make_index())
+    assert not retriever.is_decisive("What does utils.py do?")
+    assert retriever.is_decisive("What does app.py do?")
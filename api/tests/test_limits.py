@@ -0,0 +1,36 @@
+import threading
+import time
+
+from utils.limits import ConcurrencyLimit, route_limits
+
+
+def test_full_route_answers_429(client, github, monkeypatch):
+    limit = route_limits['tree']
+    monkeypatch.setattr(limit, 'concurrency', 0)
+    monkeypatch.setattr(limit, 'queue', 0)
+    response = client.post('/api/tree', json={'url': f"https://github.com/{github.owner}/{github.repo}"})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['success'] is False
+    assert github.request_counts()['total'] == 0
+
+
+def test_concurrency_limit_queues_then_rejects():
+    limit = ConcurrencyLimit('test', concurrency=1, queue=1, timeout=5)
+    assert limit.acquire()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(limit.acquire()))
+    waiter.start()
+    while limit.waiting == 0:
+        time.sleep(0.01)
+    # The one place in line is taken
+    assert not limit.acquire()
+    limit.release()
+    waiter.join(5)
+    assert admitted == [True]
+    assert limit.stats == {'admitted': 2, 'rejected': 1, 'timed_out': 0}
+
+    impatient = ConcurrencyLimit('test', concurrency=1, queue=1, timeout=0.05)
+    assert impatient.acquire()
+    assert not impatient.acquire()
+    assert impatient.stats['timed_out'] == 1
@@ -0,0 +1,28 @@
+from benchmarks.synthetic import synthetic_repo
+from utils.prompt import compact_repo_tree, count_tokens, truncate_lines
+from utils.tree import build_tree
+
+
+def test_compact_tree_fits_the_budget():
+    entries, imports = synthetic_repo(3000, seed=1)
+    root = build_tree(entries)
+    for budget in (200, 1000, 6000):
+        text = compact_repo_tree(root, 'repo', imports, budget)
+        assert count_tokens(text) <= budget
+
+
+def test_truncation_keeps_whole_lines():
+    # Short, dense lines cost more tokens per character than the 4 the old cut assumed
+    text = ''.join(f"  項目/資料/{n}/{'!?;' * 5}.py\n" for n in range(5000))
+    for budget in (50, 500, 3000):
+        cut = truncate_lines(text, budget)
+        assert count_tokens(cut) <= budget
+        kept, marker = cut[:-len("... (truncated)\n")], cut[-len("... (truncated)\n"):]
+        assert marker == "... (truncated)\n"
+        assert text.startswith(kept) and kept.endswith('\n')
+
+
+def test_truncation_of_a_single_long_line():
+    cut = truncate_lines('x' * 10000, 20)
+    assert count_tokens(cut) <= 20
+    assert cut.endswith("\n... (truncated)\n")
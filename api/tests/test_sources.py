@@ -0,0 +1,26 @@
+import pytest
+
+from benchmarks.cassette import make_response
+from utils.github import GitHubError
+from utils.sources import TarballSource
+
+
+def test_codeload_errors_are_retried(github):
+    statuses = [503, 429]
+    respond = github.respond
+
+    def flaky(request):
+        if request.url.startswith('https://codeload.github.com/') and statuses:
+            return make_response(request, statuses.pop(0), b'busy')
+        return respond(request)
+
+    github.respond = flaky
+    entries = TarballSource(github.owner, github.repo).entries()
+    assert len(entries) == len(github.entries)
+    assert github.request_counts()['codeload'] == 3
+
+    statuses.append(404)
+    with pytest.raises(GitHubError) as error:
+        TarballSource(github.owner, github.repo)._download('1' * 40)
+    assert error.value.status_code == 404
+    assert github.request_counts()['codeload'] == 4
@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import API_DIR
+
+
+def run(code):
+    """Runs `code` in a fresh interpreter, where nothing has been imported yet, and decodes what it prints."""
+    result = subprocess.run([sys.executable, '-c', code], cwd=API_DIR, env=os.environ,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_app_import_leaves_chat_dependencies_unloaded():
+    loaded = run(
+        "import json, sys, app\n"
+        "print(json.dumps(sorted({name.split('.')[0] for name in sys.modules}"
+        " & {'langchain', 'langchain_community', 'faiss', 'numpy', 'openai', 'tiktoken'})"
+        " + [name for name in ('utils.chat', 'utils.embeddings', 'utils.indexer') if name in sys.modules]))"
+    )
+    assert loaded == []
+
+
+def test_warm_up_imports_the_chat_dependencies():
+    result = run(
+        "import json, sys, app\n"
+        "from utils.startup import WARM_UP_MODULES, import_seconds, warm_up\n"
+        "stats = warm_up(imports=True)\n"
+        "print(json.dumps({'missing': [name for name in WARM_UP_MODULES if name not in sys.modules],"
+        " 'timed': sorted(import_seconds), 'modules': stats['modules']}))"
+    )
+    assert result['missing'] == []
+    assert 'utils.chat' in result['timed'] and 'routes.talk_ai' in result['timed']
+    assert result['modules'] > 0
+
+
+def test_warm_up_preloads_recent_indexes(client, github):
+    from utils.index_store import index_registry
+    from utils.startup import warm_up
+
+    url = f"https://github.com/{github.owner}/{github.repo}"
+    assert client.post('/api/set-repo', json={'url': url}).status_code == 200
+    key = (github.owner, github.repo, github.sha)
+    with index_registry._lock:
+        index_registry._loaded.pop(key, None)
+        index_registry._lexical.pop(key, None)
+        index_registry._sizes.pop(key, None)
+
+    stats = warm_up(imports=False, indexes=1)
+    assert stats['indexes'] == 1
+    with index_registry._lock:
+        assert key in index_registry._loaded and key in index_registry._lexical
+
+
+def test_warm_up_does_nothing_by_default():
+    from utils.startup import warm_up, warm_up_stats
+
+    assert warm_up(imports=False, indexes=0) is warm_up_stats
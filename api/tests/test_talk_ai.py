@@ -0,0 +1,24 @@
+def ask(client, session_id, query):
+    response = client.post('/api/query', json={'query': query}, headers={'X-Session-Id': session_id})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_follow_ups_are_cached_per_conversation(client, github):
+    url = f"https://github.com/{github.owner}/{github.repo}"
+    for session_id in ('first', 'second', 'third'):
+        assert client.post('/api/set-repo', json={'url': url}, headers={'X-Session-Id': session_id}).status_code == 200
+
+    # Opening questions are shared between sessions
+    assert not ask(client, 'first', 'What does this repository do?').get('cached')
+    assert ask(client, 'third', 'What does this repository do?').get('cached')
+
+    # The same follow-up after a different conversation is answered afresh
+    assert not ask(client, 'second', 'Which tests are there?').get('cached')
+    assert not ask(client, 'first', 'Why?').get('cached')
+    assert not ask(client, 'second', 'Why?').get('cached')
+    # Asked again, it follows a longer conversation and is not a repeat of the last answer either
+    assert not ask(client, 'first', 'Why?').get('cached')
+
+    # After the same conversation it is reused
+    assert ask(client, 'third', 'Why?').get('cached')
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+
+def flatten(node, depth=0):
+    """tree_to_dict output as the records iter_ndjson writes, in the same order."""
+    record = {key: value for key, value in node.items() if key != 'children'}
+    record['depth'] = depth
+    yield record
+    for child in node.get('children', ()):
+        yield from flatten(child, depth + 1)
+
+
+@pytest.mark.parametrize('github', [120], indirect=True)
+def test_ndjson_tree_matches_json_tree(client, github):
+    url = f"https://github.com/{github.owner}/{github.repo}"
+    response = client.post('/api/tree', json={'url': url, 'format': 'ndjson'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    body = response.get_data(as_text=True)
+    assert body.endswith('\n')
+    records = [json.loads(line) for line in body.splitlines()]
+    assert records[0] == {'type': 'repo', 'owner': github.owner, 'repo': github.repo, 'url': url}
+
+    tree = client.post('/api/tree', json={'url': url, 'format': 'json'}).get_json()['data']['tree']
+    assert records[1:] == list(flatten(tree))
+    assert sum(record['type'] == 'file' for record in records) == sum(
+        entry['type'] == 'blob' for entry in github.entries)
+
+    # The Accept header asks for the same stream
+    accepted = client.post('/api/tree', json={'url': url}, headers={'Accept': 'application/x-ndjson'})
+    assert accepted.get_data(as_text=True) == body
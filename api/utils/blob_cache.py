@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", os.path.join(CACHE_ROOT, 'blobs'))
+BLOB_CACHE_MEMORY_MB = int(os.getenv("BLOB_CACHE_MEMORY_MB", "64"))
+BLOB_CACHE_DISK_MB = int(os.getenv("BLOB_CACHE_DISK_MB", "1024"))
+
+
+class BlobCache:
+    """
+    Content-addressed cache of git blobs keyed by their SHA.
+
+    A blob SHA names immutable content, so entries never go stale: a byte-bounded
+    in-memory LRU sits in front of an on-disk store (`<dir>/<sha[:2]>/<sha[2:]>`)
+    that evicts its least recently used files once it grows past `disk_bytes`.
+    """
+
+    def __init__(self, directory, memory_bytes, disk_bytes):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None  # Computed lazily on the first write
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _path(self, sha):
+        return os.path.join(self.directory, sha[:2], sha[2:])
+
+    def get(self, sha):
+        with self._lock:
+            data = self._memory.get(sha)
+            if data is not None:
+                self._memory.move_to_end(sha)
+                self.stats['memory_hits'] += 1
+                return data
+
+        path = self._path(sha)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for disk eviction
+        except OSError:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._remember(sha, data)
+        return data
+
+    def put(self, sha, data):
+        with self._lock:
+            self._remember(sha, data)
+
+        path = self._path(sha)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return  # The disk layer is best effort; memory still holds the blob
+
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sum(size for _, _, size in self._disk_entries())
+            else:
+                self._disk_size += len(data)
+            if self._disk_size > self.disk_bytes:
+                self._evict_disk()
+
+    def get_or_fetch(self, sha, fetch):
+        """Returns the cached blob for `sha`, calling `fetch()` and storing the result on a miss."""
+        data = self.get(sha)
+        if data is None:
+            data = fetch()
+            self.put(sha, data)
+        return data
+
+    def _remember(self, sha, data):
+        if len(data) > self.memory_bytes:
+            return
+        if sha in self._memory:
+            self._memory.move_to_end(sha)
+            return
+        self._memory[sha] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _evict_disk(self):
+        # Drop the least recently used files until the store is back under 90% of its budget
+        target = self.disk_bytes * 0.9
+        for path, _, size in sorted(self._disk_entries(), key=lambda entry: entry[1]):
+            if self._disk_size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._disk_size -= size
+            self.stats['evictions'] += 1
+
+
+# Shared by the tree, readme and talk routes
+blob_cache = BlobCache(BLOB_CACHE_DIR, BLOB_CACHE_MEMORY_MB * 1024 * 1024, BLOB_CACHE_DISK_MB * 1024 * 1024)
@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+
+# The talk agent's side of utils.llm, apart so LangChain loads only once a chat starts
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from utils.clients import LLM_TIMEOUT, UPSTREAM_RETRIES, get_breaker
+from utils.llm import CHAT_MODEL, FAKE_TOKEN_DELAY, LLM_BACKEND, fake_completion, fake_token_stream
+from utils.metrics import observe_stage
+
+
+class _TokenQueue(BaseCallbackHandler):
+    def __init__(self, events):
+        self.events = events
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.events.put(('token', token))
+
+
+class StageCallbackHandler(BaseCallbackHandler):
+    """Times LangChain LLM calls (llm_call) and retrievals (retrieval) into the stage histogram."""
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def _end(self, run_id, stage):
+        with self._lock:
+            start = self._started.pop(run_id, None)
+        if start is not None:
+            observe_stage(stage, time.perf_counter() - start)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, 'llm_call')
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, 'llm_call')
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, 'retrieval')
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, 'retrieval')
+
+
+# One instance so LangChain deduplicates it when it is attached at several levels
+stage_callbacks = StageCallbackHandler()
+
+
+def stream_agent_answer(agent, query):
+    """
+    Runs the agent in a background thread and yields ('token', text) events as its
+    chat model streams, then ('done', answer) or ('error', message).
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            events.put(('done', get_breaker("openai").call(agent.run, query, callbacks=[_TokenQueue(events)])))
+        except Exception as e:
+            events.put(('error', str(e)))
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        kind, value = events.get()
+        yield kind, value
+        if kind in ('done', 'error'):
+            return
+
+
+_chat_models = {}
+_chat_models_lock = threading.Lock()
+
+
+def get_chat_model(openai_api_key=None, streaming=False):
+    """
+    The chat model used by the talk agent: ChatOpenAI, or FakeChatModel when LLM_BACKEND=fake.
+    ChatOpenAI instances hold no conversation state, so one per key and mode is shared
+    by every session, along with the keep-alive OpenAI client inside it.
+    """
+    if LLM_BACKEND == "fake":
+        return FakeChatModel(streaming=streaming, callbacks=[stage_callbacks])
+    from langchain.chat_models import ChatOpenAI
+
+    with _chat_models_lock:
+        model = _chat_models.get((openai_api_key, streaming))
+        if model is None:
+            model = _chat_models[(openai_api_key, streaming)] = ChatOpenAI(
+                model_name=CHAT_MODEL,
+                openai_api_key=openai_api_key,
+                streaming=streaming,
+                request_timeout=LLM_TIMEOUT,
+                max_retries=UPSTREAM_RETRIES,
+                callbacks=[stage_callbacks],
+            )
+        return model
+
+
+class FakeChatModel(BaseChatModel):
+    """LangChain chat model that answers with `fake_completion`, streaming it on a timer."""
+
+    streaming: bool = False
+    delay: float = FAKE_TOKEN_DELAY
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+        text = fake_completion(str(messages[-1].content))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in fake_token_stream(str(messages[-1].content), self.delay):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
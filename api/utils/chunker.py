@@ -0,0 +1,191 @@
+import bisect
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+
+from utils.lexical import definition_pattern
+
+
+# Largest chunk in characters; neighbouring blocks are packed together up to it
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1500"))
+# Worker processes splitting files for large ingests (0 or 1 splits in the calling thread)
+CHUNK_PROCESSES = int(os.getenv("CHUNK_PROCESSES", str(min(os.cpu_count() or 1, 8))))
+# Ingests with fewer files than this are split in the calling thread
+CHUNK_POOL_MIN_FILES = int(os.getenv("CHUNK_POOL_MIN_FILES", "200"))
+# Files sent to a worker process per task
+CHUNK_POOL_BATCH = int(os.getenv("CHUNK_POOL_BATCH", "32"))
+
+# Stored with each indexed file, so files chunked differently are re-chunked on the next build
+CHUNKER_VERSION = 1
+
+# Section starts of the text formats among the indexed extensions, matched at line starts like the definitions
+_MARKDOWN = re.compile(r'\n(#{1,6})[ \t]+([^\n]+)')
+_YAML = re.compile(r'\n([A-Za-z_"\'][^:\n]*):')
+_CSS = re.compile(r'\n([^\s}/][^{;\n]*?)[ \t]*\{')
+# Anything else breaks at blank lines; matches start one character early, at the blank line
+_PARAGRAPH = re.compile(r'\n\n(?=[ \t]*\S)')
+
+_SECTIONS = {
+    '.md': _MARKDOWN,
+    '.yaml': _YAML, '.yml': _YAML,
+    '.css': _CSS,
+}
+
+# Lines kept with the definition below them: decorators, attributes and comments
+_LEADING = ('@', '#[', '# ', '//', '/*', '*')
+
+
+def _rule(path):
+    """(pattern, is code) for a file: its language's definitions, a text format's sections or paragraphs."""
+    pattern = definition_pattern(path)
+    if pattern is not None:
+        return pattern, True
+    dot = path.rfind('.')
+    pattern = _SECTIONS.get(path[dot:]) if dot > path.rfind('/') else None
+    return pattern or _PARAGRAPH, False
+
+
+def _boundaries(path, content, lines, starts):
+    """
+    Where blocks start in a file: sorted (line index, level, symbol) tuples. Code blocks
+    start at definitions, taking the decorators and comments right above them along,
+    at the definition's indentation level; markdown sections at headings, by heading depth.
+    `starts` are the offsets of `lines` in `content`.
+    """
+    pattern, is_code = _rule(path)
+    skew = 1 if pattern is _PARAGRAPH else 0
+    found = {}
+    previous = 0
+    # Each match starts at the newline before its line, which is that line's offset in `content`
+    for m in pattern.finditer('\n' + content):
+        index = bisect.bisect_right(starts, m.start() + skew) - 1
+        if index <= 0 or index in found:
+            continue
+        line = lines[index]
+        if pattern is _MARKDOWN:
+            level, symbol = len(m[1]), m[2].strip()
+        else:
+            level = len(line) - len(line.lstrip(' \t'))
+            symbol = next((group for group in m.groups() if group), None)
+        if is_code:
+            prefix = line[:level]
+            while index - 1 > previous and lines[index - 1].startswith(prefix) \
+                    and lines[index - 1].strip().startswith(_LEADING):
+                index -= 1
+        found[index] = (index, level, symbol)
+        previous = index
+    return sorted(found.values())
+
+
+def chunk_text(path, content, max_chars=CHUNK_MAX_CHARS):
+    """
+    Splits a file into chunks along its language's block boundaries: functions, classes
+    and other top-level definitions for code (see utils.lexical), headings for markdown,
+    top-level keys for YAML, rules for CSS and blank lines otherwise.
+
+    Blocks larger than `max_chars` are split again at the definitions nested in them
+    (methods in a class), then at line windows; consecutive blocks are packed together up
+    to `max_chars`. Returns [(text, first line, last line, symbol)], with 1-based line
+    numbers and the (dotted, for nested code) name of the first definition in the chunk.
+    """
+    lines = content.splitlines(keepends=True)
+    if not lines:
+        return []
+    # sizes[i] is the offset of line i, and sizes[-1] the length of the file
+    sizes = [0, *accumulate(map(len, lines))]
+    bounds = _boundaries(path, content, lines, sizes)
+    qualify = _rule(path)[1]
+
+    def size(start, end):
+        return sizes[end] - sizes[start]
+
+    def pack(pieces):
+        packed = []
+        for piece in pieces:
+            if packed and size(packed[-1][0], piece[1]) <= max_chars:
+                start, _, symbol = packed[-1]
+                packed[-1] = (start, piece[1], symbol or piece[2])
+            else:
+                packed.append(piece)
+        return packed
+
+    def windows(start, end, symbol):
+        pieces = []
+        while start < end:
+            # As many whole lines as fit, and at least one
+            stop = min(max(bisect.bisect_right(sizes, sizes[start] + max_chars) - 1, start + 1), end)
+            pieces.append((start, stop, symbol))
+            start = stop
+        return pieces
+
+    def split(start, end, inner, symbol):
+        if size(start, end) <= max_chars:
+            return [(start, end, symbol)]
+        if not inner:
+            return windows(start, end, symbol)
+        level = min(bound[1] for bound in inner)
+        cuts = [bound for bound in inner if bound[1] == level]
+        edges = [start] + [bound[0] for bound in cuts] + [end]
+        names = [symbol] + [f"{symbol}.{name}" if qualify and symbol and name else name for _, _, name in cuts]
+        positions = [bound[0] for bound in inner]
+        pieces = []
+        for (first, last), name in zip(zip(edges, edges[1:]), names):
+            nested = inner[bisect.bisect_right(positions, first):bisect.bisect_left(positions, last)]
+            pieces.extend(split(first, last, nested, name))
+        return pack(pieces)
+
+    chunks = []
+    for start, end, symbol in split(0, len(lines), bounds, None):
+        text = content[sizes[start]:sizes[end]]
+        if not text.strip():
+            continue
+        if len(text) <= max_chars:
+            chunks.append((text, start + 1, end, symbol))
+        else:
+            # Only a single line longer than a chunk (minified code) gets here: cut it by characters
+            chunks.extend((text[offset:offset + max_chars], start + 1, end, symbol)
+                          for offset in range(0, len(text), max_chars))
+    return chunks
+
+
+def chunk_batch(files):
+    """Worker task: chunk_text over [(path, content)], returning [(chunks, seconds)] in order."""
+    results = []
+    for path, content in files:
+        start = time.perf_counter()
+        chunks = chunk_text(path, content)
+        results.append((chunks, time.perf_counter() - start))
+    return results
+
+
+def chunk_processes(n_files):
+    """Worker processes to use for splitting `n_files` files: 0 (split in-thread) below CHUNK_POOL_MIN_FILES."""
+    return CHUNK_PROCESSES if CHUNK_PROCESSES > 1 and n_files >= CHUNK_POOL_MIN_FILES else 0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The shared chunking process pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Workers are started fresh rather than forked from the threaded server
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=CHUNK_PROCESSES, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def shutdown_pool(wait=True):
+    """Stops the worker processes; a later ingest starts a new pool."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,196 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Attempts after the first for calls that fail with a transient error
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "3"))
+# Ceiling of the jittered exponential backoff between attempts, in seconds
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+# Consecutive failures that open an upstream's circuit, and how long it stays open
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Keep-alive connections per HTTP session
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    After `failures` consecutive failures the circuit opens and calls fail fast with
+    CircuitOpenError. Once `reset_seconds` have passed a single trial call is let
+    through: success closes the circuit again, failure reopens it.
+    """
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def before(self):
+        """Raises CircuitOpenError unless a call may go out now."""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if self.state == 'open' and time.time() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return
+            self.stats['rejected'] += 1
+            retry_in = max(0, int(self.opened_at + self.reset_seconds - time.time()))
+        raise CircuitOpenError(f"{self.name} is unavailable; retrying in {retry_in}s")
+
+    def success(self):
+        with self._lock:
+            self.stats['successes'] += 1
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failures:
+                if self.state != 'open':
+                    self.stats['opened'] += 1
+                self.state = 'open'
+                self.opened_at = time.time()
+            self._trial_running = False
+
+    def call(self, fn, *args, **kwargs):
+        """Runs `fn` through the breaker, counting any exception as a failure."""
+        self.before()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return result
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, name=self.name, state=self.state)
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """The circuit breaker of one upstream ("github", "groq", "openai")."""
+    with _lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def breaker_status():
+    with _lock:
+        breakers = list(_breakers.values())
+    return [breaker.status() for breaker in breakers]
+
+
+def is_transient(error):
+    """Connection failures, timeouts, 429s and 5xx responses are worth retrying; anything else is not."""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+    # Raised by the groq and openai SDKs, which have no shared base class to check against
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+
+def backoff(attempt):
+    """Full-jitter exponential backoff: uniform in [0, min(max, 0.5 * 2^attempt)]."""
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, 0.5 * 2 ** attempt))
+
+
+def call_upstream(name, fn, *args, retries=UPSTREAM_RETRIES, **kwargs):
+    """
+    Calls `fn(*args, **kwargs)` against upstream `name`, retrying transient errors with
+    jittered backoff. Transient errors count against the upstream's circuit breaker;
+    other errors mean the upstream answered and are raised straight away.
+    """
+    breaker = get_breaker(name)
+    for attempt in range(retries + 1):
+        breaker.before()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                breaker.success()
+                raise
+            breaker.failure()
+            if attempt == retries:
+                raise
+            time.sleep(backoff(attempt))
+            continue
+        breaker.success()
+        return result
+
+
+# === Long-lived clients ===
+_sessions = {}
+_http_clients = {}
+_groq_clients = {}
+
+
+def http_session(name, pool_size=HTTP_POOL_SIZE):
+    """A keep-alive requests.Session per upstream, shared by every thread."""
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = _sessions[name] = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+        return session
+
+
+def httpx_client(name):
+    """A keep-alive httpx.Client per upstream, for SDKs that accept one."""
+    import httpx
+
+    with _lock:
+        client = _http_clients.get(name)
+        if client is None:
+            client = _http_clients[name] = httpx.Client(
+                timeout=LLM_TIMEOUT,
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            )
+        return client
+
+
+def groq_client(api_key=None):
+    """The shared Groq client for `api_key` (default: GROQ_API_KEY). Retries are left to call_upstream."""
+    from groq import Groq
+
+    api_key = api_key or os.getenv('GROQ_API_KEY')
+    http_client = httpx_client('groq')
+    with _lock:
+        client = _groq_clients.get(api_key)
+        if client is None:
+            client = _groq_clients[api_key] = Groq(
+                api_key=api_key, timeout=LLM_TIMEOUT, max_retries=0, http_client=http_client)
+        return client
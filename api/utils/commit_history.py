@@ -0,0 +1,243 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+from utils.blob_cache import CACHE_ROOT
+from utils.github import GitHubError
+from utils.singleflight import repo_flight
+
+
+COMMIT_HISTORY_DIR = os.getenv("COMMIT_HISTORY_DIR", os.path.join(CACHE_ROOT, 'commits'))
+# Commits kept per branch, newest first
+COMMIT_HISTORY_MAX = int(os.getenv("COMMIT_HISTORY_MAX", "1000"))
+# Newest commits per branch whose changed files are recorded for path queries;
+# the API needs one request per commit for them
+COMMIT_HISTORY_FILES = int(os.getenv("COMMIT_HISTORY_FILES", "100"))
+COMMIT_FILES_CONCURRENCY = int(os.getenv("COMMIT_FILES_CONCURRENCY", "8"))
+# How long the head last seen on a branch other than the default one is trusted
+COMMIT_BRANCH_TTL = int(os.getenv("COMMIT_BRANCH_TTL", "300"))
+
+# Run once per database file; WAL mode is stored in the file itself
+_SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS heads (branch TEXT PRIMARY KEY, sha TEXT, checked_at REAL);
+CREATE TABLE IF NOT EXISTS commits (
+    sha TEXT PRIMARY KEY, date TEXT, author TEXT, email TEXT, message TEXT, files_known INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS history (branch TEXT, seq INTEGER, sha TEXT, PRIMARY KEY (branch, seq));
+CREATE INDEX IF NOT EXISTS history_sha ON history (sha);
+CREATE TABLE IF NOT EXISTS files (sha TEXT, path TEXT, PRIMARY KEY (sha, path)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+CREATE INDEX IF NOT EXISTS commits_date ON commits (date);
+"""
+# Database files this process has already created the schema in
+_initialized = set()
+_initialized_lock = threading.Lock()
+
+
+def utc_date(text):
+    """An ISO 8601 timestamp as UTC "YYYY-MM-DDTHH:MM:SSZ", so stored dates compare as strings."""
+    if not text:
+        return None
+    moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _date_bound(text, end=False):
+    """
+    The stored-date string a since/until filter compares against. A bare date covers the
+    whole day, so as an end bound it becomes the start of the next day (compared with <).
+    """
+    try:
+        if len(text) == 10:
+            day = datetime.strptime(text, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            return utc_date((day + timedelta(days=1) if end else day).isoformat())
+        moment = utc_date(text)
+    except ValueError:
+        raise ValueError(f"Invalid date {text!r}; expected YYYY-MM-DD or an ISO 8601 timestamp") from None
+    # Until a timestamp includes that second
+    return utc_date((datetime.fromisoformat(moment[:-1]) + timedelta(seconds=1)).isoformat()) if end else moment
+
+
+class CommitHistory:
+    """
+    Commit histories in one SQLite file per repository, `<dir>/<owner>/<repo>.sqlite`.
+
+    Each branch's history is fetched once per head commit and kept up to
+    COMMIT_HISTORY_MAX commits: when the head moves, commits are listed only down to
+    the first one already stored, and a history the new head does not build on at
+    all is fetched again. Commits merged in with dates older than that stored commit
+    are therefore missed until then. Changed files are recorded for the newest
+    COMMIT_HISTORY_FILES commits. Date, author and path queries then read the file
+    without going to GitHub.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.stats = {'queries': 0, 'syncs': 0, 'refetches': 0, 'commits_fetched': 0, 'file_lists_fetched': 0}
+
+    def path(self, owner, repo):
+        return os.path.join(self.directory, owner, f"{repo}.sqlite")
+
+    def _connect(self, owner, repo):
+        path = self.path(owner, repo)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path, timeout=30)
+        db.row_factory = sqlite3.Row
+        with _initialized_lock:
+            if path not in _initialized:
+                db.executescript(_SCHEMA)
+                _initialized.add(path)
+        return db
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def default_branch(self, owner, repo, source):
+        """The repository's default branch, asked of the source once and then remembered."""
+        with closing(self._connect(owner, repo)) as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'default_branch'").fetchone()
+        if row:
+            return row[0]
+        branch = source.default_branch()
+        with closing(self._connect(owner, repo)) as db, db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('default_branch', ?)", (branch,))
+        return branch
+
+    def head(self, owner, repo, source, branch):
+        """The branch's head: the one last synced if checked within COMMIT_BRANCH_TTL, else resolved by the source."""
+        with closing(self._connect(owner, repo)) as db:
+            row = db.execute("SELECT sha, checked_at FROM heads WHERE branch = ?", (branch,)).fetchone()
+        if row and time.time() - row['checked_at'] < COMMIT_BRANCH_TTL:
+            return row['sha']
+        return source.head_sha(branch)
+
+    def sync(self, owner, repo, source, branch, head):
+        """Brings the stored history of `branch` up to commit `head`; returns whether anything was fetched."""
+        with closing(self._connect(owner, repo)) as db:
+            row = db.execute("SELECT sha FROM heads WHERE branch = ?", (branch,)).fetchone()
+        if row and row[0] == head:
+            return False
+        # Concurrent questions about the same new head share one fetch
+        repo_flight.do(('commit_history', owner, repo, branch, head), self._sync, owner, repo, source, branch, head)
+        return True
+
+    def _sync(self, owner, repo, source, branch, head):
+        with closing(self._connect(owner, repo)) as db:
+            known = {row[0] for row in db.execute("SELECT sha FROM history WHERE branch = ?", (branch,))}
+            with_files = {row[0] for row in db.execute("SELECT sha FROM commits WHERE files_known")}
+
+        new = []
+        base = None
+        for commit in source.iter_commits(head, COMMIT_HISTORY_MAX):
+            if commit['sha'] in known:
+                base = commit['sha']
+                break
+            new.append(commit)
+
+        missing = [commit for commit in new[:COMMIT_HISTORY_FILES]
+                   if commit.get('files') is None and commit['sha'] not in with_files]
+        if missing:
+            with ThreadPoolExecutor(max_workers=COMMIT_FILES_CONCURRENCY) as executor:
+                for commit, files in zip(missing, executor.map(lambda c: self._files(source, c['sha']), missing)):
+                    commit['files'] = files
+            self._count('file_lists_fetched', len(missing))
+
+        with closing(self._connect(owner, repo)) as db, db:
+            if base:
+                # Commits stored above the one the new head builds on were dropped from the branch
+                top = db.execute("SELECT seq FROM history WHERE branch = ? AND sha = ?", (branch, base)).fetchone()[0]
+                db.execute("DELETE FROM history WHERE branch = ? AND seq > ?", (branch, top))
+            else:
+                db.execute("DELETE FROM history WHERE branch = ?", (branch,))
+                top = 0
+            db.executemany(
+                "INSERT OR IGNORE INTO commits (sha, date, author, email, message) VALUES (?, ?, ?, ?, ?)",
+                [(c['sha'], utc_date(c['date']), c['author'], c['email'], c['message']) for c in new])
+            for commit in new[:COMMIT_HISTORY_FILES]:
+                if commit.get('files') is not None:
+                    db.execute("UPDATE commits SET files_known = 1 WHERE sha = ?", (commit['sha'],))
+                    db.executemany("INSERT OR IGNORE INTO files (sha, path) VALUES (?, ?)",
+                                   [(commit['sha'], path) for path in commit['files']])
+            # Oldest first, so the newest commit gets the highest number
+            db.executemany("INSERT INTO history (branch, seq, sha) VALUES (?, ?, ?)",
+                           [(branch, top + len(new) - n, commit['sha']) for n, commit in enumerate(new)])
+            db.execute("DELETE FROM history WHERE branch = ? AND seq <= ?", (branch, top + len(new) - COMMIT_HISTORY_MAX))
+            db.execute("DELETE FROM commits WHERE sha NOT IN (SELECT sha FROM history)")
+            db.execute("DELETE FROM files WHERE sha NOT IN (SELECT sha FROM commits)")
+            db.execute("INSERT OR REPLACE INTO heads (branch, sha, checked_at) VALUES (?, ?, ?)",
+                       (branch, head, time.time()))
+
+        self._count('syncs')
+        self._count('commits_fetched', len(new))
+        if known and not base:
+            self._count('refetches')
+
+    def _files(self, source, sha):
+        try:
+            return source.commit_files(sha)
+        except (GitHubError, ValueError):
+            # Left unknown; the commit just won't match path queries
+            return None
+
+    def query(self, owner, repo, branch, since=None, until=None, author=None, path=None, limit=20):
+        """
+        Stored commits of `branch` as {'sha', 'date', 'author', 'email', 'message'} dicts,
+        newest first. `since` and `until` are inclusive dates or timestamps, `author` a
+        case-insensitive part of the author's name or email and `path` a file or folder
+        the commit changed.
+        """
+        sql = ["SELECT c.sha, c.date, c.author, c.email, c.message FROM history h JOIN commits c ON c.sha = h.sha",
+               "WHERE h.branch = ?"]
+        params = [branch]
+        if since:
+            sql.append("AND c.date >= ?")
+            params.append(_date_bound(since))
+        if until:
+            sql.append("AND c.date < ?")
+            params.append(_date_bound(until, end=True))
+        if author:
+            sql.append("AND (instr(lower(c.author), lower(?)) OR instr(lower(c.email), lower(?)))")
+            params += [author, author]
+        if path:
+            folder = path.strip('/') + '/'
+            sql.append("AND EXISTS (SELECT 1 FROM files f WHERE f.sha = c.sha"
+                       " AND (f.path = ? OR substr(f.path, 1, ?) = ?))")
+            params += [path.strip('/'), len(folder), folder]
+        sql.append("ORDER BY h.seq DESC LIMIT ?")
+        params.append(limit)
+
+        self._count('queries')
+        with closing(self._connect(owner, repo)) as db:
+            return [dict(row) for row in db.execute(' '.join(sql), params)]
+
+    def coverage(self, owner, repo, branch):
+        """How far the stored history of `branch` goes: {'commits', 'with_files', 'oldest'}."""
+        with closing(self._connect(owner, repo)) as db:
+            row = db.execute("SELECT COUNT(*), SUM(c.files_known), MIN(c.date) FROM history h"
+                             " JOIN commits c ON c.sha = h.sha WHERE h.branch = ?", (branch,)).fetchone()
+        return {'commits': row[0], 'with_files': row[1] or 0, 'oldest': row[2]}
+
+    def commits(self, owner, repo, source, default_head, branch=None, **filters):
+        """
+        Answers a query (see `query`) about `branch`, by default the default branch,
+        whose head is `default_head`, after syncing the branch's stored history.
+        Returns (branch, commits).
+        """
+        default = self.default_branch(owner, repo, source)
+        branch = branch or default
+        head = default_head if branch == default else self.head(owner, repo, source, branch)
+        self.sync(owner, repo, source, branch, head)
+        return branch, self.query(owner, repo, branch, **filters)
+
+
+commit_history = CommitHistory(COMMIT_HISTORY_DIR)
@@ -0,0 +1,287 @@
+import fcntl
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from utils.blob_cache import CACHE_ROOT
+from utils.clients import LLM_TIMEOUT
+from utils.metrics import stage_timer
+
+
+# "openai" or "hash" (local, deterministic, no network)
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(CACHE_ROOT, 'embeddings'))
+# Texts per embedding request, and a cap on their combined length
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_BATCH_CHARS = int(os.getenv("EMBEDDING_BATCH_CHARS", "400000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_RETRIES = int(os.getenv("EMBEDDING_RETRIES", "4"))
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Append-only store of float32 vectors keyed by content hash.
+
+    `vectors.f32` holds the rows back to back and `index.txt` holds one hash per line,
+    so line n names row n; `dim.txt` records the vector width. Both data files are
+    only ever appended to, which keeps writes cheap and makes a partially written
+    tail easy to ignore on load.
+
+    Worker processes can share one directory: appends hold an exclusive flock on
+    `lock`, take their row numbers from the vector file's length, and each process
+    reads the index lines others appended when it misses a hash.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.dim = None
+        self._rows = {}
+        self._lines = 0  # Index lines read so far, which is also the rows known complete
+        self._offset = 0  # Bytes of index.txt read so far
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._index_path = os.path.join(directory, 'index.txt')
+        self._dim_path = os.path.join(directory, 'dim.txt')
+        self._lock_path = os.path.join(directory, 'lock')
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            self._repair()
+
+    @contextmanager
+    def _file_lock(self, operation):
+        with open(self._lock_path, 'a') as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Reads index lines appended since the last read. Callers hold self._lock and the file lock."""
+        if self.dim is None:
+            try:
+                with open(self._dim_path) as f:
+                    self.dim = int(f.read())
+            except (OSError, ValueError):
+                return
+        try:
+            with open(self._index_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < self._offset:
+                    # Repaired by another process since the last read
+                    self._rows, self._lines, self._offset = {}, 0, 0
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # A line without its newline is still being written, or was cut off by a crash
+        data = data[:data.rfind(b'\n') + 1]
+        for h in data.decode().split():
+            self._rows.setdefault(h, self._lines)
+            self._lines += 1
+        self._offset += len(data)
+
+    def _repair(self):
+        """Drops a partially written tail from either file. Callers hold self._lock and the exclusive file lock."""
+        if self.dim is None:
+            return
+        vector_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        index_bytes = os.path.getsize(self._index_path) if os.path.exists(self._index_path) else 0
+        # Only trust rows that were fully written
+        complete = min(self._lines, vector_bytes // (4 * self.dim))
+        if complete * 4 * self.dim < vector_bytes:
+            os.truncate(self._vectors_path, complete * 4 * self.dim)
+        if complete < self._lines:
+            with open(self._index_path) as f:
+                hashes = f.read().split('\n')[:complete]
+            with open(self._index_path, 'w') as f:
+                f.write(''.join(f"{h}\n" for h in hashes))
+            self._rows, self._lines, self._offset = {}, 0, 0
+            self._refresh()
+        elif self._offset < index_bytes:
+            os.truncate(self._index_path, self._offset)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get_many(self, hashes):
+        """Returns {hash: vector} for the hashes present in the store."""
+        with self._lock:
+            if any(h not in self._rows for h in hashes):
+                with self._file_lock(fcntl.LOCK_SH):
+                    self._refresh()
+            rows = {h: self._rows[h] for h in hashes if h in self._rows}
+            lines = self._lines
+        if not rows:
+            return {}
+        # Only the rows read so far: another process may be appending past them
+        vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(lines, self.dim))
+        return {h: vectors[row].tolist() for h, row in rows.items()}
+
+    def add_many(self, items):
+        """Appends (hash, vector) pairs that are not stored yet."""
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._refresh()
+            new = {}
+            for h, v in items:
+                if h not in self._rows:
+                    new.setdefault(h, v)
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = len(next(iter(new.values())))
+                with open(self._dim_path, 'w') as f:
+                    f.write(str(self.dim))
+            self._repair()
+            with open(self._vectors_path, 'ab') as f:
+                first = os.fstat(f.fileno()).st_size // (4 * self.dim)
+                f.write(np.asarray(list(new.values()), dtype=np.float32).tobytes())
+            # After the vectors, so a reader never sees a hash without its row
+            with open(self._index_path, 'a') as f:
+                f.write(''.join(f"{h}\n" for h in new))
+                self._offset = f.tell()
+            for row, h in enumerate(new, start=first):
+                self._rows[h] = row
+            self._lines = first + len(new)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends texts it has never seen before.
+
+    Document chunks are looked up by content hash in an EmbeddingStore, so vendored
+    files, licenses and boilerplate shared across repositories and forks are embedded
+    once. Misses are deduplicated, grouped into batches bounded by count and size, and
+    sent with bounded parallelism; failed batches are retried with jittered backoff.
+    """
+
+    def __init__(self, embeddings, store, batch_size=EMBEDDING_BATCH_SIZE, batch_chars=EMBEDDING_BATCH_CHARS,
+                 concurrency=EMBEDDING_CONCURRENCY, retries=EMBEDDING_RETRIES):
+        self.embeddings = embeddings
+        self.store = store
+        self.batch_size = batch_size
+        self.batch_chars = batch_chars
+        self.concurrency = concurrency
+        self.retries = retries
+        self.stats = {'hits': 0, 'misses': 0, 'batches': 0, 'retries': 0}
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with stage_timer('embed'):
+            return self._embed_documents(texts)
+
+    def _embed_documents(self, texts):
+        hashes = [content_hash(text) for text in texts]
+        found = self.store.get_many(set(hashes))
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in found:
+                missing.setdefault(h, text)
+        with self._lock:
+            self.stats['hits'] += len(texts) - sum(1 for h in hashes if h not in found)
+            self.stats['misses'] += len(missing)
+
+        if missing:
+            batches = self._batches(list(missing.items()))
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for batch, vectors in zip(batches, executor.map(self._embed_batch, batches)):
+                    pairs = [(h, vector) for (h, _), vector in zip(batch, vectors)]
+                    self.store.add_many(pairs)
+                    found.update(pairs)
+
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        with stage_timer('embed'):
+            return self.embeddings.embed_query(text)
+
+    def _batches(self, items):
+        batches, batch, size = [], [], 0
+        for item in items:
+            if batch and (len(batch) >= self.batch_size or size + len(item[1]) > self.batch_chars):
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(item)
+            size += len(item[1])
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, batch):
+        texts = [text for _, text in batch]
+        for attempt in range(self.retries + 1):
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                with self._lock:
+                    self.stats['batches'] += 1
+                return vectors
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    self.stats['retries'] += 1
+                time.sleep(min(30, 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings for offline runs and benchmarks.
+
+    Word tokens are hashed into `dim` buckets and the counts are L2-normalised, so
+    texts sharing identifiers still land close together without any network call.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode()).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+_embeddings = {}
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings(openai_api_key=None):
+    """
+    Returns the configured embeddings backend wrapped in a CachedEmbeddings. One
+    wrapper, and one on-disk store, is shared per backend.
+    """
+    backend = EMBEDDINGS_BACKEND
+    with _embeddings_lock:
+        cached = _embeddings.get(backend)
+        if cached is None:
+            if backend == "hash":
+                embeddings, model = HashEmbeddings(), "hash"
+            else:
+                from langchain.embeddings import OpenAIEmbeddings
+                # Batches are retried by CachedEmbeddings, so the client itself does not retry
+                embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key, max_retries=0, request_timeout=LLM_TIMEOUT)
+                model = embeddings.model
+            store = EmbeddingStore(os.path.join(EMBEDDING_CACHE_DIR, model))
+            cached = _embeddings[backend] = CachedEmbeddings(embeddings, store)
+        return cached
@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.clients import call_upstream, http_session
+from utils.metrics import stage_timer
+
+
+GITHUB_API = "https://api.github.com"
+
+# Keep-alive connections to the API, shared by the clients of every token
+GITHUB_POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "16"))
+# Number of conditional responses remembered for If-None-Match revalidation, and their
+# total size (as sent by GitHub); responses larger than the size budget are not remembered
+GITHUB_ETAG_CACHE_SIZE = int(os.getenv("GITHUB_ETAG_CACHE_SIZE", "512"))
+GITHUB_ETAG_CACHE_MB = int(os.getenv("GITHUB_ETAG_CACHE_MB", "16"))
+# Below this many remaining requests, calls are spread evenly until the window resets
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "500"))
+# Longest a request may be held back waiting for budget before failing fast
+GITHUB_RATE_LIMIT_MAX_WAIT = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "30"))
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "30"))
+
+
+class GitHubError(ValueError):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RateLimitError(GitHubError):
+    pass
+
+
+class RateLimiter:
+    """
+    Token bucket that follows GitHub's rate limit headers.
+
+    The bucket is refilled from `X-RateLimit-Remaining` / `X-RateLimit-Reset` on every
+    response. While plenty of budget is left requests pass straight through; once
+    it drops under `reserve`, requests are queued and spaced so the remainder lasts
+    until the reset. An empty bucket waits for the reset, or raises RateLimitError
+    when that is further away than `max_wait`.
+    """
+
+    def __init__(self, reserve=GITHUB_RATE_LIMIT_RESERVE, max_wait=GITHUB_RATE_LIMIT_MAX_WAIT):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.waiting = 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.time()
+            if self.reset_at is not None and now >= self.reset_at:
+                self.remaining = self.limit
+                self.reset_at = None
+
+            wait = 0.0
+            if self.remaining is not None and self.remaining <= 0:
+                wait = (self.reset_at or now) - now
+                if wait > self.max_wait:
+                    raise RateLimitError(
+                        f"GitHub rate limit exhausted; resets in {int(wait)}s", status_code=403)
+            elif self.remaining is not None and self.remaining < self.reserve and self.reset_at:
+                interval = (self.reset_at - now) / self.remaining
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + interval
+                wait = min(slot - now, self.max_wait)
+
+            if self.remaining is not None:
+                self.remaining -= 1
+            self.waiting += 1
+
+        try:
+            if wait > 0:
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def update(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        with self._lock:
+            self.remaining = int(remaining)
+            self.limit = int(headers.get("X-RateLimit-Limit", self.limit or 0)) or None
+            reset = headers.get("X-RateLimit-Reset")
+            self.reset_at = float(reset) if reset else None
+
+    def status(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'reset_at': self.reset_at,
+                'waiting': self.waiting,
+            }
+
+
+class GitHubClient:
+    """
+    GitHub REST client for one token, on the shared keep-alive "github" session.
+
+    JSON responses carrying an ETag are remembered, and repeat requests are sent with
+    If-None-Match; a 304 reply is served from memory and does not count against the
+    rate limit. Requests addressed by SHA never change and are sent unconditionally,
+    so their (often large) responses are not kept. Connection errors and 5xx responses
+    are retried with backoff behind the "github" circuit breaker.
+    """
+
+    def __init__(self, token=None, pool_size=GITHUB_POOL_SIZE, etag_cache_size=GITHUB_ETAG_CACHE_SIZE,
+                 etag_cache_bytes=GITHUB_ETAG_CACHE_MB * 1024 * 1024):
+        self.session = http_session("github", pool_size)
+        self.headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.limiter = RateLimiter()
+        self.etag_cache_size = etag_cache_size
+        self.etag_cache_bytes = etag_cache_bytes
+        self._etags = OrderedDict()
+        self._etag_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'errors': 0}
+
+    def get_json(self, path_or_url, params=None, conditional=True):
+        """
+        GETs a GitHub API path (or absolute URL) and returns the decoded JSON.
+        Raises GitHubError for non-200 responses and RateLimitError when the budget is spent.
+        Pass conditional=False for SHA-addressed resources, which cannot change.
+        """
+        url = path_or_url if path_or_url.startswith("http") else f"{GITHUB_API}{path_or_url}"
+        key = (url, tuple(sorted((params or {}).items())))
+        headers = dict(self.headers)
+        cached = None
+        if conditional:
+            with self._lock:
+                cached = self._etags.get(key)
+                if cached:
+                    self._etags.move_to_end(key)
+                    headers["If-None-Match"] = cached[0]
+
+        response = call_upstream("github", self._get, url, params, headers)
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.stats['not_modified'] += 1
+            return cached[1]
+        if response.status_code != 200:
+            raise self._error(response)
+
+        data = response.json()
+        etag = response.headers.get("ETag")
+        size = len(response.content)
+        if conditional and etag and size <= self.etag_cache_bytes:
+            with self._lock:
+                previous = self._etags.pop(key, None)
+                if previous:
+                    self._etag_bytes -= previous[2]
+                self._etags[key] = (etag, data, size)
+                self._etag_bytes += size
+                while len(self._etags) > self.etag_cache_size or self._etag_bytes > self.etag_cache_bytes:
+                    _, (_, _, evicted_size) = self._etags.popitem(last=False)
+                    self._etag_bytes -= evicted_size
+        return data
+
+    def _get(self, url, params, headers):
+        self.limiter.acquire()
+        with stage_timer('github_fetch'):
+            response = self.session.get(url, params=params, headers=headers, timeout=GITHUB_TIMEOUT)
+        self.limiter.update(response.headers)
+        with self._lock:
+            self.stats['requests'] += 1
+            if response.status_code not in (200, 304):
+                self.stats['errors'] += 1
+        if response.status_code >= 500:
+            # Raised so call_upstream retries it
+            raise self._error(response)
+        return response
+
+    def _error(self, response):
+        try:
+            message = response.json().get('message', 'Unknown error')
+        except (ValueError, AttributeError):
+            message = response.text[:200] or 'Unknown error'
+        if response.status_code in (403, 429) and response.headers.get("X-RateLimit-Remaining") == "0":
+            return RateLimitError(f"GitHub rate limit exhausted: {message}", response.status_code)
+        return GitHubError(f"Failed to fetch data from GitHub API: {response.status_code} - {message}",
+                           response.status_code)
+
+    def rate_limit(self):
+        return self.limiter.status()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token=None):
+    """Returns the shared client for `token` (default: GITHUB_TOKEN); rate limits are tracked per token."""
+    token = token or os.getenv("GITHUB_TOKEN")
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = _clients[token] = GitHubClient(token)
+        return client
+
+
+def rate_limit_status():
+    """Remaining rate limit budget and request counters for every client in use."""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [dict(client.rate_limit(), **client.stats) for client in clients]
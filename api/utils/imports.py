@@ -0,0 +1,75 @@
+import re
+
+
+# One precompiled pattern per language. Statement patterns start with a literal "\n"
+# instead of a MULTILINE "^": the regex engine then jumps between newlines with a fast
+# literal search rather than trying every position. Content is scanned with "\n"
+# prepended so the first line is a line start too.
+_PYTHON = re.compile(r'\n[ \t]*(?:import[ \t]+(\S+)|from[ \t]+(\S+)[ \t]+import[ \t]+(\S+))')
+_C_INCLUDE = re.compile(r'\n[ \t]*#[ \t]*include[ \t]*[<"]([^>"\s]+)[>"]')
+_JS = re.compile(
+    r'\n[ \t]*(?:'
+    r'(?:import|export)\b[^;\'"`]*?\bfrom[ \t]*[\'"]([^\'"\s]+)[\'"]'  # import x from 'm', multi-line too
+    r'|import[ \t]*[\'"]([^\'"\s]+)[\'"])'                             # import 'm' (side effects)
+)
+# require() may appear anywhere in a line, so it gets its own literal-prefixed pass
+_JS_REQUIRE = re.compile(r'require[ \t]*\([ \t]*[\'"]([^\'"\s]+)[\'"][ \t]*\)')
+_JAVA = re.compile(r'\n[ \t]*import[ \t]+(?:static[ \t]+)?([\w.]+(?:\.\*)?)[ \t]*;')
+_KOTLIN = re.compile(r'\n[ \t]*import[ \t]+([\w.]+)')
+_RUST = re.compile(r'\n[ \t]*(?:extern[ \t]+crate[ \t]+(\w+)|(?:pub[ \t]+)?use[ \t]+([\w:]+))')
+_GO = re.compile(r'\n[ \t]*import[ \t]*(?:(?:[\w.]+[ \t]+)?"([^"]+)"|\(([^)]*)\))')
+_GO_SPEC = re.compile(r'"([^"]+)"')
+_CSHARP = re.compile(r'\n[ \t]*(?:global[ \t]+)?using[ \t]+(?:static[ \t]+)?([\w.]+)[ \t]*;')
+_PHP = re.compile(r'\n[ \t]*(?:require|include)(?:_once)?[ \t]*\(?[ \t]*[\'"]([^\'"]+)[\'"]')
+
+
+def _python(content):
+    return [f"import {m[1]}" if m[1] else f"from {m[2]} import {m[3]}" for m in _PYTHON.finditer('\n' + content)]
+
+
+def _first_group(pattern):
+    def extract(content):
+        return [next(group for group in m.groups() if group) for m in pattern.finditer('\n' + content)]
+    return extract
+
+
+def _js(content):
+    return [m[1] or m[2] for m in _JS.finditer('\n' + content)] + _JS_REQUIRE.findall(content)
+
+
+def _go(content):
+    imports = []
+    for m in _GO.finditer('\n' + content):
+        if m[1]:
+            imports.append(m[1])
+        else:
+            # import ( "fmt"; alias "net/http" ) blocks list one spec per line
+            imports.extend(_GO_SPEC.findall(m[2]))
+    return imports
+
+
+_c = _first_group(_C_INCLUDE)
+
+# Extension -> extractor
+EXTRACTORS = {
+    '.py': _python,
+    '.c': _c, '.h': _c, '.cc': _c, '.cpp': _c, '.cxx': _c, '.hh': _c, '.hpp': _c,
+    '.js': _js, '.jsx': _js, '.mjs': _js, '.cjs': _js, '.ts': _js, '.tsx': _js,
+    '.java': _first_group(_JAVA),
+    '.kt': _first_group(_KOTLIN),
+    '.rs': _first_group(_RUST),
+    '.go': _go,
+    '.cs': _first_group(_CSHARP),
+    '.php': _first_group(_PHP),
+}
+
+
+def extract_imports(path, file_content):
+    """
+    Extracts imports from file content based on the language, picked by extension.
+    Supports Python, C/C++ (#include), JavaScript/TypeScript (import, export ... from,
+    require), Java, Kotlin, Rust, Go (single imports and import blocks), C# and PHP.
+    """
+    dot = path.rfind('.')
+    extractor = EXTRACTORS.get(path[dot:]) if dot > path.rfind('/') else None
+    return extractor(file_content) if extractor else []
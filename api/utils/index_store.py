@@ -0,0 +1,220 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from utils.blob_cache import CACHE_ROOT
+from utils.lexical import LexicalIndex
+
+
+INDEX_STORE_DIR = os.getenv("INDEX_STORE_DIR", os.path.join(CACHE_ROOT, 'indexes'))
+# RAM budget for the FAISS and lexical indexes loaded for chat; least recently used ones are
+# dropped from memory past it. Sessions look their index up in the registry on every search
+# rather than holding it, so this bounds everything but the newest index, searches running on
+# an index just evicted, and the base copies an incremental build loads while it runs
+INDEX_STORE_MEMORY_MB = int(os.getenv("INDEX_STORE_MEMORY_MB", "512"))
+LEXICAL_FILE = 'lexical.json'
+
+
+def estimate_index_bytes(vectorstore):
+    """Approximate resident size of a LangChain FAISS store: the vectors plus the chunk texts."""
+    index = vectorstore.index
+    size = index.ntotal * index.d * 4
+    for doc in getattr(vectorstore.docstore, '_dict', {}).values():
+        size += len(doc.page_content)
+    return size
+
+
+class IndexRegistry:
+    """
+    FAISS indexes keyed by (owner, repo, commit SHA).
+
+    Every index is saved under `<dir>/<owner>/<repo>/<sha>` together with a manifest of
+    the files it covers and its lexical index (see utils.lexical), and only loaded back
+    into memory when a request asks for it.
+    Loaded indexes are kept in an LRU that drops the least recently used ones once
+    their estimated size passes `memory_bytes`; they stay on disk and reload on the
+    next use. Nothing else keeps a reference to them between searches (see `indexes`),
+    so dropping one here frees it.
+    """
+
+    def __init__(self, directory, memory_bytes):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self._loaded = OrderedDict()
+        self._lexical = {}
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_loads': 0, 'builds': 0, 'evictions': 0}
+
+    def path(self, owner, repo, sha):
+        return os.path.join(self.directory, owner, repo, sha)
+
+    def exists(self, owner, repo, sha):
+        return os.path.exists(os.path.join(self.path(owner, repo, sha), 'index.faiss'))
+
+    def get(self, owner, repo, sha, embeddings):
+        """Returns the index for the commit, loading it from disk if needed, or None if it was never built."""
+        key = (owner, repo, sha)
+        with self._lock:
+            vectorstore = self._loaded.get(key)
+            if vectorstore is not None:
+                self._loaded.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return vectorstore
+
+        if not self.exists(owner, repo, sha):
+            return None
+
+        vectorstore = self.load(owner, repo, sha, embeddings)
+        with self._lock:
+            self.stats['disk_loads'] += 1
+            self._remember(key, vectorstore)
+        return vectorstore
+
+    def load(self, owner, repo, sha, embeddings):
+        """Reads a fresh, uncached copy of a stored index, e.g. to derive a newer commit's index from it."""
+        from langchain.vectorstores import FAISS
+        # The pickle next to the index was written by `put`, so it is trusted
+        return FAISS.load_local(self.path(owner, repo, sha), embeddings,
+                                allow_dangerous_deserialization=True)
+
+    def load_manifest(self, owner, repo, sha):
+        """Returns the {path: {'sha', 'ids'}} manifest saved with an index, or None."""
+        try:
+            with open(os.path.join(self.path(owner, repo, sha), 'manifest.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_lexical(self, owner, repo, sha):
+        """Reads a fresh copy of the lexical index saved with an index, or None."""
+        return LexicalIndex.load(os.path.join(self.path(owner, repo, sha), LEXICAL_FILE))
+
+    def lexical(self, owner, repo, sha, vectorstore):
+        """
+        The lexical index of a loaded commit index. Indexes saved before lexical indexes
+        existed get one built from their stored chunks, which is saved for next time.
+        """
+        key = (owner, repo, sha)
+        with self._lock:
+            lexical = self._lexical.get(key)
+        if lexical is not None:
+            return lexical
+
+        lexical = self.load_lexical(owner, repo, sha)
+        if lexical is None:
+            lexical = LexicalIndex.from_vectorstore(vectorstore)
+            try:
+                lexical.save(os.path.join(self.path(owner, repo, sha), LEXICAL_FILE))
+            except OSError:
+                pass
+        with self._lock:
+            if key in self._loaded and key not in self._lexical:
+                self._lexical[key] = lexical
+                self._sizes[key] += lexical.estimated_bytes()
+            return self._lexical.get(key, lexical)
+
+    def indexes(self, owner, repo, sha, embeddings):
+        """
+        (vectorstore, lexical index) of a stored commit index, reloaded from disk if it
+        was evicted. Retrievers call this per search instead of holding the indexes.
+        """
+        vectorstore = self.get(owner, repo, sha, embeddings)
+        if vectorstore is None:
+            raise ValueError(f"No stored index for {owner}/{repo} at {sha}")
+        return vectorstore, self.lexical(owner, repo, sha, vectorstore)
+
+    def latest_sha(self, owner, repo):
+        """The commit whose index was stored most recently for the repository, if any."""
+        repo_dir = os.path.join(self.directory, owner, repo)
+        try:
+            shas = [sha for sha in os.listdir(repo_dir)
+                    if '.tmp-' not in sha and self.exists(owner, repo, sha)]
+        except OSError:
+            return None
+        if not shas:
+            return None
+        return max(shas, key=lambda sha: os.path.getmtime(self.path(owner, repo, sha)))
+
+    def recent(self, limit):
+        """(owner, repo, sha) of the `limit` repositories indexed most recently, newest first, each at its latest index."""
+        found = []
+        try:
+            owners = os.listdir(self.directory)
+        except OSError:
+            return []
+        for owner in owners:
+            try:
+                repos = os.listdir(os.path.join(self.directory, owner))
+            except OSError:
+                continue
+            for repo in repos:
+                sha = self.latest_sha(owner, repo)
+                if sha:
+                    found.append((os.path.getmtime(self.path(owner, repo, sha)), owner, repo, sha))
+        found.sort(reverse=True)
+        return [(owner, repo, sha) for _, owner, repo, sha in found[:limit]]
+
+    def loaded_bytes(self):
+        """Estimated size of the indexes held in memory."""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def put(self, owner, repo, sha, vectorstore, manifest=None, lexical=None):
+        path = self.path(owner, repo, sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique across threads and worker processes building the same commit
+        tmp_path = tempfile.mkdtemp(prefix=f"{sha}.tmp-", dir=os.path.dirname(path))
+        try:
+            vectorstore.save_local(tmp_path)
+            if manifest is not None:
+                with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+                    json.dump(manifest, f)
+            if lexical is not None:
+                lexical.save(os.path.join(tmp_path, LEXICAL_FILE))
+            # An index names one commit's content, so one stored by another worker meanwhile is
+            # kept: replacing it could pull it from under a process loading it
+            if not os.path.exists(path):
+                os.rename(tmp_path, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        with self._lock:
+            self._remember((owner, repo, sha), vectorstore, lexical)
+
+    def get_or_build(self, owner, repo, sha, embeddings, build):
+        """
+        Returns the stored index for the commit, or calls `build()` to create it.
+        `build` returns (vectorstore, manifest, lexical index); all are persisted.
+        """
+        vectorstore = self.get(owner, repo, sha, embeddings)
+        if vectorstore is None:
+            vectorstore, manifest, lexical = build()
+            self.put(owner, repo, sha, vectorstore, manifest, lexical)
+            with self._lock:
+                self.stats['builds'] += 1
+        return vectorstore
+
+    def _remember(self, key, vectorstore, lexical=None):
+        if key in self._loaded:
+            self._loaded.move_to_end(key)
+            return
+        self._loaded[key] = vectorstore
+        self._sizes[key] = estimate_index_bytes(vectorstore)
+        if lexical is not None:
+            self._lexical[key] = lexical
+            self._sizes[key] += lexical.estimated_bytes()
+        # Always keep the newest index loaded, even if it alone exceeds the budget
+        while len(self._loaded) > 1 and sum(self._sizes.values()) > self.memory_bytes:
+            evicted, _ = self._loaded.popitem(last=False)
+            del self._sizes[evicted]
+            self._lexical.pop(evicted, None)
+            self.stats['evictions'] += 1
+
+
+index_registry = IndexRegistry(INDEX_STORE_DIR, INDEX_STORE_MEMORY_MB * 1024 * 1024)
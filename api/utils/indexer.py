@@ -0,0 +1,261 @@
+import gc
+import os
+import resource
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.schema import Document
+
+from utils.chunker import CHUNK_POOL_BATCH, CHUNKER_VERSION, chunk_batch, chunk_processes, chunk_text, get_pool
+from utils.index_store import index_registry
+from utils.lexical import LexicalIndex
+from utils.metrics import observe_stage, stage_timer
+from utils.sources import get_source
+
+
+valid_extensions = {".py", ".js", ".ts", ".java", ".cpp", ".c", ".cs", ".go", ".rs", ".php",
+                    ".html", ".css", ".json", ".xml", ".yaml", ".yml", ".md", ".txt", ".gitignore", ".dockerignore"}
+important_files = {"Dockerfile", "Makefile", "README", "LICENSE"}
+
+# Files larger than this are left out of the index
+INGEST_MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", str(512 * 1024)))
+# Blob fetches running ahead of the decode/chunk/embed stages
+INGEST_FETCH_CONCURRENCY = int(os.getenv("INGEST_FETCH_CONCURRENCY", "8"))
+INGEST_PREFETCH = int(os.getenv("INGEST_PREFETCH", "32"))
+# Chunks embedded and added to the index per batch
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+# Once the process grows past this, batches are flushed early to hold memory down
+INGEST_MAX_RSS_MB = int(os.getenv("INGEST_MAX_RSS_MB", "1024"))
+
+# Files left out of builds because their blob could not be fetched
+INGEST_STATS = {
+    'fetch_errors': 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        INGEST_STATS[name] += 1
+
+
+def is_relevant(file_name):
+    return (
+        any(file_name.endswith(ext) for ext in valid_extensions) or
+        any(file_name == name or file_name.startswith(name) for name in important_files)
+    )
+
+
+def is_binary(data):
+    return b"\0" in data[:8192]
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current RSS, but a safe upper bound; ru_maxrss is KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def list_relevant_files(source, ref, path=""):
+    """Maps the path of every indexable file at `ref` to its tree entry ('sha', 'size')."""
+    prefix = f"{path.strip('/')}/" if path.strip('/') else ''
+    return {
+        entry['path']: entry
+        for entry in source.entries(ref)
+        if entry['type'] == 'blob' and entry['path'].startswith(prefix)
+        and is_relevant(entry['path'].rsplit('/', 1)[-1])
+        and (entry.get('size') or 0) <= INGEST_MAX_FILE_BYTES
+    }
+
+
+def _prefetch(items, fetch, window):
+    """
+    Yields (item, fetch(item)) in order while up to `window` fetches run ahead.
+    The window is the backpressure: nothing more is fetched until the consumer catches up.
+    """
+    with ThreadPoolExecutor(max_workers=INGEST_FETCH_CONCURRENCY) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(fetch, item)))
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+def iter_documents(source, files, progress=None):
+    """
+    Reads {path: entry} files from the repository source, yielding text files as documents.
+    A file whose blob cannot be fetched is counted and skipped rather than failing the
+    build; it stays out of the manifest, so the next commit's build fetches it again.
+    """
+    def fetch(item):
+        try:
+            return source.blob(item[1]['sha'])
+        except Exception:
+            _count('fetch_errors')
+            return None
+
+    fetched = _prefetch(files.items(), fetch, INGEST_PREFETCH)
+    for count, ((path, entry), data) in enumerate(fetched, 1):
+        if progress:
+            progress('fetching', count, len(files), files_fetched=count)
+        if data is None or len(data) > INGEST_MAX_FILE_BYTES or is_binary(data):
+            continue
+        with stage_timer('decode'):
+            content = data.decode("utf-8", errors="ignore")
+        if content:
+            yield Document(
+                page_content=content,
+                metadata={"path": path, "file_name": path.rsplit('/', 1)[-1], "sha": entry['sha']}
+            )
+
+
+def _split_documents(docs, processes):
+    """Yields (doc, chunk_text result) in order, splitting in `processes` worker processes when given."""
+    if not processes:
+        for doc in docs:
+            with stage_timer('split'):
+                pieces = chunk_text(doc.metadata["path"], doc.page_content)
+            yield doc, pieces
+        return
+
+    def batches():
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) == CHUNK_POOL_BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def results(batch, future):
+        for doc, (pieces, seconds) in zip(batch, future.result()):
+            observe_stage('split', seconds)
+            yield doc, pieces
+
+    pool = get_pool()
+    pending = deque()
+    for batch in batches():
+        pending.append((batch, pool.submit(chunk_batch, [(doc.metadata["path"], doc.page_content) for doc in batch])))
+        # Two batches per worker in flight keeps them busy without reading far ahead of the embedder
+        if len(pending) >= processes * 2:
+            yield from results(*pending.popleft())
+    while pending:
+        yield from results(*pending.popleft())
+
+
+def iter_chunks(docs, processes=0):
+    """
+    Splits each document into chunks along its language's blocks (see utils.chunker),
+    with stable ids (`<path>#<n>`), so a file's vectors can be found and replaced when
+    it changes. Chunks carry the file's metadata plus their 'start_line', 'end_line'
+    and 'symbol'. Yields (path, sha, chunks, ids).
+
+    With `processes`, files are split in that many worker processes while documents
+    keep streaming in.
+    """
+    for doc, pieces in _split_documents(docs, processes):
+        path = doc.metadata["path"]
+        chunks = [
+            Document(page_content=text, metadata=dict(doc.metadata, start_line=start, end_line=end, symbol=symbol))
+            for text, start, end, symbol in pieces
+        ]
+        yield path, doc.metadata["sha"], chunks, [f"{path}#{n}" for n in range(len(chunks))]
+
+
+def add_chunks(vectorstore, chunk_stream, embeddings, manifest, progress=None, lexical=None):
+    """
+    Embeds the chunk stream in batches of INGEST_BATCH_CHUNKS and adds each batch to
+    `vectorstore` (created from the first batch when None). Chunks also go into the
+    `lexical` index, if given, as they arrive. Files are recorded in `manifest` once
+    their chunks are queued. Returns the vectorstore.
+    """
+    from langchain.vectorstores import FAISS
+
+    batch, batch_ids = [], []
+    embedded = [0]
+
+    def flush(vectorstore):
+        if not batch:
+            return vectorstore
+        if vectorstore is None:
+            vectorstore = FAISS.from_documents(batch, embeddings, ids=batch_ids)
+        else:
+            vectorstore.add_documents(batch, ids=batch_ids)
+        embedded[0] += len(batch)
+        if progress:
+            progress('embedding', chunks_embedded=embedded[0])
+        batch.clear()
+        batch_ids.clear()
+        return vectorstore
+
+    max_rss = INGEST_MAX_RSS_MB * 1024 * 1024
+    for path, sha, chunks, ids in chunk_stream:
+        if lexical is not None:
+            with stage_timer('lexical_index'):
+                for chunk_id, chunk in zip(ids, chunks):
+                    lexical.add(chunk_id, chunk.page_content, path)
+        batch.extend(chunks)
+        batch_ids.extend(ids)
+        manifest[path] = {'sha': sha, 'ids': ids, 'chunker': CHUNKER_VERSION}
+        if len(batch) >= INGEST_BATCH_CHUNKS:
+            vectorstore = flush(vectorstore)
+        elif current_rss() > max_rss:
+            vectorstore = flush(vectorstore)
+            gc.collect()
+    return flush(vectorstore)
+
+
+def build_index(owner, repo, sha, embeddings, token=None, progress=None):
+    """
+    Builds the FAISS and lexical indexes for commit `sha`, read from the configured
+    repository source, and returns (vectorstore, manifest, lexical index).
+
+    The manifest maps each indexed path to its blob SHA and chunk ids. When an older
+    commit of the same repository is already on disk, its index is copied and only
+    the difference is applied: chunks of removed or modified files are deleted, and
+    added or modified files are fetched, split and embedded. Otherwise the whole
+    repository is indexed. Either way files stream through fetch, decode, chunk and
+    embed, so only a bounded window of them is held in memory at once.
+
+    `progress`, if given, is called as progress(stage, done, total, **counters).
+    """
+    if progress:
+        progress('listing')
+    source = get_source(owner, repo, token)
+    files = list_relevant_files(source, sha)
+    base_sha = index_registry.latest_sha(owner, repo)
+    base_manifest = index_registry.load_manifest(owner, repo, base_sha) if base_sha else None
+
+    if base_manifest is None:
+        vectorstore, manifest, lexical = None, {}, LexicalIndex()
+    else:
+        # Load private copies so the base commit's cached indexes are left untouched
+        vectorstore = index_registry.load(owner, repo, base_sha, embeddings)
+        manifest = dict(base_manifest)
+        lexical = index_registry.load_lexical(owner, repo, base_sha) or LexicalIndex.from_vectorstore(vectorstore)
+
+        # Files chunked by an older chunker are rebuilt as if they had changed
+        stale = [path for path, entry in base_manifest.items()
+                 if path not in files or files[path]['sha'] != entry['sha'] or entry.get('chunker') != CHUNKER_VERSION]
+        stale_ids = [chunk_id for path in stale for chunk_id in manifest.pop(path)['ids']]
+        if stale_ids:
+            vectorstore.delete(stale_ids)
+            lexical.remove(stale_ids)
+
+    changed = {path: entry for path, entry in files.items() if path not in manifest}
+    chunk_stream = iter_chunks(iter_documents(source, changed, progress), chunk_processes(len(changed)))
+    vectorstore = add_chunks(vectorstore, chunk_stream, embeddings, manifest, progress, lexical)
+
+    if vectorstore is None or not manifest:
+        raise ValueError("No documents found in repository or repository is private/doesn't exist")
+    return vectorstore, manifest, lexical
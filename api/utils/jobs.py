@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Background jobs allowed to run at once; the rest wait in the queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# How long finished jobs (and their results) are kept around for polling
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Jobs allowed to wait for a worker; further submissions are rejected
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "32"))
+
+
+class JobRejected(RuntimeError):
+    """Raised by JobManager.submit when the queue is full (status 429) or the manager is draining (503)."""
+
+    def __init__(self, message, status=429):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """
+    One background task. The task reports progress through the job, which it receives
+    as a callable: `job(stage, done=None, total=None, **counters)`. `done`/`total` drive
+    the percentage and keep their last value when omitted; counters such as
+    files_fetched or chunks_embedded are reported as-is.
+    """
+
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.done = None
+        self.total = None
+        self.counters = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def __call__(self, stage, done=None, total=None, **counters):
+        with self._lock:
+            self.stage = stage
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            self.counters.update(counters)
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        with self._lock:
+            percent = None
+            if self.status == 'done':
+                percent = 100
+            elif self.total:
+                percent = int(100 * (self.done or 0) / self.total)
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stage': self.stage,
+                'done': self.done,
+                'total': self.total,
+                'percent': percent,
+                'counters': dict(self.counters),
+                'error': self.error,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+            }
+
+
+class JobManager:
+    """
+    In-process job queue backed by a thread pool.
+
+    Submissions with the same key (e.g. operation, owner, repo and commit) coalesce:
+    while a job for the key is queued or running, the existing job is returned instead
+    of starting another one. A job that finished successfully is returned only if the
+    submitter's `reuse(job)` says its result still holds. Finished jobs are forgotten
+    after `retention` seconds.
+
+    At most `queue_limit` jobs wait for a worker; new jobs beyond that, and any new
+    job once `drain` has been called, raise JobRejected.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, retention=JOB_RETENTION_SECONDS, queue_limit=JOB_QUEUE_LIMIT):
+        self.retention = retention
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._by_key = {}
+        self._queued = 0
+        self._unfinished = 0
+        self._draining = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.stats = {'submitted': 0, 'coalesced': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, kind, key, fn, *args, reuse=None, **kwargs):
+        """
+        Queues `fn(*args, progress=job, **kwargs)` unless an unfinished job for `key`
+        exists, or a finished one that `reuse(job)` accepts; returns the job.
+        """
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(self._by_key.get(key))
+            if job is not None and (not job.finished or (job.status == 'done' and reuse and reuse(job))):
+                self.stats['coalesced'] += 1
+                return job
+            if self._draining:
+                self.stats['rejected'] += 1
+                raise JobRejected("The server is shutting down; try again shortly", status=503)
+            if self._queued >= self.queue_limit:
+                self.stats['rejected'] += 1
+                raise JobRejected("Too many jobs waiting; try again shortly")
+
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self._queued += 1
+            self._unfinished += 1
+            self.stats['submitted'] += 1
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+        job.status = 'running'
+        job('running')
+        try:
+            job.result = fn(*args, progress=job, **kwargs)
+            job.status = 'done'
+            job('done')
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            job('failed')
+            with self._lock:
+                self.stats['failed'] += 1
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._unfinished -= 1
+                self._idle.notify_all()
+
+    def _expire(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) == job_id:
+                    del self._by_key[job.key]
+
+    def pending(self):
+        """(queued, running) job counts."""
+        with self._lock:
+            return self._queued, self._unfinished - self._queued
+
+    def drain(self, timeout=None):
+        """
+        Stops accepting new jobs and waits up to `timeout` seconds (forever if None) for
+        the queued and running ones to finish. Returns whether they all did.
+        """
+        with self._lock:
+            self._draining = True
+            return self._idle.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+job_manager = JobManager()
@@ -0,0 +1,307 @@
+import json
+import math
+import os
+import re
+import threading
+
+from utils.imports import extract_imports
+
+
+# BM25 term frequency saturation and length normalisation
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Added to the score of chunks that define (or import) a symbol named in the query
+LEXICAL_SYMBOL_BOOST = float(os.getenv("LEXICAL_SYMBOL_BOOST", "3.0"))
+
+LEXICAL_INDEX_VERSION = 1
+
+_WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+# Pieces of snake_case and camelCase identifiers: HTTPServer -> HTTP, Server
+_PARTS = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it its of on or the this to was what when where "
+    "which who why with you your".split()
+)
+
+# Definitions per language, matched at line starts the same way as utils.imports
+_PYTHON = re.compile(r'\n[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]+(\w+)')
+_JS = re.compile(r'\n[ \t]*(?:export[ \t]+)?(?:default[ \t]+)?(?:declare[ \t]+)?(?:async[ \t]+)?'
+                 r'(?:function\*?|class|const|let|var|interface|type|enum)[ \t]+(\w+)')
+_GO = re.compile(r'\n(?:func[ \t]+(?:\([^)\n]*\)[ \t]*)?|type[ \t]+)(\w+)')
+_RUST = re.compile(r'\n[ \t]*(?:pub(?:\([^)\n]*\))?[ \t]+)?(?:async[ \t]+)?(?:unsafe[ \t]+)?'
+                   r'(?:fn|struct|enum|trait|mod|type|const|static|macro_rules!)[ \t]+(\w+)')
+_JVM_MODIFIERS = r'(?:(?:public|private|protected|internal|static|final|abstract|sealed|open|data|override|async|virtual|partial|synchronized)[ \t]+)*'
+_JAVA = re.compile(r'\n[ \t]*' + _JVM_MODIFIERS + r'(?:(?:class|interface|enum|record|struct)[ \t]+(\w+)'
+                   r'|[\w<>\[\],.? ]+?[ \t]+(\w+)[ \t]*\([^;\n]*\)[ \t]*(?:throws[ \t][\w., ]+)?\{)')
+_KOTLIN = re.compile(r'\n[ \t]*' + _JVM_MODIFIERS + r'(?:fun[ \t]+(?:<[^>\n]*>[ \t]*)?(?:\w+\.)?|class[ \t]+|object[ \t]+'
+                     r'|interface[ \t]+|val[ \t]+|var[ \t]+)(\w+)')
+_C = re.compile(r'\n(?:(?:struct|class|enum|union|namespace)[ \t]+(\w+)|#[ \t]*define[ \t]+(\w+)'
+                r'|[A-Za-z_][\w \t*&:<>,]*?[ \t*&](\w+)[ \t]*\([^;{}]*\)[ \t]*(?:const[ \t]*)?\{)')
+_PHP = re.compile(r'\n[ \t]*(?:(?:abstract|final|public|private|protected|static)[ \t]+)*'
+                  r'(?:function|class|interface|trait|enum)[ \t]+&?(\w+)')
+
+_DEFINITIONS = {
+    '.py': _PYTHON,
+    '.js': _JS, '.jsx': _JS, '.mjs': _JS, '.cjs': _JS, '.ts': _JS, '.tsx': _JS,
+    '.go': _GO,
+    '.rs': _RUST,
+    '.java': _JAVA, '.cs': _JAVA,
+    '.kt': _KOTLIN,
+    '.c': _C, '.h': _C, '.cc': _C, '.cpp': _C, '.cxx': _C, '.hh': _C, '.hpp': _C,
+    '.php': _PHP,
+}
+
+
+def terms(text):
+    """
+    Lowercased search terms of `text`: every identifier and number, plus the words of
+    snake_case and camelCase identifiers, so `process_repo_tree` is found both whole
+    and by "repo tree".
+    """
+    found = []
+    for word in _WORD.findall(text):
+        lower = word.lower()
+        if lower in STOPWORDS:
+            continue
+        found.append(lower)
+        if '_' in word or not (word.islower() or word.isupper()):
+            parts = _PARTS.findall(word)
+            if len(parts) > 1:
+                found.extend(part.lower() for part in parts)
+    return found
+
+
+def definition_pattern(path):
+    """The definitions regex for the file's extension, or None. Matches start at the newline before the definition."""
+    dot = path.rfind('.')
+    return _DEFINITIONS.get(path[dot:]) if dot > path.rfind('/') else None
+
+
+def extract_symbols(path, content):
+    """Names defined in `content` (functions, classes, types, constants), by the file's extension."""
+    pattern = definition_pattern(path)
+    if pattern is None:
+        return []
+    return [next(group for group in m.groups() if group) for m in pattern.finditer('\n' + content)]
+
+
+def imported_names(line):
+    """
+    The lowercased names an `extract_imports` line brings in: the last segment of each
+    module path and any names imported from it (`from a.b import c, d` -> b, c, d).
+    """
+    if line.startswith('from '):
+        module, _, names = line[5:].partition(' import ')
+        parts = [module] + names.split(',')
+    elif line.startswith('import '):
+        parts = [line[7:]]
+    else:
+        parts = [line]
+    found = []
+    for part in parts:
+        segments = [segment for segment in re.split(r'\W+', part.split(' as ')[0]) if segment]
+        if segments:
+            found.append(segments[-1].lower())
+    return found
+
+
+# Identifiers a query names explicitly: `quoted`, snake_case, dotted.paths, camelCase or call()
+_QUERY_IDENTIFIER = re.compile(r'`([^`\s]+)`|\b([A-Za-z_]\w*(?:[._]\w+)+|[a-z]+[A-Z]\w*|[A-Za-z_]\w*(?=\())')
+# Dotted names ending in one of these are file names (`utils.py`), not attribute paths (`os.path`)
+FILE_EXTENSIONS = frozenset(
+    "py js jsx mjs cjs ts tsx go rs java cs kt c h cc cpp cxx hh hpp php rb swift scala sh "
+    "html css scss json xml yaml yml toml ini cfg md rst txt lock".split()
+)
+
+
+def is_file_name(name):
+    """Whether a (lowercased) name from `query_identifiers` is a file name, to match against chunk paths."""
+    return name.rpartition('.')[2] in FILE_EXTENSIONS
+
+
+def query_identifiers(query):
+    """
+    Code identifiers named in a question, lowercased and without call parentheses or
+    module paths (`os.path.join` -> join). File names such as `utils.py` are kept whole;
+    single letters, as in "e.g.", are left out.
+    """
+    identifiers = []
+    for m in _QUERY_IDENTIFIER.finditer(query):
+        name = (m[1] or m[2]).rstrip('()').lower()
+        if not is_file_name(name):
+            name = name.rsplit('.', 1)[-1].rsplit('::', 1)[-1]
+        if len(name) > 1 and name not in STOPWORDS:
+            identifiers.append(name)
+    return identifiers
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 index over chunks, plus a symbol table of what each chunk defines
+    and imports.
+
+    Chunks are keyed by the same ids as the FAISS index (`<path>#<n>`) so results can
+    be fused and stale files removed from both. Lookups touch only the postings of the
+    query's terms, so they take microseconds and never leave the process.
+    """
+
+    def __init__(self):
+        self.ids = []          # doc number -> chunk id (None once removed)
+        self.lengths = []      # doc number -> term count
+        self.postings = {}     # term -> {doc number: term frequency}
+        self.symbols = {}      # lowercased symbol -> {doc number: 'def' or 'import'}
+        self.files = {}        # lowercased file name -> {doc number: 1}
+        self._docs = {}        # chunk id -> doc number
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, chunk_id, text, path=''):
+        chunk_terms = terms(text)
+        counts = {}
+        for term in chunk_terms:
+            counts[term] = counts.get(term, 0) + 1
+        symbols = {name.lower(): 'def' for name in extract_symbols(path, text)}
+        for line in extract_imports(path, text):
+            for name in imported_names(line):
+                symbols.setdefault(name, 'import')
+
+        with self._lock:
+            if chunk_id in self._docs:
+                self.remove([chunk_id])
+            doc = len(self.ids)
+            self.ids.append(chunk_id)
+            self.lengths.append(len(chunk_terms))
+            self._docs[chunk_id] = doc
+            self._total_length += len(chunk_terms)
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[doc] = count
+            for name, kind in symbols.items():
+                self.symbols.setdefault(name, {})[doc] = kind
+            self._add_file(doc)
+
+    def _add_file(self, doc):
+        """Files are keyed by the name at the end of the chunk id's path (`<path>#<n>`)."""
+        name = self.ids[doc].rpartition('#')[0].rsplit('/', 1)[-1].lower()
+        if name:
+            self.files.setdefault(name, {})[doc] = 1
+
+    def remove(self, chunk_ids):
+        """Drops chunks, e.g. those of files changed since the index's base commit."""
+        with self._lock:
+            docs = {self._docs.pop(chunk_id) for chunk_id in chunk_ids if chunk_id in self._docs}
+            if not docs:
+                return
+            for doc in docs:
+                self.ids[doc] = None
+                self._total_length -= self.lengths[doc]
+            for table in (self.postings, self.symbols, self.files):
+                for key in list(table):
+                    entries = table[key]
+                    for doc in docs.intersection(entries):
+                        del entries[doc]
+                    if not entries:
+                        del table[key]
+
+    def search(self, query, k=10):
+        """
+        Returns up to `k` (chunk id, score) pairs, best first: BM25 plus a boost for chunks
+        defining a named symbol or coming from a named file.
+        """
+        query_terms = set(terms(query))
+        file_names = [name for name in query_identifiers(query) if is_file_name(name)]
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs or not (query_terms or file_names):
+                return []
+            average_length = self._total_length / n_docs or 1
+            scores = {}
+            for term in query_terms:
+                entries = self.postings.get(term)
+                if not entries:
+                    continue
+                idf = math.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+                for doc, tf in entries.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / average_length)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            for name in query_terms.intersection(self.symbols):
+                for doc, kind in self.symbols[name].items():
+                    boost = LEXICAL_SYMBOL_BOOST if kind == 'def' else LEXICAL_SYMBOL_BOOST / 3
+                    scores[doc] = scores.get(doc, 0.0) + boost
+            for name in file_names:
+                for doc in self._file_docs(name):
+                    scores[doc] = scores.get(doc, 0.0) + LEXICAL_SYMBOL_BOOST
+            best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            return [(self.ids[doc], score) for doc, score in best]
+
+    def _file_docs(self, name):
+        """Chunks of the files called `name`, or, for a name with a directory (`api/app.py`), of the file at that path."""
+        base = name.rsplit('/', 1)[-1]
+        docs = self.files.get(base, {})
+        if base == name:
+            return list(docs)
+        return [doc for doc in docs if ('/' + self.ids[doc].rpartition('#')[0].lower()).endswith('/' + name)]
+
+    def knows(self, term):
+        """
+        Whether any chunk contains or defines `term` (lowercased), or for a file name
+        (`is_file_name`), whether any chunk comes from that file.
+        """
+        with self._lock:
+            if is_file_name(term):
+                return bool(self._file_docs(term))
+            return term in self.postings or term in self.symbols
+
+    def estimated_bytes(self):
+        """Rough resident size, for the index registry's memory budget."""
+        with self._lock:
+            entries = sum(len(entries) for entries in self.postings.values())
+            return entries * 100 + len(self.ids) * 120
+
+    def save(self, path):
+        """Writes the index as JSON, leaving out removed chunks."""
+        with self._lock:
+            live = [doc for doc, chunk_id in enumerate(self.ids) if chunk_id is not None]
+            number = {doc: n for n, doc in enumerate(live)}
+            data = {
+                'version': LEXICAL_INDEX_VERSION,
+                'ids': [self.ids[doc] for doc in live],
+                'lengths': [self.lengths[doc] for doc in live],
+                'postings': {term: [[number[doc], tf] for doc, tf in entries.items()]
+                             for term, entries in self.postings.items()},
+                'symbols': {name: [[number[doc], kind] for doc, kind in entries.items()]
+                            for name, entries in self.symbols.items()},
+            }
+        with open(path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index written by `save`; returns None if there is none or it is from another version."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != LEXICAL_INDEX_VERSION:
+            return None
+        index = cls()
+        index.ids = data['ids']
+        index.lengths = data['lengths']
+        index.postings = {term: dict(entries) for term, entries in data['postings'].items()}
+        index.symbols = {name: dict(entries) for name, entries in data['symbols'].items()}
+        index._docs = {chunk_id: doc for doc, chunk_id in enumerate(index.ids)}
+        index._total_length = sum(index.lengths)
+        for doc in range(len(index.ids)):
+            index._add_file(doc)
+        return index
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """Builds the index from the chunks stored in a FAISS index, for indexes saved without one."""
+        index = cls()
+        for chunk_id, doc in getattr(vectorstore.docstore, '_dict', {}).items():
+            index.add(chunk_id, doc.page_content, doc.metadata.get('path', ''))
+        return index
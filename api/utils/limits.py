@@ -0,0 +1,116 @@
+import functools
+import os
+import threading
+import time
+
+
+# Requests each route group handles at once and how many more may wait for a slot,
+# as "group=concurrency:queue,..."; the rest are turned away with 429
+ROUTE_LIMITS = os.getenv("ROUTE_LIMITS", "tree=4:16,generate=4:16,set-repo=4:16,query=8:32")
+# Longest a queued request waits for a slot before it is turned away
+ROUTE_QUEUE_TIMEOUT = float(os.getenv("ROUTE_QUEUE_TIMEOUT", "30"))
+
+
+class ConcurrencyLimit:
+    """
+    A semaphore with a bounded waiting line. Up to `concurrency` holders run at once
+    and up to `queue` more wait for a slot, for at most `timeout` seconds; anyone
+    beyond that is rejected straight away rather than piling up behind slow calls.
+    """
+
+    def __init__(self, name, concurrency, queue=0, timeout=ROUTE_QUEUE_TIMEOUT):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+        self.stats = {'admitted': 0, 'rejected': 0, 'timed_out': 0}
+
+    def acquire(self):
+        """Takes a slot, waiting in line if there is room; returns False if the request should be rejected."""
+        with self._condition:
+            if self.active >= self.concurrency:
+                if self.waiting >= self.queue:
+                    self.stats['rejected'] += 1
+                    return False
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.active < self.concurrency, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.stats['timed_out'] += 1
+                    return False
+            self.active += 1
+            self.stats['admitted'] += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+
+def parse_limits(spec):
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, numbers = item.partition('=')
+        concurrency, _, queue = numbers.partition(':')
+        limits[name.strip()] = ConcurrencyLimit(name.strip(), int(concurrency), int(queue or 0))
+    return limits
+
+
+route_limits = parse_limits(ROUTE_LIMITS)
+
+
+def rejected(message, status=429, retry_after=1):
+    """A JSON error response asking the client to come back after `retry_after` seconds."""
+    from flask import jsonify
+
+    response = jsonify({"success": False, "error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def limited(group):
+    """
+    Decorates a view so it runs under the route group's ConcurrencyLimit, answering
+    429 when the group is full. Streamed responses hold their slot until the stream
+    is closed. Groups missing from ROUTE_LIMITS are not limited.
+    """
+    def decorator(view):
+        limit = route_limits.get(group)
+        if limit is None:
+            return view
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response
+
+            if not limit.acquire():
+                return rejected(f"Too many {group} requests in progress; try again shortly")
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                limit.release()
+                raise
+            if response.is_streamed:
+                response.call_on_close(limit.release)
+            else:
+                limit.release()
+            return response
+        return wrapper
+    return decorator
+
+
+def wait_idle(timeout):
+    """Waits up to `timeout` seconds for every limited request in flight to finish; returns whether they did."""
+    deadline = time.monotonic() + timeout
+    for limit in route_limits.values():
+        with limit._condition:
+            if not limit._condition.wait_for(lambda: limit.active == 0, max(0, deadline - time.monotonic())):
+                return False
+    return True
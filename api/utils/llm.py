@@ -1,17 +1,27 @@
 import os
-from groq import Groq
+import re
+import time
 
-def get_groq_response(user_message):
-    from os import environ
+from utils.clients import call_upstream, groq_client
+from utils.metrics import observe_stage, stage_timer
+
+# "groq"/"openai" for the real services, or "fake" for the local stand-ins below and in utils.chat
+LLM_BACKEND = os.getenv("LLM_BACKEND", "")
+# Pause between tokens of the fake LLM
+FAKE_TOKEN_DELAY = float(os.getenv("FAKE_TOKEN_DELAY", "0.02"))
+
+README_MODEL = 'llama-3.3-70b-versatile'
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-3.5-turbo")
 
-    api_key = environ.get('GROQ_API_KEY')
-    print("api_key : ",api_key)
 
+def model_name(model):
+    """Name of the model that actually answers, for cache keys: `model`, or "fake" under LLM_BACKEND=fake."""
+    return "fake" if LLM_BACKEND == "fake" else model
 
-    client = Groq(api_key=api_key)
 
+def _readme_messages(user_message):
     # Define the conversation messages
-    messages = [
+    return [
         {
             "role": "system",
             "content": (
@@ -21,15 +31,89 @@ def get_groq_response(user_message):
         {"role": "user", "content": user_message}
     ]
 
+
+def get_groq_response(user_message):
+    if LLM_BACKEND == "fake":
+        return fake_completion(user_message)
+
     # API call to generate a response
-    completion = client.chat.completions.create(
-        model='llama-3.3-70b-versatile',
-        messages=messages,
+    with stage_timer('llm_call'):
+        completion = call_upstream(
+            "groq",
+            groq_client().chat.completions.create,
+            model=README_MODEL,
+            messages=_readme_messages(user_message),
+            temperature=0.7,
+            max_tokens=1024,
+            top_p=1,
+            stream=False,  # Changed to False for simpler handling
+            stop=None
+        )
+
+    return completion.choices[0].message.content
+
+
+def stream_groq_response(user_message):
+    """Same request as get_groq_response, yielding the content tokens as Groq sends them."""
+    if LLM_BACKEND == "fake":
+        yield from fake_token_stream(user_message)
+        return
+
+    # Only opening the stream is retried; tokens already sent cannot be taken back
+    start = time.perf_counter()
+    stream = call_upstream(
+        "groq",
+        groq_client().chat.completions.create,
+        model=README_MODEL,
+        messages=_readme_messages(user_message),
         temperature=0.7,
         max_tokens=1024,
         top_p=1,
-        stream=False,  # Changed to False for simpler handling
+        stream=True,
         stop=None
     )
+    for chunk in stream:
+        token = chunk.choices[0].delta.content if chunk.choices else None
+        if token:
+            yield token
+    observe_stage('llm_call', time.perf_counter() - start)
 
-    return completion.choices[0].message.content
+
+def iter_sections(tokens):
+    """
+    Passes tokens through as ('token', text) and adds a ('section', heading) event
+    each time a Markdown heading line is completed.
+    """
+    line = ''
+    for token in tokens:
+        yield 'token', token
+        line += token
+        *complete, line = line.split('\n')
+        for text in complete:
+            if text.lstrip().startswith('#'):
+                yield 'section', text.strip().lstrip('#').strip()
+    if line.lstrip().startswith('#'):
+        yield 'section', line.strip().lstrip('#').strip()
+
+
+# === Fake LLM ===
+def fake_completion(prompt):
+    """Deterministic Markdown answer used in place of a real completion."""
+    subject = prompt.strip().splitlines()[0][:80] if prompt.strip() else "the repository"
+    return (
+        "# Project\n\n"
+        "## Overview\n"
+        f"This answer was generated offline for: {subject}\n\n"
+        "## Getting Started\n"
+        "Install the dependencies and run the app.\n\n"
+        "## License\n"
+        "See the repository for license details.\n"
+    )
+
+
+def fake_token_stream(prompt, delay=None):
+    """Yields `fake_completion(prompt)` word by word, pausing `delay` seconds between tokens."""
+    delay = FAKE_TOKEN_DELAY if delay is None else delay
+    for token in re.findall(r"\s*\S+|\s+", fake_completion(prompt)):
+        time.sleep(delay)
+        yield token
@@ -0,0 +1,328 @@
+import bisect
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from utils.blob_cache import CACHE_ROOT
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Fraction of requests run under the sampling profiler (0 turns it off)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Time between stack samples of a profiled request
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Where profiles are written, one collapsed-stack file per request (flamegraph.pl / speedscope input)
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(CACHE_ROOT, 'profiles'))
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """A Prometheus histogram, one series per combination of label values."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def totals(self):
+        """{label values: (count, sum)} for every series."""
+        with self._lock:
+            return {key: (sum(values[:-1]), values[-1]) for key, values in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {values[-1]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Histograms recorded in-process plus collectors that read the counters the rest of
+    the app already keeps, rendered together in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        histogram = Histogram(name, help, labels, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def collector(self, fn):
+        """Registers `fn()`, which returns (name, type, help, [(labels dict, value)]) tuples at scrape time."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'octa_http_request_duration_seconds', "Time to produce a response, by route and status.",
+    ('method', 'route', 'status'))
+STAGE_SECONDS = registry.histogram(
+    'octa_stage_duration_seconds', "Time spent per pipeline stage.", ('stage',))
+
+
+def stage_timer(stage):
+    """Context manager timing one run of `stage` (github_fetch, decode, import_parse, split, embed, ...)."""
+    return STAGE_SECONDS.time(stage)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+# === Sampling profiler ===
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a background
+    thread, counting identical stacks. Cheap enough to leave on for a fraction of
+    requests, unlike a tracing profiler.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='stack-sampler')
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        """Saves the samples as collapsed stacks: "outer;inner count" per line."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def init_app(app):
+    """Records request durations, profiles sampled requests and serves GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        g.stack_sampler = None
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            g.stack_sampler = StackSampler(threading.get_ident()).start()
+
+    @app.after_request
+    def _end_request(response):
+        started = g.pop('metrics_started', None)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+        sampler = g.pop('stack_sampler', None)
+        if sampler is not None:
+            # Streamed bodies are produced after this point, so only the handler itself is sampled
+            sampler.stop()
+            name = f"{int(time.time() * 1000)}-{route.strip('/').replace('/', '_') or 'root'}.folded"
+            sampler.write(os.path.join(PROFILE_DIR, name))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# === Collectors over the app's existing counters ===
+def _stats_family(name, help, stats, label='event'):
+    return (name, 'counter', help, [({label: key}, value) for key, value in stats.items()])
+
+
+def _loaded(module, attribute, default):
+    """`module.attribute` if the module has been imported, else `default`: scrapes don't import what routes load lazily."""
+    return getattr(sys.modules[module], attribute) if module in sys.modules else default
+
+
+@registry.collector
+def _collect_caches():
+    from utils.blob_cache import blob_cache
+    from utils.commit_history import commit_history
+    from utils.index_store import index_registry
+    from utils.response_cache import response_cache
+
+    embedding_samples = []
+    for backend, embeddings in list(_loaded('utils.embeddings', '_embeddings', {}).items()):
+        embedding_samples += [({'backend': backend, 'event': key}, value) for key, value in embeddings.stats.items()]
+    return [
+        _stats_family('octa_blob_cache_events_total', "Blob cache lookups by outcome, and evictions.", blob_cache.stats),
+        ('octa_blob_cache_memory_bytes', 'gauge', "Bytes of blobs held in memory.", [({}, blob_cache._memory_size)]),
+        _stats_family('octa_response_cache_events_total', "README and answer cache lookups by outcome.",
+                      response_cache.stats),
+        ('octa_response_cache_hit_ratio', 'gauge', "Share of response cache lookups served from the cache.",
+         [({}, response_cache.hit_ratio())]),
+        ('octa_embedding_cache_events_total', 'counter', "Embedding cache lookups, batches sent and retries.",
+         embedding_samples),
+        _stats_family('octa_index_registry_events_total', "FAISS index loads, builds and evictions.",
+                      index_registry.stats),
+        _stats_family('octa_ingest_events_total', "Files left out of index builds because their blob could not be fetched.",
+                      _loaded('utils.indexer', 'INGEST_STATS', {})),
+        _stats_family('octa_commit_history_events_total', "Commit history queries, syncs and what they fetched.",
+                      commit_history.stats),
+    ]
+
+
+@registry.collector
+def _collect_github():
+    from utils.clients import breaker_status
+    from utils.github import rate_limit_status
+    from utils.sources import _sources
+    from utils.utils import IMPORT_STATS
+
+    clients = rate_limit_status()
+    breakers = breaker_status()
+    archives = Counter()
+    for source in list(_sources.values()):
+        archives.update(getattr(source, 'stats', {}))
+    states = ('closed', 'half_open', 'open')
+    return [
+        # Clients are numbered: labelling them by token would leak it
+        ('octa_github_requests_total', 'counter', "GitHub API requests sent, by client.",
+         [({'client': str(n)}, client['requests']) for n, client in enumerate(clients)]),
+        ('octa_github_not_modified_total', 'counter', "Conditional GitHub requests answered 304 Not Modified.",
+         [({'client': str(n)}, client['not_modified']) for n, client in enumerate(clients)]),
+        ('octa_github_errors_total', 'counter', "GitHub responses other than 200 and 304.",
+         [({'client': str(n)}, client['errors']) for n, client in enumerate(clients)]),
+        ('octa_github_rate_limit_remaining', 'gauge', "Requests left in the current rate limit window.",
+         [({'client': str(n)}, client['remaining']) for n, client in enumerate(clients)]),
+        ('octa_github_rate_limit_waiting', 'gauge', "Requests held back by the rate limiter.",
+         [({'client': str(n)}, client['waiting']) for n, client in enumerate(clients)]),
+        _stats_family('octa_tarball_total', "Repository archives downloaded, and their bytes.", archives, 'kind'),
+        _stats_family('octa_import_extraction_total', "Files fetched and imports found while building trees.",
+                      IMPORT_STATS, 'kind'),
+        ('octa_upstream_breaker_state', 'gauge', "Circuit breaker state per upstream (1 for the current state).",
+         [({'upstream': breaker['name'], 'state': state}, int(breaker['state'] == state))
+          for breaker in breakers for state in states]),
+        ('octa_upstream_calls_total', 'counter', "Calls through each upstream's circuit breaker, by outcome.",
+         [({'upstream': breaker['name'], 'outcome': key}, breaker[key])
+          for breaker in breakers for key in ('successes', 'failures', 'rejected', 'opened')]),
+    ]
+
+
+@registry.collector
+def _collect_work():
+    from utils.jobs import job_manager
+    from utils.limits import route_limits
+    from utils.sessions import session_manager
+    from utils.singleflight import repo_flight
+
+    limits = list(route_limits.values())
+    queued, running = job_manager.pending()
+    return [
+        _stats_family('octa_singleflight_calls_total', "Shared repository operations and how many were deduplicated.",
+                      repo_flight.stats),
+        _stats_family('octa_jobs_total', "Background jobs submitted, coalesced, rejected and failed.", job_manager.stats),
+        ('octa_jobs_pending', 'gauge', "Background jobs waiting for a worker or running.",
+         [({'state': 'queued'}, queued), ({'state': 'running'}, running)]),
+        ('octa_route_requests_total', 'counter', "Requests admitted to, rejected by or timed out waiting for a route group.",
+         [({'group': limit.name, 'outcome': key}, value) for limit in limits for key, value in limit.stats.items()]),
+        ('octa_route_in_flight', 'gauge', "Requests running in each route group.",
+         [({'group': limit.name}, limit.active) for limit in limits]),
+        ('octa_route_waiting', 'gauge', "Requests waiting for a slot in each route group.",
+         [({'group': limit.name}, limit.waiting) for limit in limits]),
+        _stats_family('octa_sessions_total', "Chat sessions created and evicted, and repository contexts built.",
+                      session_manager.stats),
+        ('octa_sessions_active', 'gauge', "Chat sessions currently held.", [({}, session_manager.active())]),
+        _stats_family('octa_retrievals_total', "Repository searches answered by the lexical index alone or fused with FAISS.",
+                      _loaded('utils.retrieval', 'RETRIEVAL_STATS', {}), 'mode'),
+    ]
+
+
+@registry.collector
+def _collect_startup():
+    from utils.startup import import_seconds, warm_up_stats
+
+    return [
+        ('octa_import_seconds', 'gauge', "How long the first import of the app, each blueprint and each preloaded module took.",
+         [({'module': name}, seconds) for name, seconds in sorted(import_seconds.items())]),
+        ('octa_warm_up_seconds', 'gauge', "How long the warm-up before serving took.", [({}, warm_up_stats['seconds'])]),
+        ('octa_warm_up_indexes', 'gauge', "Repository indexes preloaded by the warm-up.", [({}, warm_up_stats['indexes'])]),
+    ]
@@ -0,0 +1,205 @@
+import os
+import re
+from collections import Counter
+
+from utils.tree import Folder, render_tree
+from utils.utils import FILE_TYPES, file_type_of
+
+
+# Token budget for the repository structure section of the README prompt
+PROMPT_TREE_TOKEN_BUDGET = int(os.getenv("PROMPT_TREE_TOKEN_BUDGET", "6000"))
+
+# Compaction levels tried in order until the text fits: (max depth, files per folder, imports listed)
+COMPACTION_LEVELS = [
+    (8, 40, 150),
+    (6, 25, 100),
+    (4, 15, 75),
+    (3, 10, 50),
+    (2, 6, 40),
+    (1, 4, 30),
+    (0, 0, 20),
+]
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Counts tokens with tiktoken's cl100k_base, or estimates 4 characters per token without it."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # The encoding is downloaded on first use, which fails offline
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def import_package(line):
+    """
+    Reduces one extracted import line to the package it comes from, e.g.
+    `from flask import Flask` -> `flask`, `@mui/material/Button` -> `@mui/material`,
+    `std::io` -> `std`. Relative imports return None since they say nothing about the stack.
+    """
+    line = line.strip().strip('\'"')
+    match = re.match(r'(?:import|from)\s+([\w.]+)', line)
+    if match:
+        line = match.group(1)
+    if not line or line.startswith('.'):
+        return None
+    if '::' in line:
+        return line.split('::')[0]
+    if '/' in line:
+        parts = line.split('/')
+        if line.startswith('@'):
+            return '/'.join(parts[:2])
+        # Go style module paths: keep host/owner/repo
+        return '/'.join(parts[:3]) if '.' in parts[0] else parts[0]
+    parts = line.split('.')
+    return '.'.join(parts[:2]) if len(parts) > 2 else parts[0]
+
+
+def rank_imports(imports):
+    """Packages ordered by how many files import them (ties broken by name)."""
+    counts = Counter()
+    for lines in imports.values():
+        if lines:
+            counts.update({pkg for pkg in map(import_package, lines.split('\n')) if pkg})
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def fits(text, budget):
+    # Every token covers at least one character and rarely more than ten,
+    # so most texts are decided without running the tokenizer
+    if len(text) <= budget:
+        return True
+    if len(text) > budget * 10:
+        return False
+    return count_tokens(text) <= budget
+
+
+def _summary(node, memo):
+    key = id(node)
+    if key not in memo:
+        files = dirs = 0
+        for child in node.children:
+            if isinstance(child, Folder):
+                sub_files, sub_dirs = _summary(child, memo)
+                files += sub_files
+                dirs += sub_dirs + 1
+            else:
+                files += 1
+        memo[key] = (files, dirs)
+    return memo[key]
+
+
+def _layout(node):
+    """Signature used to spot sibling folders that repeat the same layout."""
+    extensions = sorted(os.path.splitext(child.name)[1] for child in node.children if not isinstance(child, Folder))
+    folders = sum(1 for child in node.children if isinstance(child, Folder))
+    return tuple(extensions), folders
+
+
+def render_compact_tree(node, repo, max_depth, max_files, depth=0, memo=None):
+    """
+    Renders the tree like `render_tree` without import listings, folding folders below
+    `max_depth` into "(N files, M folders)" summaries, listing at most `max_files` files
+    per folder, and collapsing sibling folders that repeat an earlier sibling's layout.
+    """
+    memo = {} if memo is None else memo
+    indent = '  ' * depth
+    lines = [f"{indent}{node.path if node.path else repo}:"]
+    file_counts = {key: 0 for key in FILE_TYPES}
+    body = []
+    shown = hidden = 0
+    layouts = {}
+
+    for child in node.children:
+        if isinstance(child, Folder):
+            files, dirs = _summary(child, memo)
+            layout = _layout(child)
+            if depth + 1 > max_depth:
+                body.append(f"{indent}  {child.path}/ ({files} files, {dirs} folders)")
+            elif layout in layouts and layout[0]:
+                body.append(f"{indent}  {child.path}/ ({files} files, same layout as {layouts[layout]})")
+            else:
+                layouts.setdefault(layout, child.path)
+                body.append(render_compact_tree(child, repo, max_depth, max_files, depth + 1, memo).rstrip('\n'))
+            continue
+
+        file_type = file_type_of(child.name)
+        file_counts[file_type or "Others"] += 1
+        if file_type == "Images":
+            continue
+        if shown < max_files:
+            body.append(f"{indent}  {child.name}")
+            shown += 1
+        else:
+            hidden += 1
+
+    for file_type, count in file_counts.items():
+        if count > 0:
+            lines.append(f"{indent}  ({count} {file_type.lower()} files detected)")
+    if hidden:
+        body.append(f"{indent}  ... ({hidden} more files)")
+    return '\n'.join(lines + body) + '\n'
+
+
+def compact_repo_tree(root, repo, imports, budget=PROMPT_TREE_TOKEN_BUDGET):
+    """
+    Returns the repository structure text for the README prompt within `budget` tokens.
+
+    The full `render_tree` output is used as-is when it fits. Otherwise the tree is
+    rendered at successively tighter COMPACTION_LEVELS, followed by the imported
+    packages ranked by how many files use them, until the result fits. Deterministic
+    for a given tree.
+    """
+    full = render_tree(root, repo, imports)
+    if fits(full, budget):
+        return full
+
+    ranked = rank_imports(imports)
+    memo = {}
+    text = full
+    for max_depth, max_files, max_imports in COMPACTION_LEVELS:
+        text = render_compact_tree(root, repo, max_depth, max_files, memo=memo)
+        if ranked:
+            listed = '\n'.join(f"  {pkg} ({count} files)" for pkg, count in ranked[:max_imports])
+            text += f"\nMost used imports (by number of files):\n{listed}\n"
+            if len(ranked) > max_imports:
+                text += f"  ... ({len(ranked) - max_imports} more packages)\n"
+        if fits(text, budget):
+            return text
+
+    # Still too large (e.g. thousands of top-level files): cut at the budget
+    return truncate_lines(text, budget)
+
+
+def truncate_lines(text, budget, marker="... (truncated)\n"):
+    """
+    The longest run of whole leading lines of `text` that fits `budget` tokens together
+    with `marker`, found by binary search on the number of lines. Only a first line too
+    long to fit on its own is cut mid-line.
+    """
+    lines = text.splitlines(keepends=True)
+    low, high = 0, len(lines)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(''.join(lines[:middle]) + marker, budget):
+            low = middle
+        else:
+            high = middle - 1
+    if low:
+        return ''.join(lines[:low]) + marker
+    low, high = 0, len(lines[0]) if lines else 0
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(lines[0][:middle] + '\n' + marker, budget):
+            low = middle
+        else:
+            high = middle - 1
+    return lines[0][:low] + '\n' + marker if low else ''
+
@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+# Responses kept, and for how long; the commit SHA in the key already covers new pushes
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+# Cosine similarity above which a differently worded query reuses a cached answer (0 disables)
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+
+def normalize_text(text):
+    """Lowercases, collapses whitespace and drops trailing punctuation, so trivial rewordings share a key."""
+    return re.sub(r"\s+", " ", (text or "").lower()).strip().rstrip("?!. ")
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'scope', 'vector')
+
+    def __init__(self, value, expires_at, scope, vector):
+        self.value = value
+        self.expires_at = expires_at
+        self.scope = scope
+        self.vector = vector
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache for generated responses.
+
+    Keys are tuples of (scope..., normalized text) where the scope pins everything
+    else the answer depends on: operation, owner, repo, commit SHA, model and prompt
+    template version. Entries stored with a unit-length embedding of their text can
+    also be matched by a near-duplicate query in the same scope.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, threshold=RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key, vector=None):
+        """
+        Cached value for `key`. Failing an exact match, and when `vector` is given, the
+        closest entry in the same scope at least `threshold` similar is returned instead.
+        """
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry.value
+            if self.threshold and vector is not None:
+                import numpy as np
+
+                similar = self._similar(key[:-1], np.asarray(vector, dtype=np.float32))
+                if similar is not None:
+                    self._entries.move_to_end(similar)
+                    self.stats['semantic_hits'] += 1
+                    return self._entries[similar].value
+            self.stats['misses'] += 1
+            return None
+
+    def _similar(self, scope, query):
+        import numpy as np
+
+        best_key, best_score = None, self.threshold
+        for key in list(self._entries):
+            entry = self._live(key)
+            if entry is None or entry.scope != scope or entry.vector is None:
+                continue
+            score = float(np.dot(entry.vector, query))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def put(self, key, value, vector=None):
+        if vector is not None:
+            import numpy as np
+
+            vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = _Entry(value, time.time() + self.ttl, key[:-1], vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def hit_ratio(self):
+        with self._lock:
+            hits = self.stats['hits'] + self.stats['semantic_hits']
+            total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.time():
+            del self._entries[key]
+            self.stats['expired'] += 1
+            return None
+        return entry
+
+
+response_cache = ResponseCache()
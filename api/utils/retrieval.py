@@ -0,0 +1,107 @@
+import os
+import threading
+from typing import Any, List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.lexical import query_identifiers
+from utils.metrics import stage_timer
+
+
+# Chunks handed to the QA chain (the LangChain retriever default)
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# Candidates taken from each of the lexical and vector rankings before fusing
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+# Reciprocal rank fusion constant: higher values flatten the advantage of top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Answer identifier lookups from the lexical index alone, without embedding the query
+LEXICAL_SHORTCUT = os.getenv("LEXICAL_SHORTCUT", "1") == "1"
+
+# How queries were answered
+RETRIEVAL_STATS = {
+    'lexical_only': 0,
+    'hybrid': 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        RETRIEVAL_STATS[name] += 1
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Merges ranked id lists: each id scores sum(1 / (k + rank)) over the lists it is in. Returns ids, best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves chunks from a repository's lexical index and its FAISS index and fuses
+    both rankings by reciprocal rank.
+
+    Embeddings find chunks about what a question means, BM25 and the symbol table find
+    the exact identifiers it names. When every identifier a question names is in the
+    lexical index, its ranking is decisive and used alone: the query is never embedded,
+    so no call goes out to the embeddings API.
+
+    The indexes are either given directly or, with `indexes`, looked up on every search
+    (see IndexRegistry.indexes), so a retriever kept by a session does not pin them in
+    memory past the registry's budget.
+    """
+
+    vectorstore: Any = None
+    lexical: Any = None
+    # Called with no arguments for (vectorstore, lexical index) when set
+    indexes: Any = None
+    k: int = RETRIEVAL_K
+    fetch_k: int = RETRIEVAL_FETCH_K
+    shortcut: bool = LEXICAL_SHORTCUT
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        vectorstore, lexical = self._indexes()
+        with stage_timer('lexical_search'):
+            lexical_ids = [chunk_id for chunk_id, _ in lexical.search(query, self.fetch_k)]
+
+        if lexical_ids and self.shortcut and self.is_decisive(query, lexical):
+            _count('lexical_only')
+            return self._documents(vectorstore, lexical_ids)
+
+        _count('hybrid')
+        with stage_timer('faiss_search'):
+            vector_ids = self._vector_search(vectorstore, query)
+        return self._documents(vectorstore, reciprocal_rank_fusion([lexical_ids, vector_ids]))
+
+    def is_decisive(self, query, lexical=None):
+        """Whether the question names code identifiers, all of which the lexical index knows."""
+        if lexical is None:
+            lexical = self._indexes()[1]
+        identifiers = query_identifiers(query)
+        return bool(identifiers) and all(lexical.knows(name) for name in identifiers)
+
+    def _indexes(self):
+        return self.indexes() if self.indexes is not None else (self.vectorstore, self.lexical)
+
+    def _vector_search(self, vectorstore, query):
+        vector = np.array([vectorstore.embeddings.embed_query(query)], dtype=np.float32)
+        if getattr(vectorstore, '_normalize_L2', False):
+            import faiss
+            faiss.normalize_L2(vector)
+        _, positions = vectorstore.index.search(vector, self.fetch_k)
+        return [vectorstore.index_to_docstore_id[i] for i in positions[0] if i != -1]
+
+    def _documents(self, vectorstore, chunk_ids):
+        documents = []
+        for chunk_id in chunk_ids:
+            document = vectorstore.docstore.search(chunk_id)
+            if isinstance(document, Document):
+                documents.append(document)
+                if len(documents) == self.k:
+                    break
+        return documents
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from utils.singleflight import repo_flight
+
+
+# Sessions unused for this long are dropped, along with their chat history
+SESSION_IDLE_SECONDS = int(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+# Upper bound on live sessions; the least recently used go first past it
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+# Question/answer pairs of chat history each session keeps for the agent
+SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "10"))
+
+
+class RepoContext:
+    """
+    Everything a loaded commit needs that does not depend on the conversation: the
+    retrieval chain and the agent tools. One is shared by every session talking to the
+    same (owner, repo, sha). The indexes are not part of it: the chain's retriever looks
+    them up in the index registry on each search, so they stay within its memory budget.
+    """
+
+    def __init__(self, owner, repo, url, sha, qa_chain, tools):
+        self.owner = owner
+        self.repo = repo
+        self.url = url
+        self.sha = sha
+        self.qa_chain = qa_chain
+        self.tools = tools
+
+    @property
+    def key(self):
+        return self.owner, self.repo, self.sha
+
+
+class Session:
+    """
+    One user's conversation: the repository context it is talking to, its own agent
+    and a windowed chat history. `lock` serialises the session's requests, since the
+    agent and its memory are not safe to use from two threads at once.
+    """
+
+    def __init__(self, session_id, history_turns=SESSION_HISTORY_TURNS):
+        from langchain.memory import ConversationBufferWindowMemory
+
+        self.id = session_id
+        self.context = None
+        self.agent = None
+        self.memory = ConversationBufferWindowMemory(
+            k=history_turns,
+            memory_key="chat_history",
+            input_key="input",
+            return_messages=True
+        )
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+    def history_digest(self):
+        """A hash of the chat history the agent sees (the window of recent turns), '' before the first turn."""
+        messages = self.memory.buffer_as_messages
+        if not messages:
+            return ''
+        digest = hashlib.sha256()
+        for message in messages:
+            digest.update(f"{message.type}\0{message.content}\0".encode('utf-8', errors='ignore'))
+        return digest.hexdigest()
+
+
+class SessionManager:
+    """
+    Sessions keyed by a client supplied id, plus the repository contexts they share.
+
+    Sessions idle for `idle_seconds` are evicted, and the least recently used ones go
+    once there are more than `max_sessions`. A context is dropped when the last
+    session using it goes.
+    """
+
+    def __init__(self, idle_seconds=SESSION_IDLE_SECONDS, max_sessions=SESSION_MAX):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'evicted': 0, 'contexts_built': 0}
+
+    def get(self, session_id=None):
+        """Returns the session for `session_id`, starting a new one (with a fresh id when None)."""
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+                self.stats['created'] += 1
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            self._evict()
+            return session
+
+    def context(self, key, build):
+        """The shared context for (owner, repo, sha), created with `build()` by the first session asking."""
+        with self._lock:
+            context = self._contexts.get(key)
+        if context is not None:
+            return context
+
+        context = repo_flight.do(('context',) + tuple(key), build)
+        with self._lock:
+            if key not in self._contexts:
+                self._contexts[key] = context
+                self.stats['contexts_built'] += 1
+            return self._contexts[key]
+
+    def active(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict(self):
+        cutoff = time.time() - self.idle_seconds
+        for session_id, session in list(self._sessions.items()):
+            if session.last_used >= cutoff and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+            self.stats['evicted'] += 1
+
+        in_use = {session.context.key for session in self._sessions.values() if session.context}
+        for key in list(self._contexts):
+            if key not in in_use:
+                del self._contexts[key]
+
+
+session_manager = SessionManager()
@@ -0,0 +1,347 @@
+import hashlib
+import os
+import subprocess
+import tarfile
+import threading
+from collections import OrderedDict
+
+from utils.blob_cache import blob_cache
+from utils.clients import call_upstream, http_session
+from utils.github import GitHubError, get_client
+from utils.singleflight import repo_flight
+from utils.utils import fetch_blob, fetch_head_sha, fetch_repo_entries
+
+
+# Where repositories are read from: "github" (REST API), "tarball" (one codeload
+# archive per commit) or "local" (git clones under LOCAL_REPO_ROOT)
+REPO_SOURCE = os.getenv("REPO_SOURCE", "github")
+# Holds <owner>/<repo> checkouts or <owner>/<repo>.git bare clones for REPO_SOURCE=local
+LOCAL_REPO_ROOT = os.getenv("LOCAL_REPO_ROOT", "")
+CODELOAD_URL = "https://codeload.github.com"
+# Archives larger than this (uncompressed) are refused
+TARBALL_MAX_MB = int(os.getenv("TARBALL_MAX_MB", "512"))
+# Commit listings kept per tarball source
+TARBALL_LISTINGS = int(os.getenv("TARBALL_LISTINGS", "4"))
+GIT_TIMEOUT = float(os.getenv("GIT_TIMEOUT", "60"))
+# Repositories whose sources (and their cached listings) are kept around
+REPO_SOURCE_CACHE_SIZE = int(os.getenv("REPO_SOURCE_CACHE_SIZE", "64"))
+# Commits per page of the API's commit listing (at most 100)
+COMMIT_PAGE_SIZE = int(os.getenv("COMMIT_PAGE_SIZE", "100"))
+
+
+def git_blob_sha(data):
+    """The SHA git (and GitHub) gives a blob with this content."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def git_sort_key(entry):
+    # Git orders tree entries by name with folders compared as "name/"
+    return entry['path'] + ('/' if entry['type'] == 'tree' else '')
+
+
+class RepoSource:
+    """
+    Where a repository's commits, trees and blobs come from.
+
+    `entries(ref)` lists blobs and trees as {'path', 'type', 'sha', 'size'} dicts in git
+    tree order and `blob(sha)` returns a blob's bytes, so tree building, import
+    extraction and ingestion work the same against every backend.
+    """
+
+    kind = None
+
+    def __init__(self, owner, repo, token=None):
+        self.owner = owner
+        self.repo = repo
+        self.token = token
+
+    def head_sha(self, ref='HEAD'):
+        raise NotImplementedError
+
+    def entries(self, ref='HEAD'):
+        raise NotImplementedError
+
+    def blob(self, sha):
+        raise NotImplementedError
+
+    def default_branch(self):
+        raise NotImplementedError
+
+    def iter_commits(self, ref='HEAD', limit=None):
+        """
+        Commits reachable from `ref`, newest first, as {'sha', 'date', 'author', 'email',
+        'message'} dicts, fetched lazily so a caller can stop early. Backends that list
+        changed files cheaply add a 'files' list; otherwise see `commit_files`.
+        """
+        raise NotImplementedError
+
+    def commit_files(self, sha):
+        """Paths of the files a commit changed."""
+        raise NotImplementedError
+
+
+class GitHubSource(RepoSource):
+    """The REST API: one Git Trees listing, then one request per blob not already in the blob cache."""
+
+    kind = 'github'
+
+    def head_sha(self, ref='HEAD'):
+        return fetch_head_sha(self.owner, self.repo, self.token, ref)
+
+    def entries(self, ref='HEAD'):
+        return fetch_repo_entries(self.owner, self.repo, self.token, ref)
+
+    def blob(self, sha):
+        return fetch_blob(self.owner, self.repo, sha, self.token)
+
+    def default_branch(self):
+        return get_client(self.token).get_json(f"/repos/{self.owner}/{self.repo}")['default_branch']
+
+    def iter_commits(self, ref='HEAD', limit=None):
+        client = get_client(self.token)
+        per_page = min(limit or COMMIT_PAGE_SIZE, COMMIT_PAGE_SIZE)
+        count = 0
+        page = 1
+        while True:
+            data = client.get_json(f"/repos/{self.owner}/{self.repo}/commits",
+                                   params={"sha": ref, "per_page": per_page, "page": page})
+            for item in data:
+                author = item['commit']['author'] or {}
+                yield {
+                    'sha': item['sha'],
+                    'date': author.get('date'),
+                    'author': author.get('name'),
+                    'email': author.get('email'),
+                    'message': item['commit']['message'],
+                }
+                count += 1
+                if limit and count >= limit:
+                    return
+            if len(data) < per_page:
+                return
+            page += 1
+
+    def commit_files(self, sha):
+        # GitHub lists at most 300 files per commit here
+        data = get_client(self.token).get_json(f"/repos/{self.owner}/{self.repo}/commits/{sha}", conditional=False)
+        return [item['filename'] for item in data.get('files', [])]
+
+
+class TarballSource(GitHubSource):
+    """
+    One codeload archive per commit instead of a request per file. Archives carry no
+    history, so commits still come from the API.
+
+    The commit is resolved through the API, then its tar.gz is streamed and read in
+    memory, never written out as an archive. Every file is stored in the blob cache
+    under its git blob SHA, the same key the API uses, so blobs evicted from the
+    cache fall back to the API and other backends reuse what the archive brought in.
+    """
+
+    kind = 'tarball'
+
+    def __init__(self, owner, repo, token=None, max_bytes=TARBALL_MAX_MB * 1024 * 1024):
+        super().__init__(owner, repo, token)
+        self.max_bytes = max_bytes
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'archives': 0, 'archive_bytes': 0}
+
+    def entries(self, ref='HEAD'):
+        sha = self.head_sha(ref)
+        with self._lock:
+            entries = self._listings.get(sha)
+            if entries is not None:
+                self._listings.move_to_end(sha)
+                return entries
+
+        entries = repo_flight.do(('tarball', self.owner, self.repo, sha), self._download, sha)
+        with self._lock:
+            self._listings[sha] = entries
+            while len(self._listings) > TARBALL_LISTINGS:
+                self._listings.popitem(last=False)
+        return entries
+
+    def blob(self, sha):
+        data = blob_cache.get(sha)
+        return data if data is not None else super().blob(sha)
+
+    def _download(self, sha):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        url = f"{CODELOAD_URL}/{self.owner}/{self.repo}/tar.gz/{sha}"
+        response = call_upstream("github", self._get_archive, url, sha, headers)
+        if response.status_code != 200:
+            response.close()
+            raise self._archive_error(sha, response)
+
+        entries = {}
+        total = 0
+        with response, tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+            for member in archive:
+                # Members sit under a single "<repo>-<sha>/" folder
+                path = member.name.partition('/')[2].rstrip('/')
+                if not path:
+                    continue
+                if member.isdir():
+                    entries[path] = {'path': path, 'type': 'tree', 'sha': None, 'size': None}
+                    continue
+                if member.issym():
+                    data = member.linkname.encode()
+                elif member.isfile():
+                    data = archive.extractfile(member).read()
+                else:
+                    continue
+                total += len(data)
+                if total > self.max_bytes:
+                    raise ValueError(f"{self.owner}/{self.repo} is larger than TARBALL_MAX_MB ({self.max_bytes >> 20} MB)")
+                blob_sha = git_blob_sha(data)
+                blob_cache.put(blob_sha, data)
+                entries[path] = {'path': path, 'type': 'blob', 'sha': blob_sha, 'size': len(data)}
+
+        # Folders only implied by their files still need a tree entry
+        for path in list(entries):
+            parent = path.rpartition('/')[0]
+            while parent and parent not in entries:
+                entries[parent] = {'path': parent, 'type': 'tree', 'sha': None, 'size': None}
+                parent = parent.rpartition('/')[0]
+
+        with self._lock:
+            self.stats['archives'] += 1
+            self.stats['archive_bytes'] += total
+        return sorted(entries.values(), key=git_sort_key)
+
+    def _get_archive(self, url, sha, headers):
+        response = http_session("codeload").get(url, headers=headers, stream=True, timeout=GIT_TIMEOUT)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.close()
+            # Raised so call_upstream retries it and the breaker counts it
+            raise self._archive_error(sha, response)
+        return response
+
+    def _archive_error(self, sha, response):
+        return GitHubError(f"Failed to download {self.owner}/{self.repo}@{sha[:7]}: {response.status_code}",
+                           response.status_code)
+
+
+class LocalGitSource(RepoSource):
+    """
+    A clone on disk, checkout or bare, read with git plumbing. Trees come from
+    `git ls-tree` and blobs from a long-running `git cat-file --batch`, so nothing
+    goes over the network.
+    """
+
+    kind = 'local'
+
+    def __init__(self, owner, repo, token=None, path=None):
+        super().__init__(owner, repo, token)
+        self.path = path or find_local_clone(owner, repo)
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def _git(self, *args):
+        result = subprocess.run(['git', '-C', self.path, *args], capture_output=True, timeout=GIT_TIMEOUT)
+        if result.returncode != 0:
+            raise ValueError(f"git {args[0]} failed in {self.path}: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+
+    def head_sha(self, ref='HEAD'):
+        return self._git('rev-parse', '--verify', f"{ref}^{{commit}}").decode().strip()
+
+    def entries(self, ref='HEAD'):
+        entries = []
+        # "<mode> <type> <sha> <size>\t<path>", NUL separated; trees precede their contents
+        for line in self._git('ls-tree', '-r', '-t', '-l', '-z', '--full-tree', ref).split(b'\0'):
+            if not line:
+                continue
+            info, _, path = line.partition(b'\t')
+            _, kind, sha, size = info.split()
+            if kind not in (b'blob', b'tree'):
+                continue
+            entries.append({
+                'path': path.decode('utf-8', errors='replace'),
+                'type': kind.decode(),
+                'sha': sha.decode(),
+                'size': int(size) if size != b'-' else None,
+            })
+        return entries
+
+    def blob(self, sha):
+        with self._lock:
+            if self._batch is None or self._batch.poll() is not None:
+                self._batch = subprocess.Popen(['git', '-C', self.path, 'cat-file', '--batch'],
+                                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self._batch.stdin.write(f"{sha}\n".encode())
+            self._batch.stdin.flush()
+            header = self._batch.stdout.readline().split()
+            if len(header) != 3:
+                raise ValueError(f"Blob {sha} not found in {self.path}")
+            data = self._batch.stdout.read(int(header[2]))
+            self._batch.stdout.read(1)  # Trailing newline
+            return data
+
+    def close(self):
+        with self._lock:
+            if self._batch is not None:
+                self._batch.stdin.close()
+                self._batch.wait()
+                self._batch = None
+
+    def default_branch(self):
+        try:
+            return self._git('symbolic-ref', '--short', 'HEAD').decode().strip()
+        except ValueError:
+            # Detached HEAD
+            return 'HEAD'
+
+    def iter_commits(self, ref='HEAD', limit=None):
+        # One record per commit, "<sha>\x1f<date>\x1f<author>\x1f<email>\x1f<message>\x1f" then its changed files
+        args = ['log', '--name-only', '--format=%x1e%H%x1f%aI%x1f%an%x1f%ae%x1f%B%x1f']
+        if limit:
+            args.append(f'-n{limit}')
+        log = self._git(*args, ref, '--').decode('utf-8', errors='replace')
+        for record in log.split('\x1e'):
+            fields = record.split('\x1f')
+            if len(fields) == 6:
+                yield {'sha': fields[0], 'date': fields[1], 'author': fields[2], 'email': fields[3],
+                       'message': fields[4].strip(), 'files': [path for path in fields[5].splitlines() if path]}
+
+    def commit_files(self, sha):
+        files = self._git('diff-tree', '--no-commit-id', '--name-only', '-r', '--root', sha).decode('utf-8', errors='replace')
+        return [path for path in files.splitlines() if path]
+
+
+def find_local_clone(owner, repo, root=None):
+    """Path of the clone of owner/repo under `root` (default LOCAL_REPO_ROOT): a checkout or a bare .git clone."""
+    root = root or LOCAL_REPO_ROOT
+    for path in (os.path.join(root, owner, repo), os.path.join(root, owner, f"{repo}.git"), os.path.join(root, repo)):
+        if os.path.isdir(path):
+            return path
+    raise ValueError(f"No local clone of {owner}/{repo} under {root or 'LOCAL_REPO_ROOT (unset)'}")
+
+
+SOURCES = {
+    'github': GitHubSource,
+    'tarball': TarballSource,
+    'local': LocalGitSource,
+}
+
+_sources = OrderedDict()
+_sources_lock = threading.Lock()
+
+
+def get_source(owner, repo, token=None, kind=None):
+    """The shared source of kind `kind` (default REPO_SOURCE) for owner/repo."""
+    kind = kind or REPO_SOURCE
+    if kind not in SOURCES:
+        raise ValueError(f"Unknown repository source {kind!r}; expected one of {', '.join(SOURCES)}")
+    key = (kind, owner, repo, token)
+    with _sources_lock:
+        source = _sources.get(key)
+        if source is None:
+            source = _sources[key] = SOURCES[kind](owner, repo, token)
+        _sources.move_to_end(key)
+        while len(_sources) > REPO_SOURCE_CACHE_SIZE:
+            _, evicted = _sources.popitem(last=False)
+            if hasattr(evicted, 'close'):
+                evicted.close()
+        return source
@@ -0,0 +1,18 @@
+import json
+
+from flask import Response, stream_with_context
+
+
+def sse_event(data, event=None):
+    """Formats one Server-Sent Event; `data` is JSON-encoded."""
+    message = f"event: {event}\n" if event else ''
+    return f"{message}data: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    """Streams an iterable of preformatted events to the client without proxy buffering."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
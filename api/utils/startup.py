@@ -0,0 +1,75 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+
+# What the chat routes import on first use; warm_up() can import it before traffic arrives
+WARM_UP_MODULES = (
+    'utils.chat', 'utils.embeddings', 'utils.indexer', 'utils.retrieval',
+    'langchain.agents', 'langchain.chains', 'langchain.memory', 'langchain_community.vectorstores.faiss', 'faiss',
+)
+# Import WARM_UP_MODULES before serving
+WARM_UP_IMPORTS = os.getenv("WARM_UP_IMPORTS", "0") == "1"
+# Repository indexes, most recently built first, loaded from disk before serving (0 loads none)
+WARM_UP_INDEXES = int(os.getenv("WARM_UP_INDEXES", "0"))
+
+logger = logging.getLogger('startup')
+
+# Seconds the first import of each module loaded through `load` took, including the imports it made
+import_seconds = {}
+warm_up_stats = {'seconds': 0.0, 'modules': 0, 'indexes': 0}
+_lock = threading.Lock()
+
+
+def load(name):
+    """Imports module `name`, recording how long it took if this is its first import."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    # Rather than importlib.import_module, which -X importtime does not see
+    __import__(name)
+    module = sys.modules[name]
+    with _lock:
+        import_seconds.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def warm_up(imports=WARM_UP_IMPORTS, indexes=WARM_UP_INDEXES):
+    """
+    Loads what the routes would otherwise load on their first request: the modules in
+    WARM_UP_MODULES, and the stored indexes (with their lexical indexes) of the
+    `indexes` repositories indexed most recently. Index loading stops once the index
+    registry's memory budget is used, so nothing preloaded is evicted again. Meant to
+    run in each worker before it accepts connections; returns warm_up_stats.
+    """
+    if not imports and not indexes:
+        return warm_up_stats
+    start = time.perf_counter()
+    # Loading an index needs FAISS and the embeddings anyway
+    for name in WARM_UP_MODULES:
+        load(name)
+
+    loaded = 0
+    if indexes:
+        from utils.embeddings import get_embeddings
+        from utils.index_store import index_registry
+
+        embeddings = get_embeddings(os.getenv("OPENAI_API_KEY"))
+        for owner, repo, sha in index_registry.recent(indexes):
+            if index_registry.loaded_bytes() >= index_registry.memory_bytes:
+                break
+            try:
+                vectorstore = index_registry.get(owner, repo, sha, embeddings)
+                index_registry.lexical(owner, repo, sha, vectorstore)
+            except Exception as e:
+                logger.warning("Could not preload the index of %s/%s@%s: %s", owner, repo, sha[:7], e)
+                continue
+            loaded += 1
+
+    with _lock:
+        warm_up_stats.update(seconds=time.perf_counter() - start, modules=len(WARM_UP_MODULES), indexes=loaded)
+    logger.info("Warmed up in %.2fs: %d modules, %d indexes", warm_up_stats['seconds'], len(WARM_UP_MODULES), loaded)
+    return warm_up_stats
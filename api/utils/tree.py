@@ -0,0 +1,179 @@
+import json
+import sys
+
+from utils.utils import FILE_TYPES, IGNORED_FOLDERS, file_type_of
+
+
+class Folder:
+    """A folder of the repository tree. `children` holds Folders and Files in git tree order."""
+
+    __slots__ = ('name', 'path', 'children')
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.children = []
+
+    def __repr__(self):
+        return f"Folder({self.path!r}, {len(self.children)} children)"
+
+
+class File:
+    """
+    A file of the repository tree. Only the (interned) name is stored; the path is
+    derived from the parent folder, so repeated names like `__init__.py` or `index.ts`
+    and long folder prefixes are held once however many files share them.
+    """
+
+    __slots__ = ('name', 'parent', 'sha', 'size')
+
+    def __init__(self, name, parent, sha, size):
+        self.name = name
+        self.parent = parent
+        self.sha = sha
+        self.size = size
+
+    @property
+    def path(self):
+        return f"{self.parent.path}/{self.name}" if self.parent.path else self.name
+
+    def __repr__(self):
+        return f"File({self.path!r})"
+
+
+def build_tree(entries, path=''):
+    """
+    Nests a flat tree listing into Folder and File nodes rooted at `path`, dropping
+    ignored folders and everything below them.
+    """
+    intern = sys.intern
+    root = Folder('', path)
+    folders = {path: root}
+    prefix = f"{path}/" if path else ''
+    for entry in entries:
+        entry_path = entry['path']
+        if not entry_path.startswith(prefix):
+            continue
+        parent_path, _, name = entry_path.rpartition('/')
+        parent = folders.get(parent_path)
+        if parent is None:  # Inside an ignored folder
+            continue
+        if entry['type'] == 'tree':
+            if name in IGNORED_FOLDERS:
+                continue
+            folder = Folder(intern(name), entry_path)
+            folders[entry_path] = folder
+            parent.children.append(folder)
+        else:
+            parent.children.append(File(intern(name), parent, entry['sha'], entry.get('size')))
+    return root
+
+
+def collect_import_files(node):
+    """Lists the files whose imports `render_tree` will show, in tree order."""
+    files = []
+    stack = [iter(node.children)]
+    while stack:
+        for child in stack[-1]:
+            if isinstance(child, Folder):
+                stack.append(iter(child.children))
+                break
+            if file_type_of(child.name) != "Images":
+                files.append(child)
+        else:
+            stack.pop()
+    return files
+
+
+def file_counts(node):
+    """{file type: count} over the files directly in `node`, in FILE_TYPES order, leaving out zeros."""
+    counts = {key: 0 for key in FILE_TYPES}
+    for child in node.children:
+        if not isinstance(child, Folder):
+            counts[file_type_of(child.name) or "Others"] += 1
+    return {file_type: count for file_type, count in counts.items() if count}
+
+
+# === Text ===
+def _render_text(node, repo, imports, depth, out):
+    indent = '  ' * depth
+    out.append(f"{indent}{node.path if node.path else repo}:\n")
+    # The counts line goes before the listing but is only known after it
+    counts_at = len(out)
+    out.append('')
+
+    counts = {key: 0 for key in FILE_TYPES}
+    import_section = []
+    prefix = f"{node.path}/" if node.path else ''
+    for child in node.children:
+        if isinstance(child, Folder):
+            _render_text(child, repo, imports, depth + 1, out)
+            continue
+        file_type = file_type_of(child.name)
+        counts[file_type or "Others"] += 1
+        # Images are counted but not listed
+        if file_type != "Images":
+            out.append(f"{indent}  {child.name}\n")
+            file_imports = imports.get(prefix + child.name)
+            if file_imports:
+                import_section.append(f"{indent}  Imports for {child.name}:\n{file_imports}\n")
+
+    out[counts_at] = ''.join(f"{indent}  ({count} {file_type.lower()} files detected)\n"
+                             for file_type, count in counts.items() if count)
+    out.extend(import_section)
+
+
+def render_tree(node, repo, imports, depth=0):
+    """
+    Renders a node from `build_tree` in the indented text format consumed by
+    /api/tree and the README prompt. `imports` maps file paths to their
+    extracted import lines.
+    """
+    out = []
+    _render_text(node, repo, imports, depth, out)
+    return ''.join(out)
+
+
+# === JSON ===
+def _file_record(file, imports):
+    record = {'type': 'file', 'name': file.name, 'path': file.path, 'size': file.size}
+    file_imports = imports.get(record['path'])
+    if file_imports:
+        record['imports'] = file_imports.split('\n')
+    return record
+
+
+def tree_to_dict(node, imports):
+    """
+    The tree as nested dicts: folders as {'type': 'dir', 'name', 'path', 'file_counts',
+    'children'}, files as {'type': 'file', 'name', 'path', 'size', 'imports'}, where
+    'imports' is only present for files that have some.
+    """
+    children = [tree_to_dict(child, imports) if isinstance(child, Folder) else _file_record(child, imports)
+                for child in node.children]
+    return {'type': 'dir', 'name': node.name, 'path': node.path, 'file_counts': file_counts(node),
+            'children': children}
+
+
+def iter_ndjson(node, imports, header=None):
+    """
+    Yields the tree as newline-delimited JSON, one record per folder or file in the
+    order the text format lists them: records are `tree_to_dict` nodes without
+    'children', plus each one's 'depth'. `header`, if given, is written first.
+    """
+    if header is not None:
+        yield json.dumps(header) + '\n'
+    stack = [(iter([node]), 0)]
+    while stack:
+        children, depth = stack[-1]
+        for child in children:
+            if isinstance(child, Folder):
+                yield json.dumps({'type': 'dir', 'name': child.name, 'path': child.path, 'depth': depth,
+                                  'file_counts': file_counts(child)}) + '\n'
+                stack.append((iter(child.children), depth + 1))
+                break
+            record = _file_record(child, imports)
+            record['depth'] = depth
+            yield json.dumps(record) + '\n'
+        else:
+            stack.pop()
@@ -1,6 +1,14 @@
-import re
-import requests
 import base64
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.blob_cache import blob_cache
+from utils.github import get_client
+from utils.imports import extract_imports
+from utils.metrics import stage_timer
+from utils.singleflight import repo_flight
 
 
 IGNORED_FOLDERS = [
@@ -41,6 +49,19 @@ IGNORED_FOLDERS = [
     '.svn', 'CVS', '.hg', '.bzr', '_build', 'deps', '*.lock', '*.log', '*.pid', '*.seed', '*.bak'
 ]
 
+# Maximum number of blob fetches in flight while extracting imports
+IMPORT_FETCH_CONCURRENCY = int(os.getenv("IMPORT_FETCH_CONCURRENCY", "8"))
+
+# Aggregate counters for the import extraction stage
+IMPORT_STATS = {
+    'files_fetched': 0,
+    'files_with_imports': 0,
+    'imports_found': 0,
+    'bytes_fetched': 0,
+    'errors': 0,
+}
+_stats_lock = threading.Lock()
+
 FILE_TYPES = {
     "Images": r"\.(png|jpe?g|gif|bmp|svg|webp|ico|tiff)$",
     "Videos": r"\.(mp4|avi|mov|mkv|wmv|flv|webm)$",
@@ -51,120 +72,171 @@ FILE_TYPES = {
 }
 
 
-def process_repo_tree(repo_url, path='', token=None, depth=0):
+def _count(name, amount=1):
+    with _stats_lock:
+        IMPORT_STATS[name] += amount
+
+
+def parse_repo_url(repo_url):
     match = re.match(r"https?://github\.com/([^/]+)/([^/]+)", repo_url)
     if not match:
         raise ValueError("Invalid GitHub repository URL. Format: https://github.com/owner/repo")
-
     owner, repo = match.groups()
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-    headers = {"Authorization": f"Bearer {token}"} if token else {}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        try:
-            data = response.json()
-
-            tree_structure = ''
-            import_section = ''  # To store the import section of files
-            file_counts = {key: 0 for key in FILE_TYPES}  # Initialize counters for file types
-
-            # Check if the path corresponds to a folder or a file
-            if isinstance(data, list):
-                indent = '  ' * depth
-                tree_structure += f"{indent}{path if path else repo}:\n"
-                folder_tree = ''
-
-                for item in data:
-                    if item['type'] == 'dir':
-                        if item['name'] in IGNORED_FOLDERS:
-                            continue
-                        folder_tree += process_repo_tree(repo_url, item['path'], token, depth + 1)
-                    elif item['type'] == 'file':
-                        # Determine the file type and increment the corresponding counter
-                        file_type_found = False
-                        for file_type, pattern in FILE_TYPES.items():
-                            if re.search(pattern, item['name'], re.IGNORECASE):
-                                file_counts[file_type] += 1
-                                file_type_found = True
-                                break
-
-                        if not file_type_found:  # If no matching type, consider as "Others"
-                            file_counts["Others"] += 1
-
-                        # Add non-media files to the folder tree and process imports
-                        if not file_type_found or file_type != "Images":
-                            folder_tree += f"{indent}  {item['name']}\n"
-                            file_imports = get_file_imports(repo_url, item['path'], token)
-                            if file_imports:
-                                import_section += f"{indent}  Imports for {item['name']}:\n{file_imports}\n"
-
-                # Add file type counts to the tree structure
-                for file_type, count in file_counts.items():
-                    if count > 0:
-                        tree_structure += f"{indent}  ({count} {file_type.lower()} files detected)\n"
-
-                tree_structure += folder_tree
-
-            return tree_structure + import_section
-        except Exception as e:
-            raise ValueError(f"Error processing repository tree: {e}")
-    else:
-        raise ValueError(f"Failed to fetch data from GitHub API: {response.status_code}")
-
-
-
-def get_file_imports(repo_url, path, token=None):
+    if repo.endswith('.git'):
+        repo = repo[:-4]
+    return owner, repo
+
+
+# A full commit (or tree) SHA, as opposed to a branch name or HEAD
+_SHA = re.compile(r'[0-9a-f]{40}')
+
+
+def fetch_head_sha(owner, repo, token=None, ref='HEAD'):
+    """Resolves `ref` (default: the default branch head) to its commit SHA."""
+    return get_client(token).get_json(f"/repos/{owner}/{repo}/commits/{ref}")['sha']
+
+
+def fetch_repo_entries(owner, repo, token=None, ref='HEAD'):
     """
-    Fetches the content of a file from GitHub and extracts imports based on the language.
-    Supports Python, C++, JavaScript, TypeScript, Java, Kotlin, Rust, and other popular languages.
-    Handles Unicode decoding issues gracefully.
+    Lists every blob and tree of the repository as a flat list of
+    {'path', 'type', 'sha', 'size'} dicts in git tree order.
+
+    Uses a single recursive Git Trees call. GitHub truncates very large trees,
+    in which case the listing falls back to walking the tree one level at a time,
+    skipping ignored folders so their contents are never requested.
     """
-    match = re.match(r"https?://github\.com/([^/]+)/([^/]+)", repo_url)
-    if not match:
-        raise ValueError("Invalid GitHub repository URL. Format: https://github.com/owner/repo")
+    # A tree listed by commit SHA never changes, so there is nothing to revalidate
+    data = get_client(token).get_json(f"/repos/{owner}/{repo}/git/trees/{ref}", params={'recursive': 1},
+                                      conditional=not _SHA.fullmatch(ref))
+    if not data.get('truncated'):
+        return [item for item in data['tree'] if item['type'] in ('blob', 'tree')]
+    return _walk_tree(owner, repo, data['sha'], '', token)
+
+
+def _walk_tree(owner, repo, tree_sha, prefix, token=None):
+    data = get_client(token).get_json(f"/repos/{owner}/{repo}/git/trees/{tree_sha}", conditional=False)
+    entries = []
+    for item in data['tree']:
+        if item['type'] not in ('blob', 'tree'):
+            continue
+        entry = dict(item, path=f"{prefix}{item['path']}")
+        entries.append(entry)
+        if item['type'] == 'tree' and item['path'] not in IGNORED_FOLDERS:
+            entries.extend(_walk_tree(owner, repo, item['sha'], f"{entry['path']}/", token))
+    return entries
+
+
+_FILE_TYPE_PATTERN = re.compile('|'.join(f"(?P<{file_type}>{pattern})" for file_type, pattern in FILE_TYPES.items()),
+                                re.IGNORECASE)
+_file_types_by_extension = {}
+
+
+def file_type_of(name):
+    """The FILE_TYPES category of a file name, or None. Results are memoized per extension."""
+    dot = name.rfind('.')
+    if dot < 0:
+        return None
+    extension = name[dot:].lower()
+    try:
+        return _file_types_by_extension[extension]
+    except KeyError:
+        match = _FILE_TYPE_PATTERN.search(extension)
+        file_type = match.lastgroup if match else None
+        if len(extension) <= 16:
+            _file_types_by_extension[extension] = file_type
+        return file_type
+
+
+def fetch_imports(source, files, max_workers=None, progress=None):
+    """
+    Reads the blobs of `files` (utils.tree File nodes) from the repository source
+    concurrently and extracts their imports.
 
-    owner, repo = match.groups()
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-    headers = {"Authorization": f"Bearer {token}"} if token else {}
-    response = requests.get(url, headers=headers)
-    print(f"Fetching imports from {url}... : ",response)  # Debugging line
-    if response.status_code == 200:
+    At most `max_workers` (default IMPORT_FETCH_CONCURRENCY) reads are in flight at
+    once. Returns a list of import strings (or None) aligned with `files`, so callers
+    can reassemble them in tree order.
+    """
+    max_workers = max_workers or IMPORT_FETCH_CONCURRENCY
+    fetched = [0]
+    fetched_lock = threading.Lock()
+
+    def fetch(item):
         try:
-            data = response.json()
-            # Decode content with error handling for Unicode issues
-            file_content = base64.b64decode(data['content']).decode('utf-8', errors='replace')
-
-            imports = []
-            # Extract imports based on file extension
-            if path.endswith('.py'):  # Python
-                imports = re.findall(r'^\s*import\s+(\S+)|^\s*from\s+(\S+)\s+import\s+(\S+)', file_content, re.MULTILINE)
-                imports = [f"import {imp[0]}" if imp[0] else f"from {imp[1]} import {imp[2]}" for imp in imports]
-            elif path.endswith('.cpp') or path.endswith('.h'):  # C++
-                imports = re.findall(r'^\s*#include\s+["<](\S+)[">]', file_content, re.MULTILINE)
-            elif path.endswith('.js') or path.endswith('.ts'):  # JavaScript/TypeScript
-                imports = re.findall(r'^\s*import\s+.*?\s+from\s+["\'](\S+)["\']|^\s*import\s+(\S+)', file_content, re.MULTILINE)
-                imports = [imp[0] or imp[1] for imp in imports]
-            elif path.endswith('.java'):  # Java
-                imports = re.findall(r'^\s*import\s+([\w\.]+);', file_content, re.MULTILINE)
-            elif path.endswith('.kt'):  # Kotlin
-                imports = re.findall(r'^\s*import\s+([\w\.]+)', file_content, re.MULTILINE)
-            elif path.endswith('.rs'):  # Rust
-                imports = re.findall(r'^\s*extern\s+crate\s+(\w+)|^\s*use\s+([\w\:]+)', file_content, re.MULTILINE)
-                imports = [imp[0] or imp[1] for imp in imports]
-            elif path.endswith('.go'):  # Go
-                imports = re.findall(r'^\s*import\s+["](\S+)["]', file_content, re.MULTILINE)
-            elif path.endswith('.cs'):  # C#
-                imports = re.findall(r'^\s*using\s+([\w\.]+);', file_content, re.MULTILINE)
-            elif path.endswith('.php'):  # PHP
-                imports = re.findall(r'^\s*require\s+["\'](\S+)["\']|^\s*include\s+["\'](\S+)["\']', file_content, re.MULTILINE)
-                imports = [imp[0] or imp[1] for imp in imports]
-
-            # Return extracted imports as a string
-            if imports:
-                return "\n".join(imports)
+            content = source.blob(item.sha)
+        except Exception:
+            _count('errors')
             return None
-        except Exception as e:
-            raise ValueError(f"Error processing file content: {e}")
-    else:
-        raise Exception(f"Error {response.status_code}: {response.json().get('message', 'Unknown error')}")
-    
\ No newline at end of file
+        finally:
+            if progress:
+                with fetched_lock:
+                    fetched[0] += 1
+                    progress('fetching', fetched[0], len(files), files_fetched=fetched[0])
+        _count('files_fetched')
+        _count('bytes_fetched', len(content))
+        with stage_timer('decode'):
+            text = content.decode('utf-8', errors='replace')
+        with stage_timer('import_parse'):
+            imports = extract_imports(item.path, text)
+        if imports:
+            _count('files_with_imports')
+            _count('imports_found', len(imports))
+            return "\n".join(imports)
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fetch, files))
+
+
+def process_repo_tree(repo_url, path='', token=None, depth=0, max_workers=None, progress=None):
+    """
+    Builds the indented tree text for a repository. `progress`, if given, is called as
+    progress(stage, done, total, **counters) while files are fetched.
+    """
+    from utils.tree import render_tree
+
+    root, repo, imports = analyze_repo(repo_url, path, token, max_workers, progress)
+    return render_tree(root, repo, imports, depth)
+
+
+def analyze_repo(repo_url, path='', token=None, max_workers=None, progress=None):
+    """
+    Lists the repository and extracts the imports of every rendered file.
+    Returns (root Folder, repo name, {path: imports}) for the utils.tree renderers and
+    prompt building.
+
+    The repository is read from the configured source (see utils.sources). Concurrent
+    calls for the same repository and path share a single crawl.
+    """
+    from utils.sources import get_source
+
+    owner, repo = parse_repo_url(repo_url)
+    source = get_source(owner, repo, token)
+    key = ('tree', source.kind, owner, repo, 'HEAD', path.strip('/'))
+    return repo_flight.do(key, _analyze_repo, source, path, max_workers, progress)
+
+
+def _analyze_repo(source, path, max_workers, progress):
+    from utils.tree import build_tree, collect_import_files
+
+    if progress:
+        progress('listing')
+    entries = source.entries()
+    try:
+        root = build_tree(entries, path.strip('/'))
+        files = collect_import_files(root)
+        results = fetch_imports(source, files, max_workers, progress)
+        imports = {item.path: result for item, result in zip(files, results)}
+        return root, source.repo, imports
+    except Exception as e:
+        raise ValueError(f"Error processing repository tree: {e}")
+
+
+def fetch_blob(owner, repo, sha, token=None):
+    """Fetches the raw bytes of a blob by its git SHA, reusing the shared blob cache."""
+    def fetch():
+        # Blobs are cached by SHA already, so skip the ETag store for them
+        data = get_client(token).get_json(f"/repos/{owner}/{repo}/git/blobs/{sha}", conditional=False)
+        return base64.b64decode(data['content'])
+
+    return blob_cache.get_or_fetch(sha, fetch)
+
@@ -61,6 +61,8 @@ const ChatPage: React.FC = () => {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
   const drawerRef = useRef<HTMLDivElement>(null);
+  // Identifies this chat to the API so its repository and history are kept apart from other users
+  const sessionId = useRef<string>(crypto.randomUUID());
 
   const scrollToBottom = () => messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
 
@@ -112,7 +114,7 @@ const ChatPage: React.FC = () => {
 
       const setRepoResponse = await fetch(`${baseUrl}/api/set-repo`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId.current },
         body: JSON.stringify({ url: repoUrl.trim() })
       });
       if (!setRepoResponse.ok) console.warn('Failed to initialize chat context, but tree loaded');
@@ -172,7 +174,7 @@ const ChatPage: React.FC = () => {
     try {
       const response = await fetch(`${baseUrl}/api/query`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId.current },
         body: JSON.stringify({ query: userMessage.content, repo_url: currentRepo?.url })
       });
       if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);